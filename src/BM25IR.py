@@ -1,5 +1,11 @@
 import math
 
+# Default BM25 parameters
+K1 = 1.2
+B = 0.75
+K2 = 500
+N_SCALE = 3  # multiplier on the number of docs in the IDF to keep it positive
+
 
 def df(coll):
     """
@@ -39,7 +45,7 @@ def avg_length(coll):
     """      
     return coll.totalDocLength/coll.num_docs
 
-def bm25(coll, q, df):
+def bm25(coll, q, df, k1=K1, b=B, k2=K2, n_scale=N_SCALE):
     """
     compute bm25 score for the given collection against a query 
     
@@ -47,6 +53,10 @@ def bm25(coll, q, df):
         coll (Rcv1Coll): collection of documents
         q (dict): the tokenised query
         df (dict): document frequency
+        k1 (float): term frequency saturation
+        b (float): document length normalisation
+        k2 (float): query term frequency saturation
+        n_scale (float): multiplier applied to the number of docs in the IDF
     
     Returns:
         dict {docid:bm25_score} 
@@ -57,7 +67,7 @@ def bm25(coll, q, df):
     no_docs = coll.num_docs
     for id, doc in coll.coll.items():
 
-        k = 1.2 * ((1 - 0.75) + 0.75 * doc.doc_size / float(avg_dl))
+        k = k1 * ((1 - b) + b * doc.doc_size / float(avg_dl))
         bm25_ = 0.0;
         for qt in q.keys():
             n = 0
@@ -72,8 +82,8 @@ def bm25(coll, q, df):
                 except KeyError:
                     f = 0            
 
-                bm = math.log(1.0 / ((n + 0.5) / (3*no_docs - n + 0.5)), 2) * (((1.2 + 1) * f) / (k + f)) * ( ((500 + 1) * qf) / float(500 + qf))
-                # bm values may be negative if no_docs < 2n+1, so we may use 3*no_docs to solve this problem.
+                bm = math.log(1.0 / ((n + 0.5) / (n_scale*no_docs - n + 0.5)), 2) * (((k1 + 1) * f) / (k + f)) * ( ((k2 + 1) * qf) / float(k2 + qf))
+                # bm values may be negative if no_docs < 2n+1, so we may use n_scale*no_docs (3 by default) to solve this problem.
                 bm25_ += bm
         bm25s[doc.doc_id] = bm25_
     
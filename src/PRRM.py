@@ -1,18 +1,26 @@
-from sklearn.linear_model import LogisticRegression
+import os
+import re
+import glob
+import pickle
+import hashlib
+
+import sklearn
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.utils.class_weight import compute_class_weight
 import numpy as np
 
 class PRRMModel:
-    def __init__(self):
+    def __init__(self, C=1.0, class_weight="balanced"):
+        self.params = {"C": C, "class_weight": class_weight}
         # Use L2 regularization, balanced class weights, and feature scaling
         self.pipeline = Pipeline([
             ("scaler", StandardScaler()),
             ("clf", LogisticRegression(
                 penalty="l2",
-                C=1.0,
-                class_weight="balanced",
+                C=C,
+                class_weight=class_weight,
                 max_iter=2000,
                 solver="lbfgs",
                 random_state=42
@@ -24,3 +32,91 @@ class PRRMModel:
 
     def predict(self, X):
         return self.pipeline.predict_proba(X)[:, 1]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+# Out-of-core variant of PRRMModel: the scaler and an SGD logistic regression are fitted with partial_fit
+# on mini-batches, so only one batch of features is in memory at a time however many docs are pseudo-labelled.
+# The two steps are kept as the base class's pipeline, which predict() uses
+class StreamingPRRMModel(PRRMModel):
+    def __init__(self, alpha=1e-4, class_weight="balanced", n_epochs=5):
+        super().__init__(class_weight=class_weight)
+        self.params = {"alpha": alpha, "class_weight": class_weight, "n_epochs": n_epochs}
+        self.scaler = StandardScaler()
+        self.clf = SGDClassifier(loss="log_loss", penalty="l2", alpha=alpha, random_state=42)
+        self.pipeline = Pipeline([("scaler", self.scaler), ("clf", self.clf)])
+        self.classes = np.array([0, 1])
+
+    # batches(epoch) returns an iterable of (X, y) mini-batches for that pass over the training data.
+    # The first pass fits the scaler and counts the classes for the balanced weights, then
+    # each epoch makes one partial_fit call per batch
+    def train_batches(self, batches):
+        counts = np.zeros(len(self.classes))
+        for X, y in batches(0):
+            self.scaler.partial_fit(X)
+            counts += np.bincount(np.asarray(y, dtype=np.int64), minlength=len(self.classes))
+
+        if self.params["class_weight"] == "balanced":
+            weights = counts.sum() / (len(self.classes) * np.maximum(counts, 1))
+        else:
+            weights = np.ones(len(self.classes))
+
+        for epoch in range(self.params["n_epochs"]):
+            for X, y in batches(epoch):
+                y = np.asarray(y, dtype=np.int64)
+                self.clf.partial_fit(self.scaler.transform(X), y, classes=self.classes, sample_weight=weights[y])
+
+    def train(self, X_train, y_train):
+        self.train_batches(lambda epoch: [(X_train, y_train)])
+
+# Hash of everything the trained model depends on: the training features (which carry the dataset's
+# TF-IDF space, the query and the BM25/LMRM scores), the pseudo-labels, the hyperparameters and sklearn.
+# Rows are sorted first because the pseudo-labelled docs come out of sets in no fixed order
+def training_fingerprint(X_train, y_train, params):
+    rows = np.column_stack([np.asarray(y_train, dtype=np.float64), np.asarray(X_train, dtype=np.float64)])
+    rows = rows[np.lexsort(rows.T[::-1])]
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(rows).tobytes())
+    h.update(repr(sorted(params.items())).encode())
+    h.update(sklearn.__version__.encode())
+    return h.hexdigest()[:16]
+
+# The model files saved for exactly name (<name>_<fingerprint>.pkl), not those of longer names it prefixes
+def saved_models(model_dir, name="PRRM"):
+    pattern = re.compile(re.escape(name) + r"_[0-9a-f]{16}\.pkl")
+    return [path for path in glob.glob(os.path.join(model_dir, f"{name}_*.pkl"))
+            if pattern.fullmatch(os.path.basename(path))]
+
+# Returns (model, reused). With a model_dir, a model saved as <name>_<fingerprint>.pkl for the same
+# inputs is loaded instead of retrained; otherwise the new model replaces the older ones for that name
+def get_trained_model(X_train, y_train, model_dir=None, name="PRRM", **params):
+    if not model_dir:
+        model = PRRMModel(**params)
+        model.train(X_train, y_train)
+        return model, False
+
+    model = PRRMModel(**params)
+    path = os.path.join(model_dir, f"{name}_{training_fingerprint(X_train, y_train, model.params)}.pkl")
+    if os.path.exists(path):
+        return PRRMModel.load(path), True
+
+    model.train(X_train, y_train)
+    for old_path in saved_models(model_dir, name):
+        os.remove(old_path)
+    model.save(path)
+    return model, False
+
+# The last model saved for name, or None. Used to score a changed dataset without retraining
+def load_latest_model(model_dir, name="PRRM"):
+    paths = saved_models(model_dir, name) if model_dir else []
+    if not paths:
+        return None
+    return PRRMModel.load(max(paths, key=os.path.getmtime))
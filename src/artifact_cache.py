@@ -0,0 +1,228 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class LRUCache:
+    """
+    in-memory map for objects a process reuses (feature stores, run matrices, binary runs) that holds
+    at most max_size entries, evicting the least recently used one first (max_size None = no limit).
+    safe to share between threads
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def resize(self, max_size):
+        """change the limit, evicting entries straight away if it shrank"""
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self):
+        while self.max_size is not None and len(self._entries) > max(self.max_size, 0):
+            self._entries.popitem(last=False)
+
+
+def file_digest(path):
+    """sha1 of a file's content"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def list_files(path):
+    """every file under path (or path itself) in sorted order"""
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        found.extend(os.path.join(root, name) for name in sorted(files))
+    return found
+
+
+def manifest(path, digests=None):
+    """
+    content manifest of a file or directory: [(path relative to it, sha1), ...], or [] if it is missing
+
+    Args:
+        digests (dict): {absolute path: sha1} memo shared between calls
+    """
+    if not os.path.exists(path):
+        return []
+    entries = []
+    for file_path in list_files(path):
+        if digests is not None and file_path in digests:
+            digest = digests[file_path]
+        else:
+            digest = file_digest(file_path)
+            if digests is not None:
+                digests[file_path] = digest
+        entries.append((os.path.relpath(file_path, path), digest))
+    return entries
+
+
+def code_version(modules):
+    """sha1 of the source of the given src modules, e.g. ["run_bm25", "BM25IR"]"""
+    h = hashlib.sha1()
+    for module in sorted(modules):
+        h.update(module.encode())
+        h.update(file_digest(os.path.join(SRC_DIR, module + ".py")).encode())
+    return h.hexdigest()
+
+
+def stage_key(name, sources=(), params=None, code=(), dep_keys=(), digests=None):
+    """
+    content address of a stage run: a hash of everything that can change its result
+
+    Args:
+        name (str): stage name
+        sources (list): input files and directories, hashed by content
+        params (dict): json-serialisable parameters
+        code (list): src modules the stage runs
+        dep_keys (list): keys of the stages it depends on
+
+    Returns:
+        hex key
+    """
+    h = hashlib.sha1(name.encode())
+    for source in sources:
+        h.update(json.dumps([os.path.basename(source), manifest(source, digests)]).encode())
+    h.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+    h.update(code_version(code).encode())
+    for key in dep_keys:
+        h.update(key.encode())
+    return h.hexdigest()[:20]
+
+
+def link_file(source, destination):
+    """hard link source at destination (replacing it), or copy where links are not possible"""
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def link_tree(source, destination):
+    """replace destination with a tree of hard links to the files under source"""
+    if os.path.isdir(destination) and not os.path.islink(destination):
+        shutil.rmtree(destination)
+    for file_path in list_files(source):
+        link_file(file_path, os.path.join(destination, os.path.relpath(file_path, source)))
+
+
+def remove_path(path):
+    """delete a file or directory tree if it exists"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+class ArtifactStore:
+    """
+    content-addressed store of stage results. output files are kept once per distinct content
+    under objects/<sha1>, and an entry records a stage's in-memory result and which object each of
+    its output files is. restoring an entry hard links the objects back into place.
+    """
+
+    def __init__(self, root, base_dir):
+        self.root = root
+        self.base_dir = base_dir  # output paths are recorded relative to this (the project root)
+        self.objects_dir = os.path.join(root, "objects")
+        self.entries_dir = os.path.join(root, "entries")
+
+    def _entry_path(self, stage, key):
+        return os.path.join(self.entries_dir, stage, key + ".pkl")
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def has(self, stage, key):
+        return os.path.exists(self._entry_path(stage, key))
+
+    def save(self, stage, key, result, outputs):
+        """
+        store a finished stage
+
+        Args:
+            result: the stage's return value (must pickle)
+            outputs (list): files and directories the stage wrote
+        """
+        files = {}
+        for output in outputs:
+            for file_path in list_files(output) if os.path.exists(output) else []:
+                digest = file_digest(file_path)
+                object_path = self._object_path(digest)
+                if not os.path.exists(object_path) or file_digest(object_path) != digest:
+                    tmp_path = object_path + ".tmp"
+                    link_file(file_path, tmp_path)
+                    os.replace(tmp_path, object_path)
+                files[os.path.relpath(file_path, self.base_dir)] = digest
+        entry_path = self._entry_path(stage, key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        with open(entry_path + ".tmp", 'wb') as f:
+            pickle.dump({'result': result, 'files': files,
+                         'outputs': [os.path.relpath(output, self.base_dir) for output in outputs]}, f)
+        os.replace(entry_path + ".tmp", entry_path)
+
+    def load(self, stage, key):
+        """
+        the stored entry {result, outputs, files}, or None when it is missing or one of its objects
+        was changed in place (e.g. a linked output rewritten by a standalone script)
+        """
+        if not self.has(stage, key):
+            return None
+        with open(self._entry_path(stage, key), 'rb') as f:
+            entry = pickle.load(f)
+        for digest in set(entry['files'].values()):
+            object_path = self._object_path(digest)
+            if not os.path.exists(object_path) or file_digest(object_path) != digest:
+                remove_path(object_path)
+                os.remove(self._entry_path(stage, key))
+                return None
+        return entry
+
+    def restore(self, entry):
+        """put a stored stage's output files back in place as links to their objects"""
+        for output in entry['outputs']:
+            remove_path(os.path.join(self.base_dir, output))
+        for file_path, digest in entry['files'].items():
+            link_file(self._object_path(digest), os.path.join(self.base_dir, file_path))
@@ -0,0 +1,183 @@
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import BM25IR as bm25
+import data_processing_bm25 as data_processing
+from evaluation import METRICS, Qrels, evaluate_scores, write_rows
+
+K_FOR_EVAL = 12
+
+# Default grid, centred on the values used by run_bm25.py
+DEFAULT_GRID = {
+    'k1': [0.8, 1.0, 1.2, 1.5, 2.0],
+    'b': [0.5, 0.65, 0.75, 0.9],
+    'k2': [100, 500],
+    'n_scale': [1, 2, 3],
+}
+
+# Per-worker state, populated once by _init_worker so the shared arguments are only pickled per process
+_worker_fn = None
+_worker_args = ()
+
+
+def get_paths():
+    """Get correct paths for the new folder structure."""
+    current_dir = os.path.dirname(os.path.abspath(__file__))  # src directory
+    parent_dir = os.path.dirname(current_dir)  # project root
+    data_dir = os.path.join(parent_dir, "data")
+
+    return {
+        'dataset_base_dir': os.path.join(data_dir, "DataSets"),
+        'eval_benchmark_base_dir': os.path.join(data_dir, "EvaluationBenchmark"),
+        'queries_file_path': os.path.join(data_dir, "Queries-1.txt"),
+        'stopwords_file_path': os.path.join(data_dir, "common-english-words.txt"),
+        'sweep_output_path': os.path.join(parent_dir, "outputs", "BM25", "BM25_Sweep_Results.csv")
+    }
+
+
+def load_topics(document_folder, queries, stop_word_path):
+    """
+    parse every dataset once and keep its collection, document frequencies and tokenised query
+
+    Args:
+        document_folder (str): the DataSets directory
+        queries (dict {RXXX : Title}): output from load_queries()
+        stop_word_path (str): full filepath for the stop words
+
+    Returns:
+        dict {XXX: (Rcv1Coll, df, query)}
+
+    """
+    stop_words = data_processing.load_stopwords(stop_word_path)
+    topics = {}
+    for folder_name in sorted(os.listdir(document_folder)):
+        folder_path = os.path.join(document_folder, folder_name)
+        if not os.path.isdir(folder_path):
+            continue
+        folder_ref = folder_name[-3:]
+        if "R" + folder_ref not in queries:
+            continue
+        pq = data_processing.parse_q(queries["R" + folder_ref], stop_words)
+        coll = data_processing.parse_docs(stop_words, folder_path)
+        topics[folder_ref] = (coll, bm25.df(coll), pq)
+    return topics
+
+
+def load_judgments(benchmark_folder):
+    """load the relevance judgments of every topic once, as evaluation.Qrels"""
+    return Qrels.load(benchmark_folder)
+
+
+def expand_grid(grid):
+    """turn {param: [values]} into a list of {param: value} dicts"""
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def _init_worker(fn, args, single_thread=False):
+    global _worker_fn, _worker_args
+    if single_thread:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    _worker_fn = fn
+    _worker_args = args
+
+
+def _run_combo(params):
+    return _worker_fn(*_worker_args, params)
+
+
+def map_grid(fn, args, combos, workers=None, single_thread=False):
+    """
+    fn(*args, params) for every params dict in combos, in order, across a process pool.
+    args (e.g. the parsed topics and judgments) are sent to each worker once rather than once per combination.
+
+    Args:
+        fn: a module-level function, so the workers can unpickle it
+        workers (int): number of worker processes (None = cpu count, 1 = in this process)
+        single_thread (bool): limit each worker to one BLAS/OpenMP thread
+
+    Returns:
+        list of fn results, in combos order
+
+    """
+    if workers == 1:
+        return [fn(*args, params) for params in combos]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(fn, args, single_thread)) as pool:
+        return list(pool.map(_run_combo, combos))
+
+
+def score_params(topics, qrels, params):
+    """
+    run bm25 with one parameter combination over all topics and average the metrics
+
+    Returns:
+        dict with the parameters plus MAP, P@12 and DCG@12
+
+    """
+    ap_list, pk_list, dcg_list = [], [], []
+    for code, (coll, df, pq) in topics.items():
+        scores = bm25.bm25(coll, pq, df, **params)
+        ap, pk, dcg = evaluate_scores(qrels, code, scores, K_FOR_EVAL)
+        ap_list.append(ap)
+        pk_list.append(pk)
+        dcg_list.append(dcg)
+
+    n = len(ap_list)
+    row = dict(params)
+    row['MAP'] = sum(ap_list) / n if n else 0.0
+    row['P@12'] = sum(pk_list) / n if n else 0.0
+    row['DCG@12'] = sum(dcg_list) / n if n else 0.0
+    return row
+
+
+def run_sweep(topics, qrels, grid=DEFAULT_GRID, workers=None):
+    """
+    evaluate every parameter combination in the grid across a process pool.
+    the parsed topics are sent to each worker once rather than once per combination.
+
+    Args:
+        topics (dict): output from load_topics()
+        qrels (Qrels): output from load_judgments()
+        grid (dict {param: [values]}): values for k1, b, k2 and n_scale
+        workers (int): number of worker processes (None = cpu count)
+
+    Returns:
+        list of result rows, in grid order
+
+    """
+    return map_grid(score_params, (topics, qrels), expand_grid(grid), workers)
+
+
+def write_results(rows, output_path):
+    """write a sweep or search results table as csv, one row per parameter combination (metrics to 4 decimals)"""
+    write_rows(rows, output_path, columns=METRICS)
+
+
+if __name__ == '__main__':
+    import sys
+
+    paths = get_paths()
+    for path in (paths['dataset_base_dir'], paths['eval_benchmark_base_dir'],
+                 paths['queries_file_path'], paths['stopwords_file_path']):
+        if not os.path.exists(path):
+            print(f"Error: Required path not found: {path}")
+            sys.exit(1)
+
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    query_dict = data_processing.load_queries(paths['queries_file_path'])
+    topics = load_topics(paths['dataset_base_dir'], query_dict, paths['stopwords_file_path'])
+    qrels = load_judgments(paths['eval_benchmark_base_dir'])
+    print(f"Parsed {len(topics)} datasets")
+
+    rows = run_sweep(topics, qrels, DEFAULT_GRID, workers)
+    write_results(rows, paths['sweep_output_path'])
+
+    best = max(rows, key=lambda r: r['MAP'])
+    print(f"Evaluated {len(rows)} parameter combinations")
+    print(f"Best MAP: {best['MAP']:.4f} with k1={best['k1']}, b={best['b']}, k2={best['k2']}, n_scale={best['n_scale']}")
+    print(f"Results saved to: {paths['sweep_output_path']}")
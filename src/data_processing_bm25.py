@@ -4,6 +4,7 @@ import DocV3_n11877022 as doc
 import Rcv1Coll_n11877022 as collection
 from stemming import stem
 import BM25IR as bm25
+import run_format
 
 def parse_docs(stop_words, inputfolder): 
     """
@@ -17,16 +18,15 @@ def parse_docs(stop_words, inputfolder):
         Rcv1Coll object (collection of DocV3 objects to represent the collection) 
 
     """        
-    os.chdir(inputfolder) #set the directory
-    list_of_xml = glob.glob('*.xml') #get list of xml files in dir
+    list_of_xml = glob.glob(os.path.join(inputfolder, '*.xml')) #get list of xml files in dir
     
     doc_collection = collection.Rcv1Coll()
     
     #for every xml file in the directory
     for d in list_of_xml:
         start_end = False # set flag to indicate whether we are at the start or the end of the text element.
-        myfile=open(d)
-        file_=myfile.readlines() #read in file contents into a list of strings (lines)       
+        with open(d) as myfile:
+            file_=myfile.readlines() #read in file contents into a list of strings (lines)       
         word_count = 0 #initialise word count to 0     
         curr_doc = doc.DocV3() #initialise empty docv3 object
         docid = None
@@ -63,10 +63,9 @@ def parse_docs(stop_words, inputfolder):
                     if len(word) > 2 and word not in stop_words:
                         curr_doc.add_term(word)
 
-        #populate the DocV3 attributes for this document and close the file     
+        #populate the DocV3 attributes for this document     
         curr_doc.set_docid(docid)
         curr_doc.set_doc_size(word_count)
-        myfile.close()
         
         #add the DocV3 object to the collection (this will also update the total doc length for the collection)
         doc_collection.add_doc(curr_doc)
@@ -154,7 +153,7 @@ def load_stopwords(stop_word_path):
     return stop_words
     
 
-def process_and_rank_datasets(inputfolder,outputfolder,queries,stop_word_path):
+def process_and_rank_datasets(inputfolder,outputfolder,queries,stop_word_path,write_files=True,on_ranked=None):
     """
     Iterates through each subdirectory in the input folder and parses the docs then gets df and bm25 score through call to bm25.py functions.
     prints bm25 ranking .dat files to output folder 
@@ -162,10 +161,16 @@ def process_and_rank_datasets(inputfolder,outputfolder,queries,stop_word_path):
     Args:
         inputfolder (str): Path to the dataset directory 
         outputfolder (str): Path to the output directory where ranking .dat files should be saved
+        write_files (bool): write the ranking .dat files (the scores are returned either way)
+        on_ranked (callable): called with (RXXX, {docid: bm25_score}) as soon as each dataset is ranked,
+            e.g. evaluation.EvaluationSink.add
+
+    Returns:
+        dict {RXXX: {docid: bm25_score}}
 
     """
     
-    datasets = []
+    runs = {}
     
     #stop words file assumed to be in
     stop_words = load_stopwords(stop_word_path)
@@ -197,14 +202,28 @@ def process_and_rank_datasets(inputfolder,outputfolder,queries,stop_word_path):
             
             #dict {docid:bm25_score} 
             bm_scores = bm25.bm25(temp_coll, pq, df)
+            #kept in ranked order, as in the file, so ties reach PRRM in the same order either way
+            runs["R"+folder_ref] = dict(sorted(bm_scores.items(), key=lambda x: x[1], reverse=True))
+            if on_ranked is not None:
+                on_ranked("R"+folder_ref, runs["R"+folder_ref])
 
-            outputpath = outputfolder+"\BM25IR_R"+ folder_ref + "Ranking.dat"
+            if not write_files:
+                continue
+
+            outputpath = os.path.join(outputfolder, "BM25IR_R" + folder_ref + "Ranking.dat")
             if not os.path.exists(outputpath): #don't append to existing files, if we want a new output we assume they've been deleted
                 wFile = open(outputpath, 'a')
                 #wFile.write('[')
                 count = 0
-                for (k, v) in sorted(bm_scores.items(), key=lambda x: x[1], reverse=True):
+                for (k, v) in runs["R"+folder_ref].items():
                     wFile.write(f"['{k}', '{v}']\n")
 
-                wFile.close()     
+                wFile.close()
+
+    #binary columnar copy of the whole run, written in one pass (same rule: only if not already there)
+    if write_files and runs:
+        binary_path = os.path.join(outputfolder, "BM25IR" + run_format.RUN_SUFFIX)
+        if not os.path.exists(binary_path):
+            run_format.write_run(binary_path, runs, "BM25IR")
 
+    return runs
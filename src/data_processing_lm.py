@@ -4,16 +4,14 @@ import string
 from stemming import stem
 
 
-stop_words_list = []
-
-def load_stopwords(filepath="common-english-words.txt"):
-    global stop_words_list
+def read_stopwords(filepath="common-english-words.txt"):
+    """the stop word list of a file, to pass to the parsing functions below"""
     with open(filepath, 'r', encoding='utf-8') as f:
-        stop_words_list = f.read().split(',')
-    stop_words_list = [word.strip().lower() for word in stop_words_list if word.strip()] 
+        words = f.read().split(',')
+    return [word.strip().lower() for word in words if word.strip()]
 
 
-def preprocess_text(text_content):
+def preprocess_text(text_content, stop_words=()):
     if text_content is None:
         return []
     text = text_content.lower()
@@ -23,7 +21,7 @@ def preprocess_text(text_content):
     tokens = []
     for term_token in text.split():
         stemmed_term = stem(term_token)
-        if len(stemmed_term) > 2 and stemmed_term not in stop_words_list:
+        if len(stemmed_term) > 2 and stemmed_term not in stop_words:
             tokens.append(stemmed_term)
     return tokens
 
@@ -45,7 +43,7 @@ class BowColl:
     def add_doc(self, doc_obj):
         self.docs[doc_obj.docid] = doc_obj
 
-def parse_dataset_xml(dataset_folder_path):
+def parse_dataset_xml(dataset_folder_path, stop_words=()):
     dataset_coll = BowColl()
     xml_files = glob.glob(os.path.join(dataset_folder_path, "*.xml"))
     if not xml_files:
@@ -76,7 +74,7 @@ def parse_dataset_xml(dataset_folder_path):
                             text_content_lines.append(line_content)
             if doc_id and text_content_lines:
                 full_text = " ".join(text_content_lines)
-                processed_terms = preprocess_text(full_text)
+                processed_terms = preprocess_text(full_text, stop_words)
                 doc_obj = BowDoc(doc_id)
                 doc_obj.add_processed_terms(processed_terms)
                 dataset_coll.add_doc(doc_obj)
@@ -87,7 +85,7 @@ def parse_dataset_xml(dataset_folder_path):
     return dataset_coll
 
 
-def parse_queries(queries_filepath="Queries-1.txt"):
+def parse_queries(queries_filepath="Queries-1.txt", stop_words=()):
     queries = {}  # {query_id: [processed_terms]}
     current_query_id = None
     current_title = ""
@@ -193,7 +191,7 @@ def parse_queries(queries_filepath="Queries-1.txt"):
                                        final_desc).strip()
                     
                     if full_query_text: # Only add if there's some text
-                        queries[current_query_id] = preprocess_text(full_query_text)
+                        queries[current_query_id] = preprocess_text(full_query_text, stop_words)
                     else:
                         print(f"Warning: Query {current_query_id} resulted in empty text after combining fields.")
                 
@@ -218,11 +216,11 @@ def calculate_collection_stats(dataset_coll: BowColl):
 
 if __name__ == '__main__':
     print("Testing data_processing_lm.py with revised extended query parsing...")
-    load_stopwords() 
-    print(f"Loaded {len(stop_words_list)} stopwords.")
+    stop_words = read_stopwords()
+    print(f"Loaded {len(stop_words)} stopwords.")
 
     if os.path.exists("Queries-1.txt"):
-        queries = parse_queries()
+        queries = parse_queries(stop_words=stop_words)
         print(f"Parsed {len(queries)} queries.")
         if 'R103' in queries:
              print(f"Example R103 processed terms: {queries['R103']}")
@@ -234,7 +232,7 @@ if __name__ == '__main__':
 
     # Test dataset parsing (requires DataSets/Dataset101 to exist)
     if os.path.exists(os.path.join("DataSets", "Dataset101")):
-        dataset_coll_101 = parse_dataset_xml(os.path.join("DataSets", "Dataset101"))
+        dataset_coll_101 = parse_dataset_xml(os.path.join("DataSets", "Dataset101"), stop_words)
         print(f"Parsed {len(dataset_coll_101.docs)} documents from Dataset101.")
     else:
         print("DataSets/Dataset101 not found, skipping dataset parsing test.")
\ No newline at end of file
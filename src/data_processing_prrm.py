@@ -4,27 +4,32 @@ import xml.etree.ElementTree as ET
 from stemming import stem
 
 class Doc:
-    def __init__(self, doc_id):
+    def __init__(self, doc_id, keep_positions=False):
         self.doc_id = doc_id
         self.terms = {}
+        self.positions = {} if keep_positions else None  # term -> [word positions], see positional_index
 
-    def add_term(self, term):
+    def add_term(self, term, position=None):
         term = stem(term.lower())
         if len(term) > 2:
             self.terms[term] = self.terms.get(term, 0) + 1
+            if self.positions is not None and position is not None:
+                self.positions.setdefault(term, []).append(position)
 
 def load_stop_words(filepath):
     with open(filepath, 'r') as f:
         return set(f.read().strip().split(','))
 
-def parse_docs(dataset_path, stop_words):
+# positions=True also records each term's word positions in the text (stop words included in the count)
+def parse_docs(dataset_path, stop_words, positions=False):
     documents = {}
     for file in os.listdir(dataset_path):
         if file.endswith(".xml"):
             tree = ET.parse(os.path.join(dataset_path, file))
             root = tree.getroot()
             doc_id = root.attrib["itemid"]
-            doc = Doc(doc_id)
+            doc = Doc(doc_id, positions)
+            position = 0
             text_elements = root.findall(".//text//p")
             for elem in text_elements:
                 line = elem.text if elem.text else ""
@@ -32,7 +37,8 @@ def parse_docs(dataset_path, stop_words):
                 line = line.translate(str.maketrans(string.punctuation, ' ' * len(string.punctuation)))
                 for word in line.split():
                     if word not in stop_words:
-                        doc.add_term(word)
+                        doc.add_term(word, position)
+                    position += 1
             documents[doc_id] = doc
     return documents
 
@@ -0,0 +1,355 @@
+import os
+import math
+from collections import Counter
+
+import numpy as np
+from scipy.stats import kendalltau
+
+import BM25IR
+import data_processing_bm25
+import data_processing_lm
+import data_processing_prrm
+from LMRM import rank_documents_lmrm
+from evaluation import METRICS, Qrels, evaluate, write_rows
+from inverted_index import build_index_from_coll, build_index_from_bow
+from impact_index import build_impact_index
+from index_pruning import posting_impacts, prune_index
+from feature_store import get_feature_store
+from run_prrm import extract_queries, prrm_rank, select_training_docs
+
+TOP_K = 12
+# Scores equal to this many decimals count as ties; ties are broken by docid in both rankings
+TIE_DECIMALS = 9
+
+# Bounds an engine must stay within on every topic; metric bounds are on |candidate - reference|
+EXACT = {'max_score_delta': 1e-9, 'min_overlap': 1.0, 'min_tau': 0.9999,
+         'max_MAP_delta': 1e-9, 'max_P@12_delta': 1e-9, 'max_DCG@12_delta': 1e-9}
+# Lossy engines are held to the quality they are expected to keep (worst topic of the 50)
+DEFAULT_TOLERANCES = {
+    'bm25_index': EXACT,
+    'bm25_top_k': EXACT,
+    'bm25_impact16': {'max_score_delta': 1e-3, 'min_overlap': 1.0, 'min_tau': 0.995,
+                      'max_MAP_delta': 0.01, 'max_P@12_delta': 0.01, 'max_DCG@12_delta': 0.05},
+    'bm25_impact8': {'max_score_delta': 0.1, 'min_overlap': 0.75, 'min_tau': 0.9,
+                     'max_MAP_delta': 0.1, 'max_P@12_delta': 0.1, 'max_DCG@12_delta': 0.5},
+    'bm25_pruned10': {'max_score_delta': math.inf, 'min_overlap': 0.4, 'min_tau': 0.25,
+                      'max_MAP_delta': 0.3, 'max_P@12_delta': 0.2, 'max_DCG@12_delta': 2.0},
+    'lmrm_index': EXACT,
+    'prrm_streaming': {'max_score_delta': math.inf, 'min_overlap': 0.6, 'min_tau': 0.7,
+                       'max_MAP_delta': 0.3, 'max_P@12_delta': 0.2, 'max_DCG@12_delta': 1.0},
+}
+
+
+def get_paths():
+    """Get correct paths for the new folder structure."""
+    current_dir = os.path.dirname(os.path.abspath(__file__))  # src directory
+    parent_dir = os.path.dirname(current_dir)  # project root
+    data_dir = os.path.join(parent_dir, "data")
+
+    return {
+        'dataset_base_dir': os.path.join(data_dir, "DataSets"),
+        'eval_benchmark_base_dir': os.path.join(data_dir, "EvaluationBenchmark"),
+        'queries_file_path': os.path.join(data_dir, "Queries-1.txt"),
+        'stopwords_file_path': os.path.join(data_dir, "common-english-words.txt"),
+        'report_output_path': os.path.join(parent_dir, "outputs", "EQUIVALENCE", "Equivalence_Report.csv")
+    }
+
+
+class Corpus:
+    """
+    the queries and stop words of every model's preprocessing, read once. topics are parsed
+    lazily, each engine family in its own way, so the reference and the candidates of a family
+    score exactly the same documents and query.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+        stopwords_path = paths['stopwords_file_path']
+        self.bm25_stop_words = data_processing_bm25.load_stopwords(stopwords_path)
+        self.bm25_queries = data_processing_bm25.load_queries(paths['queries_file_path'])
+        self.lm_stop_words = data_processing_lm.read_stopwords(stopwords_path)
+        self.lm_queries = data_processing_lm.parse_queries(paths['queries_file_path'], self.lm_stop_words)
+        self.prrm_stop_words = data_processing_prrm.load_stop_words(stopwords_path)
+        self.prrm_queries = extract_queries(paths['queries_file_path'])
+
+    def topics(self, codes=None):
+        """Topic objects for every dataset folder with a query (or only the given XXX codes)"""
+        base = self.paths['dataset_base_dir']
+        found = {}
+        for folder_name in sorted(os.listdir(base)):
+            code = folder_name[-3:]
+            if os.path.isdir(os.path.join(base, folder_name)) and "R" + code in self.bm25_queries:
+                if codes is None or code in codes:
+                    found[code] = Topic(self, code, os.path.join(base, folder_name))
+        return found
+
+
+class Topic:
+    """one dataset and its query. parsed collections, indexes and reference scores are kept per topic"""
+
+    def __init__(self, corpus, code, dataset_path):
+        self.corpus = corpus
+        self.code = code
+        self.dataset_path = dataset_path
+        self._cache = {}
+
+    def _get(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def bm25_input(self):
+        """(Rcv1Coll, df, query) as run_bm25 sees them"""
+        def build():
+            coll = data_processing_bm25.parse_docs(self.corpus.bm25_stop_words, self.dataset_path)
+            pq = data_processing_bm25.parse_q(self.corpus.bm25_queries["R" + self.code], self.corpus.bm25_stop_words)
+            return coll, BM25IR.df(coll), pq
+        return self._get('bm25_input', build)
+
+    def bm25_index(self):
+        return self._get('bm25_index', lambda: build_index_from_coll(self.bm25_input()[0]))
+
+    def lm_input(self):
+        """(BowColl, query term list, collection term frequencies, total words) as run_lmrm sees them"""
+        def build():
+            dataset_coll = data_processing_lm.parse_dataset_xml(self.dataset_path, self.corpus.lm_stop_words)
+            cf, total = data_processing_lm.calculate_collection_stats(dataset_coll)
+            return dataset_coll, self.corpus.lm_queries.get("R" + self.code, []), cf, total
+        return self._get('lm_input', build)
+
+    def lm_index(self):
+        return self._get('lm_index', lambda: build_index_from_bow(self.lm_input()[0]))
+
+    def prrm_input(self):
+        """(documents, query terms, feature store) as run_prrm sees them"""
+        def build():
+            stop_words = self.corpus.prrm_stop_words
+            documents = data_processing_prrm.parse_docs(self.dataset_path, stop_words)
+            query_terms = data_processing_prrm.parse_query(self.corpus.prrm_queries.get(self.code, ""), stop_words)
+            return documents, query_terms, get_feature_store(documents, self.dataset_path, stop_words)
+        return self._get('prrm_input', build)
+
+    def reference(self, family):
+        """reference scores {docid: score} of an engine family, computed once"""
+        return self._get(('reference', family), lambda: REFERENCES[family](self))
+
+
+def _bm25_reference(topic):
+    coll, df, pq = topic.bm25_input()
+    return BM25IR.bm25(coll, pq, df)
+
+
+def _lmrm_reference(topic):
+    dataset_coll, query_terms, cf, total = topic.lm_input()
+    return dict(rank_documents_lmrm(dataset_coll, query_terms, cf, total))
+
+
+def _prrm_scores(topic, batch_size=None):
+    documents, query_terms, store = topic.prrm_input()
+    bm25_scores, lmrm_scores = topic.reference("bm25"), topic.reference("lmrm")
+    training_docs, labels = select_training_docs(documents, bm25_scores, lmrm_scores)
+    if training_docs is None:
+        return {}
+    # select_training_docs walks sets, so fix the order to make both models independent of the hash seed
+    order = sorted(range(len(training_docs)), key=lambda i: training_docs[i].doc_id)
+    training_docs, labels = [training_docs[i] for i in order], [labels[i] for i in order]
+    return {doc_id: float(score) for doc_id, score in prrm_rank(query_terms, documents, training_docs, labels,
+                                                                  bm25_scores, lmrm_scores, store,
+                                                                  batch_size=batch_size)}
+
+
+def _impact_scores(topic, bits):
+    return build_impact_index(topic.bm25_index(), bits).bm25(topic.bm25_input()[2])
+
+
+def _pruned_scores(topic, fraction):
+    index = topic.bm25_index()
+    pruned, full_df = prune_index(index, posting_impacts(index), fraction)
+    return pruned.bm25(topic.bm25_input()[2], df=full_df)
+
+
+# The model each family is checked against: today's implementation of it
+REFERENCES = {
+    "bm25": _bm25_reference,
+    "lmrm": _lmrm_reference,
+    "prrm": _prrm_scores,
+}
+
+# Candidate engines: name -> (family, function(topic) -> {docid: score})
+ENGINES = {
+    "bm25_index": ("bm25", lambda t: t.bm25_index().bm25(t.bm25_input()[2])),
+    "bm25_top_k": ("bm25", lambda t: dict(t.bm25_index().bm25_top_k(t.bm25_input()[2], t.bm25_index().num_docs))),
+    "bm25_impact16": ("bm25", lambda t: _impact_scores(t, 16)),
+    "bm25_impact8": ("bm25", lambda t: _impact_scores(t, 8)),
+    "bm25_pruned10": ("bm25", lambda t: _pruned_scores(t, 0.1)),
+    "lmrm_index": ("lmrm", lambda t: t.lm_index().lmrm(Counter(t.lm_input()[1]))),
+    "prrm_streaming": ("prrm", lambda t: _prrm_scores(t, batch_size=256)),
+}
+
+
+def register_engine(name, family, score_fn, tolerance=EXACT):
+    """add a candidate engine; score_fn(topic) returns {docid: score} for the family's documents"""
+    if family not in REFERENCES:
+        raise ValueError(f"Unknown engine family: {family}")
+    ENGINES[name] = (family, score_fn)
+    DEFAULT_TOLERANCES[name] = dict(tolerance)
+
+
+def canonical_ranking(scores):
+    """docids by descending score, ties (to TIE_DECIMALS) by ascending docid"""
+    return sorted(scores, key=lambda d: (-round(scores[d], TIE_DECIMALS), d))
+
+
+def compare_scores(reference, candidate, k=TOP_K):
+    """
+    compare a candidate ranking with the reference one over the reference's documents
+
+    Args:
+        reference (dict): {docid: score} of the reference implementation
+        candidate (dict): {docid: score} of the engine (missing documents count as unscored)
+        k (int): cutoff for the top-k overlap
+
+    Returns:
+        dict {max_score_delta, mean_score_delta, overlap, tau, missing}
+
+    """
+    doc_ids = list(reference)
+    missing = sum(1 for d in doc_ids if d not in candidate)
+    ref = np.fromiter((reference[d] for d in doc_ids), dtype=np.float64, count=len(doc_ids))
+    cand = np.fromiter((candidate.get(d, -math.inf) for d in doc_ids), dtype=np.float64, count=len(doc_ids))
+    delta = np.abs(ref - cand) if not missing else np.full(len(doc_ids), math.inf)
+
+    ref_top = set(canonical_ranking(reference)[:k])
+    cand_top = set(canonical_ranking({d: candidate.get(d, -math.inf) for d in doc_ids})[:k])
+    overlap = len(ref_top & cand_top) / min(k, len(doc_ids)) if doc_ids else 1.0
+
+    if len(doc_ids) < 2 or missing:
+        tau = 1.0 if not missing else 0.0
+    else:
+        tau = kendalltau(ref, cand).statistic
+        tau = 1.0 if math.isnan(tau) else float(tau)  # constant scores on both sides
+    return {'max_score_delta': float(delta.max()) if len(delta) else 0.0,
+            'mean_score_delta': float(delta.mean()) if len(delta) else 0.0,
+            'overlap': overlap, 'tau': tau, 'missing': missing}
+
+
+def metric_deltas(qrels, topic, reference, candidate, metrics=METRICS):
+    """candidate minus reference for each metric, with both rankings in canonical order"""
+    if topic not in qrels.doc_ids:
+        return {m: 0.0 for m in metrics}
+    ref = evaluate(qrels, {topic: {d: reference[d] for d in canonical_ranking(reference)}}, metrics=metrics)[topic]
+    cand = evaluate(qrels, {topic: {d: candidate[d] for d in canonical_ranking(candidate)}}, metrics=metrics)[topic]
+    return {m: cand[m] - ref[m] for m in metrics}
+
+
+def check(row, tolerance):
+    """names of the tolerance bounds a comparison row breaks"""
+    failed = []
+    if row['max_score_delta'] > tolerance['max_score_delta']:
+        failed.append('score')
+    if row['overlap'] < tolerance['min_overlap']:
+        failed.append('overlap')
+    if row['tau'] < tolerance['min_tau']:
+        failed.append('tau')
+    failed.extend(m for m in METRICS if abs(row[m]) > tolerance[f"max_{m}_delta"])
+    return failed
+
+
+def run_harness(topics, qrels, engines=None, tolerances=None, k=TOP_K, verbose=True):
+    """
+    score every topic with each engine and its family's reference and compare them
+
+    Args:
+        topics (dict): Corpus.topics() output {XXX: Topic}
+        qrels (Qrels): judgments for the metric differences
+        engines (list): engine names from ENGINES (default: all)
+        tolerances (dict): {engine: tolerance dict} overriding DEFAULT_TOLERANCES
+
+    Returns:
+        list of rows {engine, family, topic, score deltas, overlap, tau, metric deltas, passed, failed}
+
+    """
+    engines = list(ENGINES) if engines is None else engines
+    tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+    rows = []
+    for code, topic in topics.items():
+        if verbose:
+            print(f"R{code}: {', '.join(engines)}")
+        for name in engines:
+            family, score_fn = ENGINES[name]
+            reference = topic.reference(family)
+            candidate = score_fn(topic)
+            row = {'engine': name, 'family': family, 'topic': code}
+            row.update(compare_scores(reference, candidate, k))
+            row.update(metric_deltas(qrels, code, reference, candidate))
+            failed = check(row, tolerances.get(name, EXACT))
+            row['passed'] = not failed
+            row['failed'] = " ".join(failed)
+            rows.append(row)
+    return rows
+
+
+def summarize(rows):
+    """per-engine worst case over the topics: {engine: {topics, failed_topics, max_score_delta, min_overlap, ...}}"""
+    summary = {}
+    for row in rows:
+        s = summary.setdefault(row['engine'], {'topics': 0, 'failed_topics': 0, 'max_score_delta': 0.0,
+                                               'min_overlap': 1.0, 'min_tau': 1.0})
+        s['topics'] += 1
+        s['failed_topics'] += not row['passed']
+        s['max_score_delta'] = max(s['max_score_delta'], row['max_score_delta'])
+        s['min_overlap'] = min(s['min_overlap'], row['overlap'])
+        s['min_tau'] = min(s['min_tau'], row['tau'])
+        for m in METRICS:
+            s[f"max_{m}_delta"] = max(s.get(f"max_{m}_delta", 0.0), abs(row[m]))
+    return summary
+
+
+def write_report(rows, output_path):
+    """write the per (engine, topic) comparison rows as csv"""
+    write_rows(rows, output_path, float_format=".6g")
+
+
+def parse_tolerance(specs):
+    """["engine.field=value", ...] -> {engine: tolerance dict} starting from the engine's defaults"""
+    tolerances = {}
+    for spec in specs:
+        key, value = spec.split("=", 1)
+        engine, field = key.split(".", 1)
+        if engine not in ENGINES or field not in EXACT:
+            raise ValueError(f"Unknown tolerance: {key}")
+        tolerances.setdefault(engine, dict(DEFAULT_TOLERANCES.get(engine, EXACT)))[field] = float(value)
+    return tolerances
+
+
+if __name__ == '__main__':
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check candidate ranking engines against the reference models")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument("--topics", nargs="+", default=None, help="topic numbers, e.g. 101 102 (default: all)")
+    parser.add_argument("--k", type=int, default=TOP_K, help="cutoff for the top-k overlap")
+    parser.add_argument("--tolerance", action="append", default=[], metavar="ENGINE.FIELD=VALUE",
+                        help="override a bound, e.g. bm25_impact8.min_tau=0.95 or bm25_impact8.max_MAP_delta=0.05")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    corpus = Corpus(paths)
+    topics = corpus.topics(set(args.topics) if args.topics else None)
+    qrels = Qrels.load(paths['eval_benchmark_base_dir'])
+
+    rows = run_harness(topics, qrels, args.engines, parse_tolerance(args.tolerance), args.k)
+    write_report(rows, paths['report_output_path'])
+
+    summary = summarize(rows)
+    print(f"\n--- Ranking equivalence over {len(topics)} topics (top-{args.k} overlap) ---")
+    print(f"{'Engine':<15} | {'Max |score diff|':>16} | {'Min overlap':>11} | {'Min tau':>7} | "
+          f"{'MAP diff':>8} | {'P@12 diff':>9} | {'DCG@12 diff':>11} | Result")
+    print("-" * 113)
+    for name, s in summary.items():
+        result = "PASS" if not s['failed_topics'] else f"FAIL ({s['failed_topics']}/{s['topics']} topics)"
+        print(f"{name:<15} | {s['max_score_delta']:>16.3g} | {s['min_overlap']:>11.3f} | {s['min_tau']:>7.4f} | "
+              f"{s['max_MAP_delta']:>8.4f} | {s['max_P@12_delta']:>9.4f} | {s['max_DCG@12_delta']:>11.4f} | {result}")
+    print(f"\nReport saved to: {paths['report_output_path']}")
+    sys.exit(0 if all(row['passed'] for row in rows) else 1)
@@ -0,0 +1,408 @@
+import os
+import re
+import csv
+
+import numpy as np
+
+from run_format import BinaryRun, binary_run_path, docid_array, read_run
+
+K_FOR_EVAL = 12
+
+# Metrics reported for every run, in table order
+METRICS = ("MAP", "P@12", "DCG@12")
+# Deeper metric set, computed on request
+ALL_METRICS = METRICS + ("nDCG@12", "R-prec", "Recall@12", "RR")
+
+
+class Qrels:
+    """
+    relevance judgments of every topic, read once from the EvaluationBenchmark files.
+    each topic keeps its judged docids as a sorted int64 array with the relevance values
+    alongside, so a ranking is looked up with one searchsorted instead of a dict per document.
+    """
+
+    def __init__(self, judgments):
+        self.doc_ids = {}  # topic -> sorted int64 docids
+        self.rels = {}  # topic -> relevance values aligned with doc_ids
+        self.n_relevant = {}  # topic -> number of relevant documents
+        for topic, rel_map in judgments.items():
+            ids = docid_array(rel_map.keys())
+            rels = np.fromiter(rel_map.values(), dtype=np.float64, count=len(rel_map))
+            order = np.argsort(ids)
+            self.doc_ids[topic] = ids[order]
+            self.rels[topic] = rels[order]
+            self.n_relevant[topic] = int((rels > 0).sum())
+
+    @classmethod
+    def load(cls, benchmark_dir):
+        """read every DatasetXXX.txt ("RXXX docid rel" lines) in benchmark_dir"""
+        judgments = {}
+        pattern = re.compile(r"Dataset(\d+)\.txt$")
+        for name in sorted(os.listdir(benchmark_dir)):
+            match = pattern.match(name)
+            if not match:
+                continue
+            topic = match.group(1)
+            rel_map = {}
+            with open(os.path.join(benchmark_dir, name), 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 3 and parts[0] == f"R{topic}":
+                        rel_map[parts[1]] = int(float(parts[2]))
+            judgments[topic] = rel_map
+        return cls(judgments)
+
+    @property
+    def topics(self):
+        return sorted(self.doc_ids)
+
+    def lookup(self, topic, doc_ids):
+        """relevance of each docid (unjudged = 0) as a float array"""
+        judged = self.doc_ids.get(topic)
+        if judged is None or len(judged) == 0 or len(doc_ids) == 0:
+            return np.zeros(len(doc_ids))
+        pos = np.searchsorted(judged, doc_ids).clip(max=len(judged) - 1)
+        return np.where(judged[pos] == doc_ids, self.rels[topic][pos], 0.0)
+
+    def relevance_matrix(self, run, topics=None, depth=None):
+        """
+        rank every topic of a run and look up the relevance of each rank
+
+        Args:
+            run (dict or BinaryRun): {topic: {docid: score}}, or a run_format.BinaryRun whose arrays are used as they are
+            topics (list): topics to include (default: those of the run that have judgments)
+            depth (int): ranks kept per topic (default: the longest ranking)
+
+        Returns:
+            (topics, (topics, ranks) relevance array padded with 0, (topics,) number of relevant documents)
+
+        """
+        columnar = isinstance(run, BinaryRun)
+        if topics is None:
+            topics = [t for t in sorted(run.topics if columnar else run) if t in self.doc_ids]
+        ranked = []
+        for topic in topics:
+            if columnar:
+                ids, values = run.topic(topic) if topic in run.index else (np.empty(0, np.int64), np.empty(0))
+                values = values.astype(np.float64)
+            else:
+                scores = run.get(topic, {})
+                ids = docid_array(scores.keys())
+                values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+            order = np.argsort(-values, kind="stable")  # ties keep the run's order
+            ranked.append(self.lookup(topic, ids[order]))
+        width = depth if depth is not None else max((len(r) for r in ranked), default=0)
+        rel = np.zeros((len(topics), width))
+        for t, r in enumerate(ranked):
+            rel[t, :min(len(r), width)] = r[:width]
+        n_relevant = np.array([self.n_relevant.get(topic, 0) for topic in topics], dtype=np.float64)
+        return topics, rel, n_relevant
+
+    def ideal_matrix(self, topics, depth=K_FOR_EVAL):
+        """(topics, depth) relevance array of each topic's judgments sorted best first, the ideal ranking"""
+        ideal = np.zeros((len(topics), depth))
+        for t, topic in enumerate(topics):
+            best = -np.sort(-self.rels.get(topic, np.zeros(0)))[:depth]
+            ideal[t, :len(best)] = best
+        return ideal
+
+
+def average_precision(rel, n_relevant):
+    """AP of each row of a (topics, ranks) relevance array: sum of precision at relevant ranks / relevant docs"""
+    hits = rel > 0
+    precision = np.cumsum(hits, axis=1) / np.arange(1, rel.shape[1] + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ap = (precision * hits).sum(axis=1) / n_relevant
+    return np.where(n_relevant > 0, ap, 0.0)
+
+
+def precision_at_k(rel, k=K_FOR_EVAL):
+    """relevant documents in the top k / k, per row"""
+    return (rel[:, :k] > 0).sum(axis=1) / float(k)
+
+
+def recall_at_k(rel, n_relevant, k=K_FOR_EVAL):
+    """relevant documents in the top k / all relevant documents, per row"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        recall = (rel[:, :k] > 0).sum(axis=1) / n_relevant
+    return np.where(n_relevant > 0, recall, 0.0)
+
+
+def r_precision(rel, n_relevant):
+    """precision at rank R, R being the number of relevant documents of the topic, per row"""
+    if rel.shape[1] == 0:
+        return np.zeros(rel.shape[0])
+    hits = np.cumsum(rel > 0, axis=1)
+    cut = np.clip(n_relevant.astype(np.int64), 1, rel.shape[1]) - 1
+    found = np.take_along_axis(hits, cut[:, None], axis=1)[:, 0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n_relevant > 0, found / n_relevant, 0.0)
+
+
+def reciprocal_rank(rel):
+    """1 / rank of the first relevant document (0 when none is retrieved), per row"""
+    hits = rel > 0
+    first = hits.argmax(axis=1)
+    return np.where(hits.any(axis=1), 1.0 / (first + 1), 0.0)
+
+
+def dcg_at_k(rel, k=K_FOR_EVAL):
+    """
+    DCG@k per row: rel_1 + sum over i = 2..k of rel_i / log2(i), the formula every model is reported with
+
+    Args:
+        rel (array): (topics, ranks) relevance array
+
+    """
+    ranks = np.arange(1, min(k, rel.shape[1]) + 1)
+    top = rel[:, :len(ranks)]
+    discount = np.ones(len(ranks))
+    discount[1:] = 1.0 / np.log2(ranks[1:])
+    return top @ discount
+
+
+def ndcg_at_k(rel, ideal, k=K_FOR_EVAL):
+    """DCG@k normalized by the DCG@k of the ideal ranking (Qrels.ideal_matrix), per row"""
+    ideal_dcg = dcg_at_k(ideal, k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(ideal_dcg > 0, dcg_at_k(rel, k) / ideal_dcg, 0.0)
+
+
+def metric_columns(qrels, topics, rel, n_relevant, k=K_FOR_EVAL, metrics=METRICS):
+    """compute the named metrics over a relevance matrix, {metric: (topics,) array}"""
+    kernels = {
+        "MAP": lambda: average_precision(rel, n_relevant),
+        "P@12": lambda: precision_at_k(rel, k),
+        "DCG@12": lambda: dcg_at_k(rel, k),
+        "nDCG@12": lambda: ndcg_at_k(rel, qrels.ideal_matrix(topics, k), k),
+        "R-prec": lambda: r_precision(rel, n_relevant),
+        "Recall@12": lambda: recall_at_k(rel, n_relevant, k),
+        "RR": lambda: reciprocal_rank(rel),
+    }
+    return {name: kernels[name]() for name in metrics}
+
+
+def evaluate(qrels, run, k=K_FOR_EVAL, topics=None, metrics=METRICS):
+    """
+    evaluate one run over all of its judged topics in a single vectorized pass
+
+    Args:
+        qrels (Qrels): judgments loaded once with Qrels.load()
+        run (dict or BinaryRun): {topic: {docid: score}} or a run_format.BinaryRun
+        metrics (tuple): names from ALL_METRICS to compute
+
+    Returns:
+        dict {topic: {"MAP": AP, "P@12": P@k, "DCG@12": DCG@k, ...}}
+
+    """
+    topics, rel, n_relevant = qrels.relevance_matrix(run, topics)
+    columns = metric_columns(qrels, topics, rel, n_relevant, k, metrics)
+    return {topic: {name: float(values[t]) for name, values in columns.items()}
+            for t, topic in enumerate(topics)}
+
+
+def evaluate_runs(qrels, runs, k=K_FOR_EVAL, metrics=METRICS):
+    """evaluate several runs against the same qrels: {run name: evaluate() table}"""
+    return {name: evaluate(qrels, run, k, metrics=metrics) for name, run in runs.items()}
+
+
+def evaluate_scores(qrels, topic, scores, k=K_FOR_EVAL):
+    """
+    evaluate one topic's ranking on its own, e.g. inside a parameter sweep
+
+    Args:
+        qrels (Qrels): judgments loaded once with Qrels.load()
+        topic (str): query id with or without the R
+        scores (dict): {docid: score}, ranked highest first (ties keep the dict's order)
+
+    Returns:
+        (AP, P@k, DCG@k), all 0.0 for a topic without judgments
+    """
+    topic = topic[1:] if topic.startswith("R") else topic
+    row = evaluate(qrels, {topic: scores}, k, topics=[topic])[topic]
+    return row["MAP"], row["P@12"], row["DCG@12"]
+
+
+def table_metrics(table):
+    """metric names of an evaluate() table, in column order"""
+    return list(next(iter(table.values()))) if table else list(METRICS)
+
+
+def averages(table):
+    """mean of every metric over the topics of an evaluate() table"""
+    n = len(table)
+    return {name: (sum(row[name] for row in table.values()) / n if n else 0.0) for name in table_metrics(table)}
+
+
+def write_results(table, output_path, digits=None):
+    """
+    write an evaluate() table as csv (Query, MAP, P@12, DCG@12, ... with an Average row) in a single write.
+    digits rounds the values (None keeps full precision)
+    """
+    fmt = (lambda v: f"{v:.{digits}f}") if digits is not None else repr
+    metrics = table_metrics(table)
+    lines = ["Query," + ",".join(metrics)]
+    for topic, row in table.items():
+        lines.append(f"R{topic}," + ",".join(fmt(row[name]) for name in metrics))
+    avg = averages(table)
+    lines.append("Average," + ",".join(fmt(avg[name]) for name in metrics))
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def write_rows(rows, output_path, float_format=".4f", columns=None):
+    """
+    write a list of row dicts (one column per key of the first row) as csv, with float values
+    formatted by float_format. columns limits the formatting to those keys
+    """
+    if not rows:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: (format(v, float_format) if isinstance(v, float) and (columns is None or k in columns)
+                                 else v) for k, v in row.items()})
+
+
+def print_results(table, model_name):
+    """print the per-topic metric table and its averages"""
+    metrics = table_metrics(table)
+    print(f"\n {model_name} Evaluation Results")
+    print(f"{'Query':>7} " + " ".join(f"{name:>9}" for name in metrics))
+    for topic, row in table.items():
+        print(f"{'R' + topic:>7} " + " ".join(f"{row[name]:>9.4f}" for name in metrics))
+    avg = averages(table)
+    print(f"{'Average':>7} " + " ".join(f"{avg[name]:>9.4f}" for name in metrics))
+
+
+class EvaluationSink:
+    """
+    evaluates rankings as a run produces them. each finished topic is scored on its own, the running
+    averages are updated and the row is appended to the output csv straight away, so the quality of a
+    long run can be followed while it is still going. close() rewrites the csv in topic order with the
+    Average row, the same table write_results produces
+    """
+
+    def __init__(self, qrels, k=K_FOR_EVAL, metrics=METRICS, output_path=None, model_name="", verbose=True):
+        self.qrels = qrels
+        self.k = k
+        self.metrics = tuple(metrics)
+        self.output_path = output_path
+        self.model_name = model_name
+        self.verbose = verbose
+        self.table = {}  # topic -> {metric: value}, in completion order
+        self.totals = dict.fromkeys(self.metrics, 0.0)
+        self._file = None
+        if output_path:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            self._file = open(output_path, 'w', encoding='utf-8')
+            self._file.write("Query," + ",".join(self.metrics) + "\n")
+            self._file.flush()
+
+    def add(self, topic, scores):
+        """
+        evaluate one finished topic
+
+        Args:
+            topic (str): query id with or without the R
+            scores (dict or list): {docid: score} or (docid, score) pairs
+
+        Returns:
+            the topic's {metric: value} row, or None when it has no judgments
+        """
+        topic = topic[1:] if topic.startswith("R") else topic
+        run = {topic: dict(scores)}
+        row = evaluate(self.qrels, run, self.k, metrics=self.metrics).get(topic)
+        if row is not None:
+            self.record(topic, row)
+        return row
+
+    def record(self, topic, row):
+        """take a row already computed elsewhere, e.g. by a worker process with its own sink"""
+        self.table[topic] = row
+        for name in self.metrics:
+            self.totals[name] += row[name]
+        if self._file:
+            self._file.write(f"R{topic}," + ",".join(repr(row[name]) for name in self.metrics) + "\n")
+            self._file.flush()
+        if self.verbose:
+            avg = self.averages()
+            print(f" {self.model_name} R{topic}: " + " ".join(f"{n} {row[n]:.4f}" for n in self.metrics)
+                  + f" | running over {len(self.table)} topics: "
+                  + " ".join(f"{n} {avg[n]:.4f}" for n in self.metrics))
+
+    def averages(self):
+        n = len(self.table)
+        return {name: (total / n if n else 0.0) for name, total in self.totals.items()}
+
+    def sorted_table(self):
+        return {topic: self.table[topic] for topic in sorted(self.table)}
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+            write_results(self.sorted_table(), self.output_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_ranking_file(filepath):
+    """read one ranking file, in the BM25 "['docid', 'score']" or the LMRM/PRRM "docid score" format"""
+    scores = {}
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = [item.strip().strip("'\"") for item in line.strip().strip("[]").replace(",", " ").split()]
+            if len(parts) == 2:
+                try:
+                    scores[parts[0]] = float(parts[1])
+                except ValueError:
+                    continue
+    return scores
+
+
+def load_run_dir(directory, prefix):
+    """
+    read <prefix>_RXXXRanking.dat files into {XXX: {docid: score}}, or the binary <prefix>.run
+    run_format file instead when it is there and up to date
+    """
+    binary_path = binary_run_path(directory, prefix)
+    if binary_path:
+        return read_run(binary_path).to_runs()
+    pattern = re.compile(re.escape(prefix) + r"_R(\d+)Ranking\.dat$")
+    run = {}
+    for name in sorted(os.listdir(directory)):
+        match = pattern.match(name)
+        if match:
+            run[match.group(1)] = load_ranking_file(os.path.join(directory, name))
+    return run
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Evaluate ranking runs against the EvaluationBenchmark judgments")
+    parser.add_argument("runs", nargs="+", metavar="NAME=DIR:PREFIX",
+                        help="e.g. BM25=outputs/BM25/rankings:BM25IR")
+    parser.add_argument("--benchmark-dir", default=os.path.join(parent_dir, "data", "EvaluationBenchmark"))
+    parser.add_argument("--output-dir", default=None, help="write <NAME>_Evaluation_Results.csv for each run here")
+    parser.add_argument("--all-metrics", action="store_true",
+                        help="also report nDCG@12, R-precision, recall@12 and reciprocal rank")
+    args = parser.parse_args()
+
+    qrels = Qrels.load(args.benchmark_dir)
+    for spec in args.runs:
+        name, location = spec.split("=", 1)
+        directory, prefix = location.rsplit(":", 1)
+        table = evaluate(qrels, load_run_dir(directory, prefix), metrics=ALL_METRICS if args.all_metrics else METRICS)
+        print_results(table, name)
+        if args.output_dir:
+            write_results(table, os.path.join(args.output_dir, f"{name}_Evaluation_Results.csv"))
@@ -1,13 +1,67 @@
+import re
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer, TfidfTransformer
+
+# TfidfVectorizer's default tokenizer, used to split the rare terms it would not keep whole
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
 
 def doc_to_text(doc_obj):
     return " ".join([term for term, freq in doc_obj.terms.items() for _ in range(freq)])
 
-def extract_features(query_terms, documents, bm25_scores=None, lmrm_scores=None):
-    vectorizer = TfidfVectorizer()
-    doc_texts = [doc_to_text(doc) for doc in documents.values()]
-    X = vectorizer.fit_transform(doc_texts)
+def term_tokens(term):
+    if TOKEN_PATTERN.fullmatch(term) and term == term.lower():
+        return (term,)
+    return tuple(TOKEN_PATTERN.findall(term.lower()))
+
+# Builds the CSR term-count matrix straight from Doc.terms, with the same columns (sorted vocabulary)
+# and values CountVectorizer would give for doc_to_text, without building and re-tokenizing the text
+def count_matrix(documents):
+    vocabulary = {}
+    tokens_of = {}
+    indptr = [0]
+    indices = []
+    data = []
+    for doc in documents.values():
+        counts = {}
+        for term, freq in doc.terms.items():
+            tokens = tokens_of.get(term)
+            if tokens is None:
+                tokens = tokens_of[term] = term_tokens(term)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + freq
+        for token, count in counts.items():
+            indices.append(vocabulary.setdefault(token, len(vocabulary)))
+            data.append(count)
+        indptr.append(len(indices))
+
+    # like CountVectorizer: sort each row by first-seen column, then relabel the columns alphabetically
+    # without re-sorting, so the l2 norms are summed in the same order and the TF-IDF values match bit for bit
+    X = sparse.csr_matrix((np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int32),
+                           np.asarray(indptr, dtype=np.int32)), shape=(len(documents), len(vocabulary)))
+    X.sort_indices()
+    terms = sorted(vocabulary)
+    remap = np.empty(len(terms), dtype=X.indices.dtype)
+    for new_col, term in enumerate(terms):
+        remap[vocabulary[term]] = new_col
+    X.indices = remap.take(X.indices)
+    X.has_sorted_indices = False
+    return X, terms
+
+# TF-IDF weighting of count_matrix. Returns a vectorizer (for queries) and the document matrix,
+# identical to TfidfVectorizer().fit_transform over doc_to_text
+def tfidf_matrix(documents):
+    counts, terms = count_matrix(documents)
+    transformer = TfidfTransformer()
+    transformer.fit(counts)
+    X = transformer.transform(counts, copy=False)  # as TfidfVectorizer does, keeping the index order
+    vectorizer = TfidfVectorizer(vocabulary=terms)
+    vectorizer.idf_ = transformer.idf_
+    return vectorizer, X
+
+# positional_index (a positional_index.PositionalIndex over the documents) appends the phrase and proximity features
+def extract_features(query_terms, documents, bm25_scores=None, lmrm_scores=None, positional_index=None):
+    vectorizer, X = tfidf_matrix(documents)
 
     query_text = " ".join([term for term, freq in query_terms.items()])
     q_vec = vectorizer.transform([query_text])
@@ -15,13 +69,18 @@ def extract_features(query_terms, documents, bm25_scores=None, lmrm_scores=None)
     cosine_features = cosine_similarities.toarray().flatten().reshape(-1, 1)
 
     # Append BM25 and LMRM scores as extra features (default to 0 if missing)
+    additional_features = score_features(list(documents.keys()), bm25_scores, lmrm_scores)
+
+    # Combine cosine similarity with BM25 and LMRM scores
+    features = [cosine_features, additional_features]
+    if positional_index is not None:
+        features.append(positional_index.proximity_features(query_terms, list(documents.keys())))
+    return np.hstack(features)
+
+def score_features(doc_ids, bm25_scores=None, lmrm_scores=None):
     additional_features = []
-    doc_ids = list(documents.keys())
     for doc_id in doc_ids:
         bm25 = bm25_scores.get(doc_id, 0) if bm25_scores else 0
         lmrm = lmrm_scores.get(doc_id, 0) if lmrm_scores else 0
         additional_features.append([bm25, lmrm])
-    additional_features = np.array(additional_features)
-
-    # Combine cosine similarity with BM25 and LMRM scores
-    return np.hstack([cosine_features, additional_features])
+    return np.array(additional_features).reshape(-1, 2)
@@ -0,0 +1,136 @@
+import os
+import hashlib
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from artifact_cache import LRUCache
+from feature_extraction_prrm import tfidf_matrix, score_features
+
+# Number of datasets whose feature store is kept in memory by default
+MAX_CACHED_STORES = 8
+
+# In-memory stores keyed by dataset fingerprint, so reruns in the same process skip vectorization
+_stores = LRUCache(MAX_CACHED_STORES)
+
+
+class FeatureStore:
+    """
+    TF-IDF document matrix for one dataset. the vectorizer is fitted once on every document in the
+    dataset, so training and scoring features come from the same vector space, and PRRM slices
+    the rows it needs instead of re-vectorizing.
+    """
+
+    def __init__(self, vectorizer, matrix, doc_ids):
+        self.vectorizer = vectorizer
+        self.matrix = matrix  # csr, one l2-normalised row per document
+        self.doc_ids = list(doc_ids)
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.doc_ids)}
+
+    @classmethod
+    def fit(cls, documents):
+        """fit the vectorizer on all {docid: Doc} documents of a dataset"""
+        vectorizer, matrix = tfidf_matrix(documents)
+        return cls(vectorizer, matrix.tocsr(), documents.keys())
+
+    def rows(self, doc_ids):
+        """the TF-IDF rows for the given docids, in that order"""
+        return self.matrix[[self.row_of[doc_id] for doc_id in doc_ids]]
+
+    def query_vector(self, query_terms):
+        query_text = " ".join([term for term, freq in query_terms.items()])
+        return self.vectorizer.transform([query_text])
+
+    def cosine(self, query_terms, doc_ids, q_vec=None):
+        """cosine similarity between the query and each document as an (n, 1) array"""
+        if q_vec is None:
+            q_vec = self.query_vector(query_terms)
+        return (self.rows(doc_ids) @ q_vec.T).toarray().flatten().reshape(-1, 1)
+
+    def features(self, query_terms, doc_ids, bm25_scores=None, lmrm_scores=None, positional_index=None):
+        """
+        PRRM features (cosine, BM25, LMRM) for the given docids, as extract_features returns them.
+        with a positional_index the proximity features of these docids are appended
+        """
+        features = [self.cosine(query_terms, doc_ids), score_features(doc_ids, bm25_scores, lmrm_scores)]
+        if positional_index is not None:
+            features.append(positional_index.proximity_features(query_terms, doc_ids))
+        return np.hstack(features)
+
+    def iter_features(self, query_terms, doc_ids, bm25_scores=None, lmrm_scores=None, batch_size=10000,
+                      positional_index=None):
+        """the features() rows for doc_ids in batches of batch_size, so callers never hold all of them at once"""
+        q_vec = self.query_vector(query_terms)
+        for start in range(0, len(doc_ids), batch_size):
+            batch = doc_ids[start:start + batch_size]
+            features = [self.cosine(query_terms, batch, q_vec), score_features(batch, bm25_scores, lmrm_scores)]
+            if positional_index is not None:
+                features.append(positional_index.proximity_features(query_terms, batch))
+            yield np.hstack(features)
+
+    def save(self, path):
+        """save to <path>.npz (matrix) and <path>_meta.npz (docids, vocabulary, idf)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        sparse.save_npz(path + ".npz", self.matrix)
+        np.savez(path + "_meta.npz",
+                 doc_ids=np.array(self.doc_ids),
+                 vocabulary=self.vectorizer.get_feature_names_out().astype(str),
+                 idf=self.vectorizer.idf_)
+
+    @classmethod
+    def load(cls, path):
+        matrix = sparse.load_npz(path + ".npz").tocsr()
+        meta = np.load(path + "_meta.npz")
+        vectorizer = TfidfVectorizer(vocabulary=list(meta["vocabulary"]))
+        vectorizer.idf_ = meta["idf"]
+        return cls(vectorizer, matrix, meta["doc_ids"].tolist())
+
+
+def clear_feature_stores():
+    """forget the stores kept in memory, e.g. to time a run without the previous one's vectorization"""
+    _stores.clear()
+
+
+def set_feature_store_cache_size(max_size):
+    """keep at most max_size feature stores in memory (None = no limit, 0 = none)"""
+    _stores.resize(max_size)
+
+
+def dataset_fingerprint(dataset_path, stop_words):
+    """hash of the dataset's xml file names, sizes and modification times plus the stop words"""
+    h = hashlib.sha1()
+    for name in sorted(os.listdir(dataset_path)):
+        if name.endswith(".xml"):
+            st = os.stat(os.path.join(dataset_path, name))
+            h.update(f"{name}:{st.st_size}:{st.st_mtime_ns};".encode())
+    h.update(",".join(sorted(stop_words)).encode())
+    return h.hexdigest()[:16]
+
+
+def get_feature_store(documents, dataset_path, stop_words, cache_dir=None, cache=None):
+    """
+    return the feature store for a dataset, fitting it only if it is not already in memory
+    or (when cache_dir is given) saved on disk from a previous run. cache (an artifact_cache.LRUCache)
+    replaces the module's own in-memory cache of MAX_CACHED_STORES stores
+    """
+    if cache is None:
+        cache = _stores
+    key = dataset_fingerprint(dataset_path, stop_words)
+    store = cache.get(key)
+    if store is not None:
+        return store
+
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, f"{os.path.basename(os.path.normpath(dataset_path))}_{key}")
+        if os.path.exists(path + ".npz") and os.path.exists(path + "_meta.npz"):
+            store = FeatureStore.load(path)
+
+    if store is None:
+        store = FeatureStore.fit(documents)
+        if path:
+            store.save(path)
+
+    cache.put(key, store)
+    return store
@@ -0,0 +1,171 @@
+import math
+import time
+
+import numpy as np
+from scipy.stats import kendalltau
+
+import BM25IR
+from inverted_index import build_index_from_coll
+from evaluation import evaluate_scores
+
+# Fixed-point scale for the query term weight ((k2 + 1) * qf / (k2 + qf)), so accumulation stays integer
+QUERY_WEIGHT_SCALE = 256
+
+
+class ImpactIndex:
+    """
+    BM25 index with the per-posting term contribution idf * ((k1 + 1) * f) / (k + f) precomputed
+    and quantized to 8 or 16 bits. a query is an integer gather-and-add over NumPy arrays.
+    """
+
+    def __init__(self, doc_ids, postings, scale, bits, k2):
+        self.doc_ids = doc_ids  # doc number -> docid
+        self.postings = postings  # term -> (doc numbers int32 array, quantized impacts array)
+        self.scale = scale  # quantized = round(impact * scale)
+        self.bits = bits
+        self.k2 = k2
+
+    @property
+    def num_docs(self):
+        return len(self.doc_ids)
+
+    def nbytes(self):
+        """size of the posting arrays in bytes"""
+        return sum(docs.nbytes + impacts.nbytes for docs, impacts in self.postings.values())
+
+    def score_array(self, q):
+        """
+        Args:
+            q (dict): the tokenised query {term: freq}
+
+        Returns:
+            int64 array of accumulated scores indexed by doc number, in units of 1 / (scale * QUERY_WEIGHT_SCALE)
+
+        """
+        acc = np.zeros(self.num_docs, dtype=np.int64)
+        for qt, qf in q.items():
+            posting = self.postings.get(qt)
+            if posting is None:
+                continue
+            docs, impacts = posting
+            weight = round(((self.k2 + 1) * qf) / float(self.k2 + qf) * QUERY_WEIGHT_SCALE)
+            acc[docs] += impacts.astype(np.int64) * weight
+        return acc
+
+    def bm25(self, q):
+        """approximate bm25 scores, dequantized: dict {docid: score}"""
+        scores = self.score_array(q) / (self.scale * QUERY_WEIGHT_SCALE)
+        return dict(zip(self.doc_ids, scores.tolist()))
+
+    def top_k(self, q, k):
+        """the k highest scoring (docid, score) pairs, best first"""
+        acc = self.score_array(q)
+        k = min(k, len(acc))
+        if k <= 0:
+            return []
+        best = np.argpartition(-acc, k - 1)[:k]
+        best = best[np.argsort(-acc[best], kind="stable")]
+        return [(self.doc_ids[i], acc[i] / (self.scale * QUERY_WEIGHT_SCALE)) for i in best]
+
+
+def build_impact_index(index, bits=8, k1=BM25IR.K1, b=BM25IR.B, k2=BM25IR.K2, n_scale=BM25IR.N_SCALE):
+    """
+    precompute and quantize the bm25 contribution of every posting in an InvertedIndex
+
+    Args:
+        index (InvertedIndex): the exact index
+        bits (int): 8 or 16. impacts are unsigned unless a negative idf (n_scale < 2) makes them signed
+
+    Returns:
+        ImpactIndex
+
+    """
+    if bits not in (8, 16):
+        raise ValueError("bits must be 8 or 16")
+
+    avg_dl = index.avg_length()
+    no_docs = index.num_docs
+    doc_lens = np.asarray(index.doc_lens, dtype=np.float64)
+    doc_k = k1 * ((1 - b) + b * doc_lens / float(avg_dl))
+
+    exact = {}
+    for term, plist in index.postings.items():
+        n = len(plist)
+        idf = math.log(1.0 / ((n + 0.5) / (n_scale*no_docs - n + 0.5)), 2)
+        docs = np.fromiter((doc_no for doc_no, _ in plist), dtype=np.int32, count=n)
+        f = np.fromiter((tf for _, tf in plist), dtype=np.float64, count=n)
+        exact[term] = (docs, idf * (((k1 + 1) * f) / (doc_k[docs] + f)))
+
+    lo = min((imp.min() for _, imp in exact.values()), default=0.0)
+    hi = max((np.abs(imp).max() for _, imp in exact.values()), default=0.0)
+    if lo >= 0:
+        dtype = np.uint8 if bits == 8 else np.uint16
+    else:
+        dtype = np.int8 if bits == 8 else np.int16
+    scale = np.iinfo(dtype).max / hi if hi > 0 else 1.0
+
+    postings = {term: (docs, np.round(imp * scale).astype(dtype)) for term, (docs, imp) in exact.items()}
+    return ImpactIndex(list(index.doc_ids), postings, scale, bits, k2)
+
+
+def fidelity_report(topics, qrels, bits=8):
+    """
+    compare quantized scoring with the exact BM25IR.bm25 on every topic
+
+    Args:
+        topics (dict): bm25_sweep.load_topics() output {XXX: (Rcv1Coll, df, query)}
+        qrels (Qrels): bm25_sweep.load_judgments() output
+
+    Returns:
+        dict of averages: kendall tau, metric deltas, float64 vs quantized posting bytes, and per-query latencies
+
+    """
+    taus, deltas = [], {"AP": [], "P@12": [], "DCG@12": []}
+    float_bytes = quant_bytes = 0
+    exact_secs = quant_secs = 0.0
+    for code, (coll, df, pq) in topics.items():
+        impact = build_impact_index(build_index_from_coll(coll), bits)
+        quant_bytes += impact.nbytes()
+        float_bytes += sum(docs.nbytes + docs.size * 8 for docs, _ in impact.postings.values())
+
+        start = time.perf_counter()
+        exact = BM25IR.bm25(coll, pq, df)
+        exact_secs += time.perf_counter() - start
+        start = time.perf_counter()
+        approx = impact.bm25(pq)
+        quant_secs += time.perf_counter() - start
+
+        doc_ids = list(exact.keys())
+        tau = kendalltau([exact[d] for d in doc_ids], [approx[d] for d in doc_ids]).statistic
+        taus.append(1.0 if math.isnan(tau) else tau)
+
+        for name, e, a in zip(("AP", "P@12", "DCG@12"),
+                              evaluate_scores(qrels, code, exact), evaluate_scores(qrels, code, approx)):
+            deltas[name].append(a - e)
+
+    n = len(taus)
+    report = {"bits": bits, "kendall_tau": sum(taus) / n, "min_kendall_tau": min(taus)}
+    for name, values in deltas.items():
+        report[f"delta_{name}"] = sum(values) / n
+    report.update({"float_bytes": float_bytes, "quantized_bytes": quant_bytes,
+                   "exact_ms": exact_secs / n * 1000, "quantized_ms": quant_secs / n * 1000})
+    return report
+
+
+if __name__ == '__main__':
+    import data_processing_bm25 as data_processing
+    from bm25_sweep import get_paths, load_topics, load_judgments
+
+    paths = get_paths()
+    query_dict = data_processing.load_queries(paths['queries_file_path'])
+    topics = load_topics(paths['dataset_base_dir'], query_dict, paths['stopwords_file_path'])
+    qrels = load_judgments(paths['eval_benchmark_base_dir'])
+
+    for bits in (8, 16):
+        r = fidelity_report(topics, qrels, bits)
+        print(f"\n--- {bits}-bit impacts over {len(topics)} topics ---")
+        print(f"Kendall tau vs exact: avg {r['kendall_tau']:.4f}, min {r['min_kendall_tau']:.4f}")
+        print(f"MAP delta: {r['delta_AP']:+.4f} | P@12 delta: {r['delta_P@12']:+.4f} | DCG@12 delta: {r['delta_DCG@12']:+.4f}")
+        print(f"Postings: {r['float_bytes']} bytes as float64 -> {r['quantized_bytes']} bytes "
+              f"({r['quantized_bytes'] / r['float_bytes'] * 100:.1f}%)")
+        print(f"Latency per query: exact BM25IR.bm25 {r['exact_ms']:.3f} ms -> quantized {r['quantized_ms']:.3f} ms")
@@ -0,0 +1,241 @@
+import os
+import math
+import time
+import tempfile
+
+import numpy as np
+
+import BM25IR
+from inverted_index import InvertedIndex, build_index_from_coll
+from evaluation import evaluate_scores, write_rows
+
+# Fractions of postings to remove for the trade-off curve
+DEFAULT_PRUNE_LEVELS = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+
+
+def posting_impacts(index, k1=BM25IR.K1, b=BM25IR.B, n_scale=BM25IR.N_SCALE):
+    """
+    query-independent bm25 contribution of every posting, idf * ((k1 + 1) * f) / (k + f)
+
+    Returns:
+        dict {term: [impact, ...]} aligned with index.postings[term]
+
+    """
+    avg_dl = index.avg_length()
+    no_docs = index.num_docs
+    impacts = {}
+    for term, plist in index.postings.items():
+        n = len(plist)
+        idf = math.log(1.0 / ((n + 0.5) / (n_scale*no_docs - n + 0.5)), 2)
+        term_impacts = []
+        for doc_no, f in plist:
+            k = k1 * ((1 - b) + b * index.doc_lens[doc_no] / float(avg_dl))
+            term_impacts.append(idf * (((k1 + 1) * f) / (k + f)))
+        impacts[term] = term_impacts
+    return impacts
+
+
+def global_threshold(impacts, fraction):
+    """the impact below which roughly fraction of all postings fall"""
+    values = [v for term_impacts in impacts.values() for v in term_impacts]
+    if not values or fraction <= 0:
+        return -math.inf
+    return float(np.quantile(values, fraction))
+
+
+def prune_index(index, impacts, fraction, mode="global"):
+    """
+    static pruning: copy the index without its lowest impact postings. document lengths and
+    collection statistics are kept from the full index so surviving scores are unchanged.
+
+    Args:
+        index (InvertedIndex): the full index
+        impacts (dict): output from posting_impacts()
+        fraction (float): fraction of postings to remove
+        mode (str): "global" uses one impact threshold for the whole index,
+                    "term" removes the lowest fraction of each term's postings (always keeping its best one)
+
+    Returns:
+        (InvertedIndex, {term: df in the full index})
+
+    """
+    if mode not in ("global", "term"):
+        raise ValueError(f"Unknown pruning mode: {mode}")
+
+    pruned = InvertedIndex()
+    pruned.doc_ids = list(index.doc_ids)
+    pruned.doc_lens = list(index.doc_lens)
+    pruned.forward = index.forward  # forward vectors are shared, not pruned
+    pruned.cf = dict(index.cf)
+    pruned.totalDocLength = index.totalDocLength
+
+    threshold = global_threshold(impacts, fraction) if mode == "global" else None
+    for term, plist in index.postings.items():
+        term_impacts = impacts[term]
+        if mode == "term":
+            keep = max(1, len(plist) - int(len(plist) * fraction))
+            threshold_t = sorted(term_impacts, reverse=True)[keep - 1]
+        else:
+            threshold_t = threshold
+        kept = [p for p, v in zip(plist, term_impacts) if v >= threshold_t]
+        if kept:
+            pruned.postings[term] = kept
+
+    full_df = {term: len(plist) for term, plist in index.postings.items()}
+    return pruned, full_df
+
+
+def _pack_strings(strings):
+    """newline-joined utf-8 bytes of the strings, as a uint8 array"""
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(packed):
+    text = packed.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
+
+
+def save_pruned_index(index, full_df, path):
+    """
+    save a pruned index to path (.npz) as flat arrays: the terms that kept postings (utf-8, sorted),
+    each term's slice of the doc number and tf columns, its df and collection frequency in the full
+    index, and the docid and document length tables. terms left without postings and the forward
+    vectors (which are not pruned) are not saved
+
+    Returns:
+        the size of the saved file in bytes
+
+    """
+    terms = sorted(index.postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    doc_nos, tfs = [], []
+    for i, term in enumerate(terms):
+        plist = index.postings[term]
+        offsets[i + 1] = offsets[i] + len(plist)
+        doc_nos.extend(doc_no for doc_no, _ in plist)
+        tfs.extend(tf for _, tf in plist)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        np.savez(f,
+                 terms=_pack_strings(terms),
+                 offsets=offsets,
+                 doc_nos=np.array(doc_nos, dtype=np.int32),
+                 tfs=np.array(tfs, dtype=np.int32),
+                 full_df=np.array([full_df[term] for term in terms], dtype=np.int32),
+                 cf=np.array([index.cf.get(term, 0) for term in terms], dtype=np.int64),
+                 doc_ids=_pack_strings(index.doc_ids),
+                 doc_lens=np.array(index.doc_lens, dtype=np.int32))
+    return os.path.getsize(path)
+
+
+def load_pruned_index(path):
+    """
+    load an index saved by save_pruned_index()
+
+    Returns:
+        (InvertedIndex without forward vectors, {term: df in the full index})
+
+    """
+    with np.load(path) as data:
+        terms = _unpack_strings(data['terms'])
+        offsets = data['offsets'].tolist()
+        doc_nos = data['doc_nos'].tolist()
+        tfs = data['tfs'].tolist()
+        index = InvertedIndex()
+        index.doc_ids = _unpack_strings(data['doc_ids'])
+        index.doc_lens = data['doc_lens'].tolist()
+        index.totalDocLength = sum(index.doc_lens)
+        index.cf = dict(zip(terms, data['cf'].tolist()))
+        full_df = dict(zip(terms, data['full_df'].tolist()))
+    for i, term in enumerate(terms):
+        index.postings[term] = list(zip(doc_nos[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]]))
+    return index, full_df
+
+
+def pruning_curve(topics, qrels, levels=DEFAULT_PRUNE_LEVELS, mode="global", index_dir=None):
+    """
+    prune every topic's index at each level, save it, load it back and rerun the evaluation on the loaded index
+
+    Args:
+        topics (dict): bm25_sweep.load_topics() output {XXX: (Rcv1Coll, df, query)}
+        qrels (Qrels): bm25_sweep.load_judgments() output
+        levels (list of float): fractions of postings to remove
+        mode (str): "global" or "term"
+        index_dir (str): where to keep the pruned indexes as <mode>_<level>/<XXX>.npz (default: a temporary directory)
+
+    Returns:
+        list of rows {level, postings, bytes, latency_ms, MAP, P@12, DCG@12}, bytes being the size of the saved indexes
+
+    """
+    indexes = {}
+    for code, (coll, df, pq) in topics.items():
+        index = build_index_from_coll(coll)
+        indexes[code] = (index, posting_impacts(index), pq)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rows = []
+        for level in levels:
+            level_dir = os.path.join(index_dir or tmp_dir, f"{mode}_{level:g}")
+            n_postings = n_bytes = 0
+            secs = 0.0
+            ap_list, pk_list, dcg_list = [], [], []
+            for code, (index, impacts, pq) in indexes.items():
+                pruned, full_df = prune_index(index, impacts, level, mode)
+                path = os.path.join(level_dir, f"{code}.npz")
+                n_bytes += save_pruned_index(pruned, full_df, path)
+                loaded, loaded_df = load_pruned_index(path)
+                n_postings += sum(len(plist) for plist in loaded.postings.values())
+
+                start = time.perf_counter()
+                scores = loaded.bm25(pq, df=loaded_df)
+                secs += time.perf_counter() - start
+
+                ap, pk, dcg = evaluate_scores(qrels, code, scores)
+                ap_list.append(ap)
+                pk_list.append(pk)
+                dcg_list.append(dcg)
+
+            n = len(ap_list)
+            rows.append({'level': level, 'postings': n_postings, 'bytes': n_bytes,
+                         'latency_ms': secs / n * 1000 if n else 0.0,
+                         'MAP': sum(ap_list) / n if n else 0.0,
+                         'P@12': sum(pk_list) / n if n else 0.0,
+                         'DCG@12': sum(dcg_list) / n if n else 0.0})
+    return rows
+
+
+def write_curve(rows, output_path):
+    """write the size/latency vs quality curve as csv"""
+    write_rows(rows, output_path)
+
+
+if __name__ == '__main__':
+    import argparse
+    import data_processing_bm25 as data_processing
+    from bm25_sweep import get_paths, load_topics, load_judgments
+
+    parser = argparse.ArgumentParser(description="Static index pruning quality/size trade-off")
+    parser.add_argument("--mode", choices=["global", "term"], default="global")
+    parser.add_argument("--levels", type=float, nargs="+", default=DEFAULT_PRUNE_LEVELS)
+    parser.add_argument("--index-dir", default=None,
+                        help="keep the pruned indexes here as <mode>_<level>/<topic>.npz (default: discard them)")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    query_dict = data_processing.load_queries(paths['queries_file_path'])
+    topics = load_topics(paths['dataset_base_dir'], query_dict, paths['stopwords_file_path'])
+    qrels = load_judgments(paths['eval_benchmark_base_dir'])
+
+    rows = pruning_curve(topics, qrels, args.levels, args.mode, args.index_dir)
+
+    print(f"\n--- Static pruning ({args.mode} threshold) over {len(topics)} topics ---")
+    print(f"{'Pruned':>6} | {'Postings':>8} | {'Bytes':>9} | {'ms/query':>8} | {'MAP':>6} | {'P@12':>6} | {'DCG@12':>6}")
+    print("-" * 68)
+    for r in rows:
+        print(f"{r['level']:>6.0%} | {r['postings']:>8} | {r['bytes']:>9} | {r['latency_ms']:>8.3f} | "
+              f"{r['MAP']:.4f} | {r['P@12']:.4f} | {r['DCG@12']:.4f}")
+
+    output_path = os.path.join(os.path.dirname(paths['sweep_output_path']), f"BM25_Pruning_{args.mode}.csv")
+    write_curve(rows, output_path)
+    print(f"\nPruning curve saved to: {output_path}")
@@ -0,0 +1,167 @@
+import math
+import heapq
+
+import BM25IR
+from LMRM import LAMBDA_VAL, LOG_OF_ZERO_PROB
+
+
+class InvertedIndex:
+    """
+    term -> postings index over one dataset. documents are numbered in the order they are added
+    and each posting is a (doc number, term frequency) pair, so a query only touches the
+    documents that contain at least one of its terms.
+    """
+
+    def __init__(self):
+        self.doc_ids = []  # doc number -> docid
+        self.doc_lens = []  # doc number -> document length
+        self.postings = {}  # term -> [(doc number, tf), ...]
+        self.forward = []  # doc number -> {term: tf}, the document's own terms dict (not a copy)
+        self.cf = {}  # term -> collection frequency
+        self.totalDocLength = 0
+
+    @property
+    def num_docs(self):
+        return len(self.doc_ids)
+
+    def add_doc(self, doc_id, terms, doc_len):
+        doc_no = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_lens.append(doc_len)
+        self.forward.append(terms)
+        self.totalDocLength += doc_len
+        for term, tf in terms.items():
+            self.postings.setdefault(term, []).append((doc_no, tf))
+            self.cf[term] = self.cf.get(term, 0) + tf
+
+    def df(self, term):
+        return len(self.postings.get(term, ()))
+
+    def avg_length(self):
+        return self.totalDocLength / self.num_docs if self.num_docs else 0.0
+
+    def bm25(self, q, k1=BM25IR.K1, b=BM25IR.B, k2=BM25IR.K2, n_scale=BM25IR.N_SCALE, df=None):
+        """
+        bm25 over the postings. gives the same scores as BM25IR.bm25 for a collection
+        indexed with build_index_from_coll (documents without a query term score 0.0)
+
+        Args:
+            q (dict): the tokenised query {term: freq}
+            df (dict): document frequencies to use instead of the posting list lengths (e.g. for a pruned index)
+
+        Returns:
+            dict {docid: bm25_score}
+
+        """
+        acc = [0.0] * self.num_docs
+        avg_dl = self.avg_length()
+        no_docs = self.num_docs
+        for qt, qf in q.items():
+            plist = self.postings.get(qt)
+            if not plist:
+                continue
+            n = df[qt] if df is not None else len(plist)
+            idf = math.log(1.0 / ((n + 0.5) / (n_scale*no_docs - n + 0.5)), 2)
+            qtf = ((k2 + 1) * qf) / float(k2 + qf)
+            for doc_no, f in plist:
+                k = k1 * ((1 - b) + b * self.doc_lens[doc_no] / float(avg_dl))
+                acc[doc_no] += idf * (((k1 + 1) * f) / (k + f)) * qtf
+        return dict(zip(self.doc_ids, acc))
+
+    def bm25_top_k(self, q, k, k1=BM25IR.K1, b=BM25IR.B, k2=BM25IR.K2, n_scale=BM25IR.N_SCALE, df=None,
+                   doc_numbers=False):
+        """
+        the k best (docid, score) pairs of bm25(), best first, accumulating only the documents that
+        contain a query term. untouched documents (score 0.0) pad the list when fewer than k matched,
+        a negative score in the top k (n_scale small enough for a negative idf) falls back to the full
+        bm25(), and ties keep index order as top_k(bm25(q), k) would. doc_numbers=True returns
+        (doc number, score) pairs instead.
+        """
+        acc = {}
+        avg_dl = self.avg_length()
+        no_docs = self.num_docs
+        for qt, qf in q.items():
+            plist = self.postings.get(qt)
+            if not plist:
+                continue
+            n = df[qt] if df is not None else len(plist)
+            idf = math.log(1.0 / ((n + 0.5) / (n_scale*no_docs - n + 0.5)), 2)
+            qtf = ((k2 + 1) * qf) / float(k2 + qf)
+            for doc_no, f in plist:
+                k_d = k1 * ((1 - b) + b * self.doc_lens[doc_no] / float(avg_dl))
+                acc[doc_no] = acc.get(doc_no, 0.0) + idf * (((k1 + 1) * f) / (k_d + f)) * qtf
+
+        ranked = heapq.nlargest(k, acc.items(), key=lambda x: (x[1], -x[0]))
+        if ranked and ranked[-1][1] < 0:  # negative idf: unmatched docs (0.0) may belong above these
+            full = self.bm25(q, k1, b, k2, n_scale, df)
+            ranked = heapq.nlargest(k, enumerate(full.values()), key=lambda x: (x[1], -x[0]))
+        elif len(ranked) < k:
+            ranked += [(doc_no, 0.0) for doc_no in range(no_docs) if doc_no not in acc][:k - len(ranked)]
+        if doc_numbers:
+            return ranked
+        return [(self.doc_ids[doc_no], score) for doc_no, score in ranked]
+
+    def lmrm(self, q, lambda_val=LAMBDA_VAL):
+        """
+        Jelinek-Mercer language model score over the postings. every document starts from the
+        score of a document containing none of the query terms, and only the postings of the
+        query terms are visited to correct it.
+
+        Args:
+            q (dict): the tokenised query {term: freq}
+
+        Returns:
+            dict {docid: log2 score}
+
+        """
+        total_words = self.totalDocLength
+        base = 0.0
+        corrections = []
+        for term, qf in q.items():
+            coll_prob = self.cf.get(term, 0) / total_words if total_words else 0.0
+            background = lambda_val * coll_prob
+            absent = math.log2(background) if background > 1e-9 else LOG_OF_ZERO_PROB
+            base += qf * absent
+            corrections.append((term, qf, background, absent))
+
+        acc = [base] * self.num_docs
+        for term, qf, background, absent in corrections:
+            for doc_no, f in self.postings.get(term, ()):
+                smoothed = (1.0 - lambda_val) * f / self.doc_lens[doc_no] + background
+                present = math.log2(smoothed) if smoothed > 1e-9 else LOG_OF_ZERO_PROB
+                acc[doc_no] += qf * (present - absent)
+
+        n_terms = sum(q.values())
+        for doc_no, doc_len in enumerate(self.doc_lens):
+            if doc_len == 0:
+                acc[doc_no] = LOG_OF_ZERO_PROB * n_terms
+        return dict(zip(self.doc_ids, acc))
+
+
+def top_k(scores, k):
+    """return the k highest scoring (docid, score) pairs, best first"""
+    return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+
+def build_index_from_coll(coll):
+    """build an index from a BM25 Rcv1Coll (document length is the word count)"""
+    index = InvertedIndex()
+    for doc_id, doc in coll.coll.items():
+        index.add_doc(doc_id, doc.terms, doc.doc_size)
+    return index
+
+
+def build_index_from_bow(dataset_coll):
+    """build an index from an LMRM BowColl (document length is the processed token count)"""
+    index = InvertedIndex()
+    for doc_id, doc in dataset_coll.docs.items():
+        index.add_doc(doc_id, doc.terms, doc.doc_len)
+    return index
+
+
+def build_index_from_docs(documents):
+    """build an index from PRRM {docid: Doc} documents (document length is the term count)"""
+    index = InvertedIndex()
+    for doc_id, doc in documents.items():
+        index.add_doc(doc_id, doc.terms, sum(doc.terms.values()))
+    return index
@@ -0,0 +1,384 @@
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from artifact_cache import ArtifactStore, stage_key, link_file, link_tree, remove_path
+from evaluation import Qrels, evaluate
+from run_matrix import RunMatrix
+
+
+class Stage:
+    """
+    one step of a pipeline. fn(context, inputs) is called with the shared context and
+    {dependency name: its result}; isolated stages run in a worker process (fn must then be
+    a module-level function and its arguments picklable), the others in this process.
+
+    a cached stage is addressed by the content of its sources, the context values named in params,
+    the source of its code modules and the keys of its dependencies. when an artifact store holds
+    that key, its result and output files are reused instead of running the stage, and a dependency
+    that no running stage needs is not run at all.
+    """
+
+    def __init__(self, name, fn, deps=(), isolated=False, sources=(), params=(), code=(), outputs=(),
+                 cached=False):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.isolated = isolated
+        self.sources = tuple(sources)  # input files and directories
+        self.params = tuple(params)  # context keys that change the result
+        self.code = tuple(code)  # src modules the stage runs
+        self.outputs = tuple(outputs)  # files and directories the stage writes
+        self.cached = cached
+
+
+class Pipeline:
+    """a DAG of stages, each started as soon as all of its dependencies have finished"""
+
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+        self.order()  # rejects cycles
+
+    def order(self, targets=None):
+        """stage names in dependency order, limited to targets and everything they need"""
+        ordered, visiting = [], set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through stage {name}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            ordered.append(name)
+
+        for name in (targets or self.stages):
+            visit(name)
+        return ordered
+
+    def keys(self, context, targets=None):
+        """content address of every stage, computed in dependency order before anything runs"""
+        keys, digests = {}, {}  # digests: each source file is hashed once per run
+        for name in self.order(targets):
+            stage = self.stages[name]
+            keys[name] = stage_key(name, stage.sources, {p: context.get(p) for p in stage.params}, stage.code,
+                                   [keys[dep] for dep in stage.deps], digests)
+        return keys
+
+    def run(self, context, targets=None, process_workers=2, thread_workers=4, store=None):
+        """
+        run the stages, independent ones concurrently. a stage whose dependency failed is skipped
+
+        Args:
+            context (dict): shared state handed to every stage (pickled for isolated ones)
+            targets (list): stages to run along with their dependencies (default: all)
+            process_workers (int): worker processes for isolated stages
+            thread_workers (int): threads for in-process stages
+            store (ArtifactStore): reuse and save the results of cached stages (None = always run)
+
+        Returns:
+            (results {stage: result}, report {stage: (status, seconds)}) with status "ok", "cached",
+            "skipped", "unused" (only needed by stages reused from the store) or the error
+
+        """
+        pending = self.order(targets)
+        keys = self.keys(context, targets) if store is not None else {}
+        results, report = {}, {}
+        entries, load_secs = {}, {}  # stored entries of the cached stages that will be reused
+        for name in pending:
+            if store is not None and self.stages[name].cached:
+                start = time.perf_counter()
+                entry = store.load(name, keys[name])
+                if entry is not None:
+                    entries[name], load_secs[name] = entry, time.perf_counter() - start
+        needed = self.needed(targets, entries)
+        for name in [name for name in pending if name not in needed]:
+            report[name] = ("unused", 0.0)
+            pending.remove(name)
+        running = {}
+        with ProcessPoolExecutor(max_workers=process_workers) as processes, \
+                ThreadPoolExecutor(max_workers=thread_workers) as threads:
+            while pending or running:
+                for name in list(pending):
+                    stage = self.stages[name]
+                    if name in entries:
+                        start = time.perf_counter()
+                        store.restore(entries[name])
+                        results[name] = entries.pop(name)['result']
+                        report[name] = ("cached", load_secs[name] + time.perf_counter() - start)
+                        print(f"\n[pipeline] {name}: reused {keys[name]}")
+                        pending.remove(name)
+                    elif any(dep in report and report[dep][0] not in ("ok", "cached") for dep in stage.deps):
+                        report[name] = ("skipped", 0.0)
+                        pending.remove(name)
+                    elif all(dep in results for dep in stage.deps):
+                        use_store = store is not None and stage.cached
+                        if use_store:
+                            for output in stage.outputs:  # never write through links into the store
+                                remove_path(output)
+                        inputs = {dep: results[dep] for dep in stage.deps}
+                        executor = processes if stage.isolated else threads
+                        print(f"\n[pipeline] starting {name}")
+                        running[executor.submit(stage.fn, context, inputs)] = (name, time.perf_counter())
+                        pending.remove(name)
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, start = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                        status = "ok"
+                        if store is not None and self.stages[name].cached:
+                            store.save(name, keys[name], results[name], self.stages[name].outputs)
+                    except Exception as e:
+                        status = "".join(traceback.format_exception_only(type(e), e)).strip()
+                    report[name] = (status, time.perf_counter() - start)
+                    print(f"\n[pipeline] {name}: {status} ({report[name][1]:.1f} s)")
+        return results, {name: report[name] for name in self.order(targets)}
+
+    def needed(self, targets=None, reused=()):
+        """
+        the stages to run or restore for targets (default: every stage no other stage depends on).
+        a reused stage is restored without its dependencies, so they are only needed by others
+        """
+        if targets is None:
+            depended_on = {dep for stage in self.stages.values() for dep in stage.deps}
+            targets = [name for name in self.stages if name not in depended_on]
+        needed = set()
+
+        def visit(name):
+            if name in needed:
+                return
+            needed.add(name)
+            if name not in reused:
+                for dep in self.stages[name].deps:
+                    visit(dep)
+
+        for name in targets:
+            visit(name)
+        return needed
+
+
+def get_paths():
+    """Get correct paths for the new folder structure."""
+    current_dir = os.path.dirname(os.path.abspath(__file__))  # src directory
+    parent_dir = os.path.dirname(current_dir)  # project root
+    data_dir = os.path.join(parent_dir, "data")
+    outputs_dir = os.path.join(parent_dir, "outputs")
+
+    paths = {
+        'project_dir': parent_dir,
+        'dataset_base_dir': os.path.join(data_dir, "DataSets"),
+        'benchmark_dir': os.path.join(data_dir, "EvaluationBenchmark"),
+        'queries_file_path': os.path.join(data_dir, "Queries-1.txt"),
+        'stopwords_file_path': os.path.join(data_dir, "common-english-words.txt"),
+        'bm25_rankings_dir': os.path.join(data_dir, "RankingOutputs_BM25"),
+        'bm25_eval_dir': os.path.join(data_dir, "EvaluationOutputs"),
+        'lmrm_rankings_dir': os.path.join(current_dir, "RankingOutputs_LMRM"),
+        'lmrm_eval_results_path': os.path.join(outputs_dir, "LMRM", "LMRM_Evaluation_Results.csv"),
+        'prrm_rankings_dir': os.path.join(current_dir, "RankingOutputs_PRRM"),
+        'prrm_eval_results_path': os.path.join(current_dir, "PRRM_Evaluation_Results.csv"),
+        'artifact_cache_dir': os.path.join(current_dir, "ArtifactCache"),
+    }
+    # (source, destination) pairs published to outputs/ at the end of a run
+    paths['output_mappings'] = [
+        (paths['bm25_rankings_dir'], os.path.join(outputs_dir, "BM25", "rankings")),
+        (paths['bm25_eval_dir'], os.path.join(outputs_dir, "BM25", "evaluations")),
+        (paths['lmrm_rankings_dir'], os.path.join(outputs_dir, "LMRM", "rankings")),
+        (paths['prrm_rankings_dir'], os.path.join(outputs_dir, "PRRM", "rankings")),
+        (paths['prrm_eval_results_path'], os.path.join(outputs_dir, "PRRM", "PRRM_Evaluation_Results.csv")),
+    ]
+    return paths
+
+
+def run_matrix(qrels, runs):
+    """RunMatrix of an in-memory run {RXXX: {docid: score}}"""
+    run = {topic[1:]: scores for topic, scores in runs.items() if scores}
+    return RunMatrix.from_table(evaluate(qrels, run))
+
+
+# Stage functions. BM25, LMRM and PRRM each tokenise the datasets their own way (BM25 and LMRM read the
+# XML line by line and drop stop words at different points than PRRM), so sharing one parse across them
+# would change their rankings. The BM25 and LMRM stages run in worker processes, as they are pure Python
+# and would share one core as threads, and only take and return picklable values. The corpus stage parses
+# every dataset once for PRRM on a thread alongside them, and the router, the feature stores and PRRM
+# all use those documents
+
+def load_inputs(context, inputs):
+    """judgments, PRRM queries and stop words, read once for every later stage"""
+    import run_prrm
+
+    prrm_paths = run_prrm.get_paths()
+    return {'qrels': Qrels.load(context['paths']['benchmark_dir']),
+            'prrm_queries': run_prrm.extract_queries(prrm_paths['queries_file_path']),
+            'prrm_stop_words': run_prrm.load_stop_words(prrm_paths['stopwords_file_path'])}
+
+
+def bm25_stage(context, inputs):
+    import run_bm25
+    runs, table = run_bm25.main(qrels=inputs['inputs']['qrels'])
+    if not runs:
+        raise RuntimeError("BM25 produced no rankings")
+    return runs
+
+
+def lmrm_stage(context, inputs):
+    import run_lmrm
+    runs = run_lmrm.main(qrels=inputs['inputs']['qrels'])
+    if not runs:
+        raise RuntimeError("LMRM produced no rankings")
+    return runs
+
+
+def corpus_stage(context, inputs):
+    """every dataset with a PRRM query, parsed once: {query_id: {docid: Doc}}"""
+    import run_prrm
+
+    shared = inputs['inputs']
+    jobs = run_prrm.dataset_jobs(shared['prrm_queries'], run_prrm.get_paths())
+    return run_prrm.parse_datasets(jobs, shared['prrm_stop_words'],
+                                   positions=bool(context.get('prrm_params', {}).get('proximity')))
+
+
+def prrm_stage(context, inputs):
+    """
+    PRRM over the BM25 and LMRM scores and the parsed corpus handed over in memory. with
+    context['prrm_routing'] (run_prrm.route_jobs options) PRRM only runs for the queries the router sends to it
+    """
+    import run_prrm
+    from evaluation import EvaluationSink, print_results
+
+    shared = inputs['inputs']
+    paths = run_prrm.get_paths()
+    prrm_params = context.get('prrm_params', {})
+    routes, documents = None, inputs['corpus']
+    if context.get('prrm_routing'):
+        jobs = run_prrm.dataset_jobs(shared['prrm_queries'], paths)
+        routes, _, _, documents = run_prrm.route_jobs(jobs, shared['prrm_stop_words'],
+                                                      positions=bool(prrm_params.get('proximity')),
+                                                      documents=documents, **context['prrm_routing'])
+    sink = EvaluationSink(shared['qrels'], output_path=paths['prrm_eval_results_path'], model_name="PRRM")
+    runs, outcomes = run_prrm.rank_queries(shared['prrm_queries'], shared['prrm_stop_words'], paths, sink,
+                                           bm25_runs=inputs['bm25'], lmrm_runs=inputs['lmrm'],
+                                           workers=context.get('prrm_workers', 1), routes=routes,
+                                           documents=documents, **prrm_params)
+    sink.close()
+    print_results(sink.sorted_table(), "PRRM")
+    failed = run_prrm.failed_queries(outcomes)
+    if failed:
+        raise RuntimeError(f"PRRM failed for {len(failed)} queries: " + ", ".join(f"R{q}" for q in failed))
+    return runs
+
+
+def statistics_stage(context, inputs):
+    """t-tests over the three runs, evaluated from memory"""
+    from statistical_analysis import perform_statistical_tests
+
+    qrels = inputs['inputs']['qrels']
+    matrices = {name: run_matrix(qrels, inputs[stage]) for name, stage in
+                (("PRRM", "prrm"), ("BM25", "bm25"), ("LMRM", "lmrm"))}
+    perform_statistical_tests(matrices=matrices)
+
+
+def publish_stage(context, inputs):
+    """link the stage outputs into their folders under outputs/ (copied where hard links are not possible)"""
+    for source, destination in context['paths']['output_mappings']:
+        if not os.path.exists(source):
+            print(f"Source not found: {source}")
+            continue
+        if os.path.isdir(source):
+            link_tree(source, destination)
+            print(f"Linked directory: {source} to {destination}")
+        else:
+            link_file(source, destination)
+            print(f"Linked file: {source} to {destination}")
+
+
+# Source modules of each cached stage; editing one of them invalidates the stage and everything after it
+BM25_CODE = ["run_bm25", "data_processing_bm25", "BM25IR", "Rcv1Coll_n11877022", "DocV3_n11877022", "stemming",
+             "evaluation", "evaluation_bm25", "run_format"]
+LMRM_CODE = ["run_lmrm", "data_processing_lm", "LMRM", "evaluation", "stemming", "run_format"]
+CORPUS_CODE = ["data_processing_prrm", "stemming"]
+PRRM_CODE = ["run_prrm", "PRRM", "data_processing_prrm", "feature_extraction_prrm", "feature_store", "evaluation",
+             "run_format", "inverted_index", "positional_index", "qpp"]
+
+
+def build_pipeline(paths):
+    """
+    the full BM25 -> LMRM -> PRRM -> statistics pipeline. BM25, LMRM and the PRRM corpus parse only need
+    the inputs, so they run side by side
+    """
+    corpus = [paths['dataset_base_dir'], paths['queries_file_path'], paths['stopwords_file_path']]
+    return Pipeline([
+        Stage("inputs", load_inputs),
+        Stage("bm25", bm25_stage, deps=["inputs"], isolated=True, cached=True,
+              sources=corpus + [paths['benchmark_dir']], code=BM25_CODE,
+              outputs=[paths['bm25_rankings_dir'], paths['bm25_eval_dir']]),
+        Stage("lmrm", lmrm_stage, deps=["inputs"], isolated=True, cached=True,
+              sources=corpus + [paths['benchmark_dir']], code=LMRM_CODE,
+              outputs=[paths['lmrm_rankings_dir'], paths['lmrm_eval_results_path']]),
+        Stage("corpus", corpus_stage, deps=["inputs"], sources=corpus, params=["prrm_params"], code=CORPUS_CODE),
+        Stage("prrm", prrm_stage, deps=["inputs", "corpus", "bm25", "lmrm"], cached=True,
+              sources=corpus + [paths['benchmark_dir']], params=["prrm_params", "prrm_routing"], code=PRRM_CODE,
+              outputs=[paths['prrm_rankings_dir'], paths['prrm_eval_results_path']]),
+        Stage("statistics", statistics_stage, deps=["inputs", "bm25", "lmrm", "prrm"]),
+        Stage("publish", publish_stage, deps=["bm25", "lmrm", "prrm"]),
+    ])
+
+
+def run_pipeline(targets=None, prrm_workers=1, prrm_params=None, use_cache=True, prrm_routing=None):
+    """
+    run the pipeline (or the targets and their dependencies) and print a per-stage summary
+
+    Args:
+        prrm_params (dict): run_prrm_for_query options (batch_size, proximity, frozen)
+        use_cache (bool): reuse stages whose inputs, parameters and code are unchanged since a stored run
+        prrm_routing (dict): run_prrm.route_jobs options (predictor, cheap_fraction, cheap_model) to run
+            PRRM only for the queries routed to it (None = every query)
+    """
+    paths = get_paths()
+    context = {'paths': paths, 'prrm_workers': prrm_workers, 'prrm_params': prrm_params or {},
+               'prrm_routing': prrm_routing}
+    store = ArtifactStore(paths['artifact_cache_dir'], paths['project_dir']) if use_cache else None
+    results, report = build_pipeline(paths).run(context, targets, store=store)
+    print(f"\n{'Stage':<12} | {'Status':<10} | {'Seconds':>8}")
+    print("-" * 36)
+    for name, (status, secs) in report.items():
+        print(f"{name:<12} | {status if len(status) <= 10 else 'failed':<10} | {secs:>8.1f}")
+    return results, report
+
+
+if __name__ == '__main__':
+    import sys
+    import argparse
+    from qpp import PREDICTORS
+
+    parser = argparse.ArgumentParser(description="Run BM25, LMRM, PRRM and the statistical analysis in one process")
+    parser.add_argument("targets", nargs="*", default=None,
+                        help="stages to run with their dependencies (default: all), e.g. prrm")
+    parser.add_argument("--prrm-workers", type=int, default=1,
+                        help="PRRM worker processes (0 = cpu count, 1 = serial)")
+    parser.add_argument("--streaming", type=int, metavar="BATCH", default=None,
+                        help="train PRRM out-of-core with SGD on feature batches of BATCH documents")
+    parser.add_argument("--proximity", action="store_true",
+                        help="add phrase and term proximity features to PRRM")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="run every stage, without reusing or storing artifacts")
+    parser.add_argument("--route", choices=PREDICTORS, metavar="PREDICTOR", default=None,
+                        help="run PRRM only for the queries this QPP predictor routes to it, e.g. scq_avg")
+    parser.add_argument("--cheap-fraction", type=float, default=0.5,
+                        help="with --route, fraction of queries that keep their BM25 ranking")
+    args = parser.parse_args()
+
+    prrm_params = {'batch_size': args.streaming, 'proximity': args.proximity}
+    prrm_routing = {'predictor': args.route, 'cheap_fraction': args.cheap_fraction} if args.route else None
+    _, report = run_pipeline(args.targets or None, args.prrm_workers, prrm_params, not args.no_cache, prrm_routing)
+    sys.exit(0 if all(status in ("ok", "cached", "unused") for status, _ in report.values()) else 1)
@@ -0,0 +1,140 @@
+import heapq
+
+import numpy as np
+
+from inverted_index import InvertedIndex
+
+# Names of the columns returned by PositionalIndex.proximity_features
+PROXIMITY_FEATURES = ("phrase_matches", "span_density")
+
+
+def encode_positions(positions):
+    """delta-encode sorted word positions as variable-byte gaps (7 bits per byte, high bit = more bytes)"""
+    out = bytearray()
+    prev = 0
+    for p in positions:
+        gap = p - prev
+        prev = p
+        while gap >= 128:
+            out.append((gap & 127) | 128)
+            gap >>= 7
+        out.append(gap)
+    return bytes(out)
+
+
+def decode_positions(data):
+    """inverse of encode_positions, returns the list of positions"""
+    positions = []
+    pos = gap = shift = 0
+    for byte in data:
+        gap |= (byte & 127) << shift
+        if byte & 128:
+            shift += 7
+        else:
+            pos += gap
+            positions.append(pos)
+            gap = shift = 0
+    return positions
+
+
+def min_span(position_lists):
+    """
+    length of the shortest window of word positions containing one position from every list
+
+    Args:
+        position_lists (list of sorted lists): positions of each distinct term
+
+    Returns:
+        int span in words (1 for a single position), or None if any list is empty
+
+    """
+    if not position_lists or not all(position_lists):
+        return None
+    heap = [(plist[0], i, 0) for i, plist in enumerate(position_lists)]
+    heapq.heapify(heap)
+    hi = max(plist[0] for plist in position_lists)
+    best = hi - heap[0][0] + 1
+    while True:
+        lo, i, j = heapq.heappop(heap)
+        best = min(best, hi - lo + 1)
+        if j + 1 == len(position_lists[i]):
+            return best
+        nxt = position_lists[i][j + 1]
+        hi = max(hi, nxt)
+        heapq.heappush(heap, (nxt, i, j + 1))
+
+
+def count_phrase(position_lists):
+    """number of positions p where list i contains p + i for every i, i.e. phrase occurrences"""
+    if not position_lists:
+        return 0
+    starts = position_lists[0]
+    for offset, plist in enumerate(position_lists[1:], 1):
+        if not starts:
+            break
+        at = set(plist)
+        starts = [p for p in starts if p + offset in at]
+    return len(starts)
+
+
+class PositionalIndex(InvertedIndex):
+    """
+    InvertedIndex with the word positions of every posting kept to the side, delta-encoded per
+    (term, document). postings and bm25/lmrm are untouched, so plain scoring never reads positions;
+    they are only decoded for the documents passed to the phrase and proximity methods.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.positions = {}  # term -> {doc number: encoded positions}
+        self.doc_no = {}  # docid -> doc number
+
+    def add_doc(self, doc_id, terms, doc_len, positions=None):
+        doc_no = self.num_docs
+        super().add_doc(doc_id, terms, doc_len)
+        self.doc_no[doc_id] = doc_no
+        for term, plist in (positions or {}).items():
+            self.positions.setdefault(term, {})[doc_no] = encode_positions(plist)
+
+    def term_positions(self, term, doc_id):
+        """sorted word positions of term in the document, [] if it does not occur"""
+        data = self.positions.get(term, {}).get(self.doc_no[doc_id])
+        return decode_positions(data) if data else []
+
+    def phrase_count(self, phrase, doc_id):
+        """number of times the terms of phrase occur at consecutive positions in the document"""
+        return count_phrase([self.term_positions(term, doc_id) for term in phrase])
+
+    def proximity_features(self, query_terms, doc_ids):
+        """
+        phrase and proximity features for the given (candidate) documents
+
+        Args:
+            query_terms (dict): the parsed query {term: freq}, in query order
+            doc_ids (list): the documents to featurize
+
+        Returns:
+            (n, 2) array of PROXIMITY_FEATURES: occurrences of adjacent query term pairs as phrases, and
+            the number of distinct query terms present divided by the minimal span covering them
+            (0 when fewer than two are present)
+
+        """
+        terms = list(query_terms)
+        pairs = list(zip(terms, terms[1:]))
+        features = np.zeros((len(doc_ids), len(PROXIMITY_FEATURES)))
+        for row, doc_id in enumerate(doc_ids):
+            positions = {term: self.term_positions(term, doc_id) for term in terms}
+            present = [plist for plist in positions.values() if plist]
+            if len(present) < 2:
+                continue
+            features[row, 0] = sum(count_phrase([positions[a], positions[b]]) for a, b in pairs)
+            features[row, 1] = len(present) / min_span(present)
+        return features
+
+
+def build_positional_index(documents):
+    """build a PositionalIndex from PRRM {docid: Doc} documents parsed with parse_docs(..., positions=True)"""
+    index = PositionalIndex()
+    for doc_id, doc in documents.items():
+        index.add_doc(doc_id, doc.terms, sum(doc.terms.values()), doc.positions)
+    return index
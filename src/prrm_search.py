@@ -0,0 +1,146 @@
+import os
+import warnings
+
+from sklearn.exceptions import ConvergenceWarning
+
+from PRRM import PRRMModel
+from bm25_sweep import expand_grid, map_grid, write_results
+from data_processing_prrm import parse_docs, parse_query, load_stop_words
+from evaluation import Qrels, evaluate_scores
+from feature_store import get_feature_store
+from run_prrm import get_paths, extract_queries, get_run_scores, pseudo_label_ids, run_first_stage_in_process
+
+K_FOR_EVAL = 12
+
+# Default grid. split=3 labels the top and bottom thirds, as run_prrm.py does
+DEFAULT_GRID = {
+    'C': [0.01, 0.1, 1.0, 10.0, 100.0],
+    'class_weight': ["balanced", None],
+    'split': [2, 3, 4, 5],
+}
+
+def load_search_topics(queries, stop_words, paths, bm25_runs=None, lmrm_runs=None):
+    """
+    build every topic's PRRM feature matrix once from the feature store, so each configuration
+    only slices rows, trains and predicts
+
+    Returns:
+        dict {query_id: (doc_ids, X, bm25_scores, lmrm_scores)} with X aligned with doc_ids
+
+    """
+    topics = {}
+    for query_id, query_text in queries.items():
+        dataset_path = os.path.join(paths['dataset_base_dir'], f"Dataset{query_id}")
+        if not os.path.exists(dataset_path):
+            print(f"Warning: Dataset path not found: {dataset_path}")
+            continue
+        bm25_scores, lmrm_scores = get_run_scores(query_id, paths, bm25_runs, lmrm_runs)
+        if not bm25_scores or not lmrm_scores:
+            print(f" Skipping R{query_id}: Missing ranking files")
+            continue
+
+        documents = parse_docs(dataset_path, stop_words)
+        query_terms = parse_query(query_text, stop_words)
+        store = get_feature_store(documents, dataset_path, stop_words, paths.get('feature_cache_dir'))
+        doc_ids = list(documents.keys())
+        X = store.features(query_terms, doc_ids, bm25_scores=bm25_scores, lmrm_scores=lmrm_scores)
+        topics[query_id] = (doc_ids, X, bm25_scores, lmrm_scores)
+    return topics
+
+
+def score_config(topics, qrels, params):
+    """
+    train and evaluate PRRM with one configuration on every topic and average the metrics.
+    topics whose pseudo-labels are too few or all one class are left out and counted in 'topics'
+
+    Returns:
+        dict with the parameters plus topics, MAP, P@12 and DCG@12
+
+    """
+    ap_list, pk_list, dcg_list = [], [], []
+    for query_id, (doc_ids, X, bm25_scores, lmrm_scores) in topics.items():
+        top_docs, bottom_docs = pseudo_label_ids(bm25_scores, lmrm_scores, params['split'])
+        if top_docs is None:
+            continue
+        row_of = {doc_id: row for row, doc_id in enumerate(doc_ids)}
+        rows = [row_of[d] for d in sorted(top_docs) if d in row_of]
+        labels = [1] * len(rows)
+        rows += [row_of[d] for d in sorted(bottom_docs) if d in row_of]
+        labels += [0] * (len(rows) - len(labels))
+        if len(set(labels)) < 2:
+            continue
+
+        model = PRRMModel(C=params['C'], class_weight=params['class_weight'])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", ConvergenceWarning)
+            model.train(X[rows], labels)
+        scores = dict(zip(doc_ids, model.predict(X)))
+
+        ap, pk, dcg = evaluate_scores(qrels, query_id, scores, K_FOR_EVAL)
+        ap_list.append(ap)
+        pk_list.append(pk)
+        dcg_list.append(dcg)
+
+    n = len(ap_list)
+    row = dict(params)
+    row['class_weight'] = params['class_weight'] or "none"
+    row['topics'] = n
+    row['MAP'] = sum(ap_list) / n if n else 0.0
+    row['P@12'] = sum(pk_list) / n if n else 0.0
+    row['DCG@12'] = sum(dcg_list) / n if n else 0.0
+    return row
+
+
+def run_search(topics, qrels, grid=DEFAULT_GRID, workers=None):
+    """
+    evaluate every configuration in the grid across a process pool. the topic feature
+    matrices are sent to each worker once rather than once per configuration.
+
+    Args:
+        topics (dict): output from load_search_topics()
+        qrels (Qrels): judgments of every topic
+        grid (dict {param: [values]}): values for C, class_weight and split
+        workers (int): number of worker processes (None = cpu count)
+
+    Returns:
+        list of result rows, in grid order
+
+    """
+    return map_grid(score_config, (topics, qrels), expand_grid(grid), workers, single_thread=True)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search PRRM hyperparameters and pseudo-label splits")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: cpu count)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run BM25 and LMRM first instead of reading their ranking files")
+    parser.add_argument("--no-feature-cache", action="store_true",
+                        help="keep the TF-IDF feature store in memory only, without saving .npz files")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    if args.no_feature_cache:
+        paths['feature_cache_dir'] = None
+    output_path = os.path.join(os.path.dirname(paths['data_dir']), "outputs", "PRRM", "PRRM_Search_Results.csv")
+
+    bm25_runs = lmrm_runs = None
+    if args.in_process:
+        bm25_runs, lmrm_runs = run_first_stage_in_process(paths)
+
+    queries = extract_queries(paths['queries_file_path'])
+    stop_words = load_stop_words(paths['stopwords_file_path'])
+    topics = load_search_topics(queries, stop_words, paths, bm25_runs, lmrm_runs)
+    print(f"Built feature matrices for {len(topics)} topics")
+
+    qrels = Qrels.load(paths['eval_benchmark_dir'])
+    rows = run_search(topics, qrels, DEFAULT_GRID, args.workers)
+    write_results(rows, output_path)
+
+    print(f"\n{'C':>7} | {'Weights':>8} | {'Split':>5} | {'Topics':>6} | {'MAP':>6} | {'P@12':>6} | {'DCG@12':>6}")
+    print("-" * 62)
+    for r in sorted(rows, key=lambda r: -r['MAP'])[:10]:
+        print(f"{r['C']:>7} | {r['class_weight']:>8} | {r['split']:>5} | {r['topics']:>6} | "
+              f"{r['MAP']:.4f} | {r['P@12']:.4f} | {r['DCG@12']:.4f}")
+    print(f"\nEvaluated {len(rows)} configurations, results saved to: {output_path}")
@@ -0,0 +1,88 @@
+import math
+
+# Predictors computed by query_predictors, usable by the router
+PREDICTORS = ("avg_idf", "max_idf", "scs", "scq_sum", "scq_avg", "scq_max", "query_scope")
+
+
+def query_predictors(index, q):
+    """
+    pre-retrieval query performance predictors computed from the index statistics only
+    (no documents are scored)
+
+    Args:
+        index (InvertedIndex): index of the dataset
+        q (dict): the tokenised query {term: freq}
+
+    Returns:
+        dict {predictor: value}
+            avg_idf / max_idf: IDF of the query terms
+            scs: simplified clarity score, KL divergence of the query model from the collection model
+            scq_sum / scq_avg / scq_max: collection query similarity, (1 + ln cf) * ln(1 + N / df)
+            query_scope: -ln(fraction of documents containing at least one query term)
+
+    """
+    n_docs = index.num_docs
+    total_words = index.totalDocLength
+    q_len = sum(q.values())
+
+    idfs = []
+    scqs = []
+    scs = 0.0
+    matching = set()
+    for term, qf in q.items():
+        plist = index.postings.get(term, ())
+        df = len(plist)
+        cf = index.cf.get(term, 0)
+        matching.update(doc_no for doc_no, _ in plist)
+
+        idfs.append(math.log(n_docs / df) if df else 0.0)
+        scqs.append((1 + math.log(cf)) * math.log(1 + n_docs / df) if df else 0.0)
+        if cf and q_len:
+            p_q = qf / q_len
+            scs += p_q * math.log2(p_q / (cf / total_words))
+
+    return {
+        "avg_idf": sum(idfs) / len(idfs) if idfs else 0.0,
+        "max_idf": max(idfs) if idfs else 0.0,
+        "scs": scs,
+        "scq_sum": sum(scqs),
+        "scq_avg": sum(scqs) / len(scqs) if scqs else 0.0,
+        "scq_max": max(scqs) if scqs else 0.0,
+        "query_scope": -math.log(len(matching) / n_docs) if matching and n_docs else 0.0,
+    }
+
+
+class QPPRouter:
+    """
+    sends a query to the cheap first-stage model when its predictor is at or above the threshold
+    (a clear, specific query that the first stage already ranks well) and to PRRM otherwise
+    """
+
+    def __init__(self, predictor="scq_avg", threshold=0.0, cheap_model="BM25"):
+        if predictor not in PREDICTORS:
+            raise ValueError(f"Unknown predictor: {predictor}")
+        self.predictor = predictor
+        self.threshold = threshold
+        self.cheap_model = cheap_model
+
+    @classmethod
+    def from_quantile(cls, all_predictors, predictor="scq_avg", cheap_fraction=0.5, cheap_model="BM25"):
+        """
+        pick the threshold so that roughly cheap_fraction of the given queries stop at the cheap model
+
+        Args:
+            all_predictors (list of dict): query_predictors() output for each query
+        """
+        values = sorted(p[predictor] for p in all_predictors)
+        if not values or cheap_fraction <= 0:
+            threshold = math.inf
+        else:
+            cut = min(len(values) - 1, int(len(values) * (1 - cheap_fraction)))
+            threshold = values[cut]
+        return cls(predictor, threshold, cheap_model)
+
+    def route(self, predictors):
+        """return the cheap model name or "PRRM" for one query's predictors"""
+        if predictors[self.predictor] >= self.threshold:
+            return self.cheap_model
+        return "PRRM"
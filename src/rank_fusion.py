@@ -0,0 +1,168 @@
+import os
+import time
+
+import numpy as np
+
+from evaluation import load_run_dir
+from run_format import docid_array
+
+# RRF constant from Cormack et al. (2009)
+RRF_K = 60
+METHODS = ("rrf", "combsum", "combmnz")
+NORMALIZATIONS = ("minmax", "zscore")
+
+
+class AlignedRuns:
+    """
+    runs laid out as one (runs, topics, docs) float array. column j of topic t is the integer
+    document id doc_ids[t, j] in every run, so fusion is elementwise NumPy over all topics at once.
+    padding and documents a run did not retrieve are NaN (doc id -1 for padding).
+    """
+
+    def __init__(self, names, topics, doc_ids, scores):
+        self.names = names  # run names, axis 0
+        self.topics = topics  # topic ids, axis 1
+        self.doc_ids = doc_ids  # int64 (topics, docs)
+        self.scores = scores  # float64 (runs, topics, docs)
+
+    @classmethod
+    def from_runs(cls, runs):
+        """
+        Args:
+            runs (dict): {run name: {topic id: {docid: score}}}, the format of the BM25/LMRM/PRRM loaders
+
+        Returns:
+            AlignedRuns over the topics every run has
+        """
+        names = list(runs)
+        topics = sorted(set.intersection(*(set(run) for run in runs.values()))) if runs else []
+        per_topic = []
+        for topic in topics:
+            ids = [docid_array(runs[name][topic].keys()) for name in names]
+            per_topic.append((np.unique(np.concatenate(ids)) if ids else np.empty(0, np.int64), ids))
+
+        width = max((len(u) for u, _ in per_topic), default=0)
+        doc_ids = np.full((len(topics), width), -1, dtype=np.int64)
+        scores = np.full((len(names), len(topics), width), np.nan)
+        for t, (topic, (union, ids)) in enumerate(zip(topics, per_topic)):
+            doc_ids[t, :len(union)] = union
+            for r, name in enumerate(names):
+                values = np.fromiter(runs[name][topic].values(), dtype=np.float64, count=len(ids[r]))
+                scores[r, t, np.searchsorted(union, ids[r])] = values
+        return cls(names, topics, doc_ids, scores)
+
+    def to_run(self, fused):
+        """turn a (topics, docs) score array back into {topic id: {docid: score}}, best first"""
+        run = {}
+        for t, topic in enumerate(self.topics):
+            valid = self.doc_ids[t] >= 0
+            ids, values = self.doc_ids[t, valid], fused[t, valid]
+            order = np.argsort(-values, kind="stable")
+            run[topic] = {str(ids[i]): float(values[i]) for i in order}
+        return run
+
+
+def rank_array(scores):
+    """0-based rank of each score within its (run, topic) row, best first. NaN ranks after every score"""
+    filled = np.where(np.isnan(scores), -np.inf, scores)
+    order = np.argsort(-filled, axis=-1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(scores.shape[-1]), axis=-1)
+    return ranks
+
+
+def truncate(scores, depth):
+    """keep only each run's top depth documents per topic, the rest become NaN (not retrieved)"""
+    return np.where(rank_array(scores) < depth, scores, np.nan)
+
+
+def normalize(scores, method="minmax"):
+    """per (run, topic) min-max or z-score normalization over the retrieved documents"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if method == "minmax":
+            lo = np.nanmin(scores, axis=-1, keepdims=True)
+            span = np.nanmax(scores, axis=-1, keepdims=True) - lo
+            return np.where(span > 0, (scores - lo) / span, np.where(np.isnan(scores), np.nan, 0.0))
+        if method == "zscore":
+            std = np.nanstd(scores, axis=-1, keepdims=True)
+            centred = scores - np.nanmean(scores, axis=-1, keepdims=True)
+            return np.where(std > 0, centred / std, np.where(np.isnan(scores), np.nan, 0.0))
+    raise ValueError(f"Unknown normalization: {method}")
+
+
+def fuse(aligned, method="rrf", normalization="minmax", depth=None, k=RRF_K, weights=None):
+    """
+    fuse every run of an AlignedRuns for all topics at once
+
+    Args:
+        method (str): "rrf" (sum of 1 / (k + rank)), "combsum" (sum of normalized scores)
+                      or "combmnz" (combsum times the number of runs that retrieved the document)
+        normalization (str): "minmax" or "zscore", for combsum/combmnz
+        depth (int): only each run's top depth documents count as retrieved (None = all)
+        weights (list of float): per-run weights, in aligned.names order
+
+    Returns:
+        (topics, docs) array of fused scores, NaN for padding
+    """
+    scores = aligned.scores if depth is None else truncate(aligned.scores, depth)
+    retrieved = ~np.isnan(scores)
+    w = np.ones(len(aligned.names)) if weights is None else np.asarray(weights, dtype=np.float64)
+    w = w.reshape(-1, 1, 1)
+
+    if method == "rrf":
+        contrib = np.where(retrieved, 1.0 / (k + rank_array(scores) + 1), 0.0)
+    elif method in ("combsum", "combmnz"):
+        contrib = np.nan_to_num(normalize(scores, normalization), nan=0.0)
+    else:
+        raise ValueError(f"Unknown fusion method: {method}")
+
+    fused = (w * contrib).sum(axis=0)
+    if method == "combmnz":
+        fused = fused * retrieved.sum(axis=0)
+    return np.where(aligned.doc_ids >= 0, fused, np.nan)
+
+
+if __name__ == '__main__':
+    import argparse
+    from evaluation import Qrels, evaluate, averages
+
+    parser = argparse.ArgumentParser(description="Fuse the BM25, LMRM and PRRM runs")
+    parser.add_argument("--method", choices=METHODS, default="rrf")
+    parser.add_argument("--normalization", choices=NORMALIZATIONS, default="minmax")
+    parser.add_argument("--depth", type=int, default=None, help="documents per run treated as retrieved")
+    parser.add_argument("--k", type=int, default=RRF_K, help="RRF rank constant")
+    args = parser.parse_args()
+
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    outputs_dir = os.path.join(parent_dir, "outputs")
+    benchmark_dir = os.path.join(parent_dir, "data", "EvaluationBenchmark")
+    rankings_dir = os.path.join(outputs_dir, "FUSION", "rankings")
+
+    runs = {"BM25": load_run_dir(os.path.join(outputs_dir, "BM25", "rankings"), "BM25IR"),
+            "LMRM": load_run_dir(os.path.join(outputs_dir, "LMRM", "rankings"), "LMRM"),
+            "PRRM": load_run_dir(os.path.join(outputs_dir, "PRRM", "rankings"), "PRRM")}
+
+    start = time.perf_counter()
+    aligned = AlignedRuns.from_runs(runs)
+    align_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    fused = fuse(aligned, args.method, args.normalization, args.depth, args.k)
+    fuse_secs = time.perf_counter() - start
+    fused_run = aligned.to_run(fused)
+
+    label = args.method.upper() if args.method == "rrf" else f"{args.method.upper()}_{args.normalization}"
+    os.makedirs(rankings_dir, exist_ok=True)
+    for topic, scores in fused_run.items():
+        with open(os.path.join(rankings_dir, f"{label}_R{topic}Ranking.dat"), 'w') as f:
+            for doc_id, score in scores.items():
+                f.write(f"{doc_id} {score}\n")
+
+    print(f"\n--- {label} over {len(aligned.topics)} topics x {len(aligned.names)} runs ---")
+    print(f"Alignment: {align_secs * 1000:.2f} ms | fusion: {fuse_secs * 1000:.2f} ms")
+    print(f"{'Run':<14} | {'MAP':>6} | {'P@12':>6} | {'DCG@12':>6}")
+    print("-" * 42)
+    qrels = Qrels.load(benchmark_dir)
+    for name, run in list(runs.items()) + [(label, fused_run)]:
+        avg = averages(evaluate(qrels, run, topics=aligned.topics))
+        print(f"{name:<14} | " + " | ".join(f"{avg[m]:.4f}" for m in ("MAP", "P@12", "DCG@12")))
+    print(f"Rankings saved to: {rankings_dir}")
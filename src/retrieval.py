@@ -0,0 +1,177 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import BM25IR
+import LMRM
+import data_processing_bm25
+import data_processing_lm
+from evaluation import Qrels, evaluate, averages
+
+
+def get_paths(data_dir=None):
+    """paths of a data directory laid out like data/ (the project's own by default)"""
+    if data_dir is None:
+        current_dir = os.path.dirname(os.path.abspath(__file__))  # src directory
+        data_dir = os.path.join(os.path.dirname(current_dir), "data")
+    return {
+        'data_dir': data_dir,
+        'dataset_base_dir': os.path.join(data_dir, "DataSets"),
+        'eval_benchmark_base_dir': os.path.join(data_dir, "EvaluationBenchmark"),
+        'queries_file_path': os.path.join(data_dir, "Queries-1.txt"),
+        'stopwords_file_path': os.path.join(data_dir, "common-english-words.txt"),
+    }
+
+
+class Resources:
+    """
+    the queries, stop words and judgments of one data directory, read once. nothing here (or in
+    the functions below) changes directory or module state, so one Resources can be shared by any
+    number of threads, and several data directories can be ranked side by side.
+    """
+
+    def __init__(self, paths):
+        self.paths = dict(paths)
+        self.bm25_stop_words = data_processing_bm25.load_stopwords(paths['stopwords_file_path'])
+        self.bm25_queries = data_processing_bm25.load_queries(paths['queries_file_path'])
+        self.lm_stop_words = data_processing_lm.read_stopwords(paths['stopwords_file_path'])
+        self.lm_queries = data_processing_lm.parse_queries(paths['queries_file_path'], self.lm_stop_words)
+        benchmark_dir = paths.get('eval_benchmark_base_dir')
+        self.qrels = Qrels.load(benchmark_dir) if benchmark_dir and os.path.isdir(benchmark_dir) else None
+
+    def datasets(self, codes=None):
+        """{RXXX: dataset folder} for every dataset with a query (or only the given XXX codes)"""
+        base = self.paths['dataset_base_dir']
+        found = {}
+        for folder_name in sorted(os.listdir(base)):
+            folder_path = os.path.join(base, folder_name)
+            topic = "R" + folder_name[-3:]
+            if not os.path.isdir(folder_path) or topic not in self.bm25_queries:
+                continue
+            if codes is None or folder_name[-3:] in codes:
+                found[topic] = folder_path
+        return found
+
+
+def rank_bm25(dataset_path, query, stop_words, k1=BM25IR.K1, b=BM25IR.B, k2=BM25IR.K2, n_scale=BM25IR.N_SCALE):
+    """
+    bm25 ranking of one dataset folder, as run_bm25 computes it
+
+    Args:
+        query (str): the query title
+        stop_words (list): output from data_processing_bm25.load_stopwords()
+
+    Returns:
+        dict {docid: bm25_score} in ranked order
+    """
+    coll = data_processing_bm25.parse_docs(stop_words, dataset_path)
+    pq = data_processing_bm25.parse_q(query, stop_words)
+    scores = BM25IR.bm25(coll, pq, BM25IR.df(coll), k1, b, k2, n_scale)
+    return dict(sorted(scores.items(), key=lambda x: x[1], reverse=True))
+
+
+def rank_lmrm(dataset_path, query_terms, stop_words, lambda_val=LMRM.LAMBDA_VAL):
+    """
+    language model ranking of one dataset folder, as run_lmrm computes it
+
+    Args:
+        query_terms (list): the processed query, from data_processing_lm.parse_queries()
+        stop_words (list): output from data_processing_lm.read_stopwords()
+
+    Returns:
+        dict {docid: log2 score} in ranked order
+    """
+    dataset_coll = data_processing_lm.parse_dataset_xml(dataset_path, stop_words)
+    cf, total = data_processing_lm.calculate_collection_stats(dataset_coll)
+    return dict(LMRM.rank_documents_lmrm(dataset_coll, query_terms, cf, total, lambda_val))
+
+
+def rank_topic(resources, model, topic, dataset_path, **params):
+    """rank one topic's dataset with "bm25" or "lmrm"; params go to rank_bm25/rank_lmrm"""
+    if model == "bm25":
+        return rank_bm25(dataset_path, resources.bm25_queries[topic], resources.bm25_stop_words, **params)
+    if model == "lmrm":
+        return rank_lmrm(dataset_path, resources.lm_queries.get(topic, []), resources.lm_stop_words, **params)
+    raise ValueError(f"unknown model: {model}")
+
+
+def rank_all(resources, model, codes=None, workers=1, **params):
+    """
+    rank every dataset (or only the given XXX codes) with one model, on up to workers threads
+
+    Returns:
+        dict {RXXX: {docid: score}} in topic order
+    """
+    datasets = resources.datasets(codes)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {topic: executor.submit(rank_topic, resources, model, topic, path, **params)
+                   for topic, path in datasets.items()}
+        return {topic: future.result() for topic, future in futures.items()}
+
+
+# Variants ranked together by check_concurrency: both models, plus settings that differ only in
+# what used to be per-process state (the LMRM stop word list) so cross-talk would show up
+CHECK_VARIANTS = {
+    'bm25': ("bm25", {}, False),
+    'bm25_k1=2.0': ("bm25", {'k1': 2.0}, False),
+    'lmrm': ("lmrm", {}, False),
+    'lmrm_no_stop_words': ("lmrm", {}, True),
+}
+
+
+def check_concurrency(resources, codes=None, workers=8, variants=CHECK_VARIANTS):
+    """
+    rank every variant of every dataset serially, then all of them at once interleaved on a thread
+    pool, and compare. a run matches only if it has the same documents, scores and order.
+
+    Returns:
+        (dict {variant: [RXXX that differ]}, dict {variant: serial runs})
+    """
+    datasets = resources.datasets(codes)
+    cwd = os.getcwd()
+
+    def task(variant, topic):
+        model, params, no_stop_words = variants[variant]
+        if no_stop_words:
+            return rank_lmrm(datasets[topic], resources.lm_queries.get(topic, []), [], **params)
+        return rank_topic(resources, model, topic, datasets[topic], **params)
+
+    jobs = [(variant, topic) for topic in datasets for variant in variants]
+    serial = {job: task(*job) for job in jobs}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {job: executor.submit(task, *job) for job in jobs}
+        concurrent = {job: future.result() for job, future in futures.items()}
+
+    mismatches = {variant: [] for variant in variants}
+    for job in jobs:
+        if list(serial[job].items()) != list(concurrent[job].items()):
+            mismatches[job[0]].append(job[1])
+    if os.getcwd() != cwd:
+        raise RuntimeError(f"working directory changed to {os.getcwd()}")
+    runs = {variant: {topic: serial[(variant, topic)] for topic in datasets} for variant in variants}
+    return mismatches, runs
+
+
+if __name__ == '__main__':
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rank every dataset from many threads at once and check the "
+                                                 "results match serial runs")
+    parser.add_argument("--data-dir", default=None, help="data directory (default: the project's data/)")
+    parser.add_argument("--topics", nargs="+", default=None, help="topic numbers, e.g. 101 102 (default: all)")
+    parser.add_argument("--workers", type=int, default=8, help="threads to rank with")
+    args = parser.parse_args()
+
+    resources = Resources(get_paths(args.data_dir))
+    mismatches, runs = check_concurrency(resources, set(args.topics) if args.topics else None, args.workers)
+
+    print(f"\n--- Concurrent vs serial rankings ({args.workers} threads) ---")
+    print(f"{'Variant':<20} | {'Topics':>6} | {'MAP':>6} | Result")
+    print("-" * 50)
+    for variant, differ in mismatches.items():
+        run = {topic[1:]: scores for topic, scores in runs[variant].items() if scores}
+        table = evaluate(resources.qrels, run) if resources.qrels is not None and run else {}
+        mean_ap = averages(table)['MAP'] if table else float('nan')
+        result = "PASS" if not differ else f"FAIL ({', '.join(differ)})"
+        print(f"{variant:<20} | {len(runs[variant]):>6} | {mean_ap:>6.4f} | {result}")
+    sys.exit(0 if not any(mismatches.values()) else 1)
@@ -0,0 +1,152 @@
+import os
+import time
+
+from inverted_index import build_index_from_coll, top_k
+from evaluation import evaluate_scores, write_rows
+
+# Feedback documents, expansion terms and the weight kept by the original query
+FB_DOCS = 10
+FB_TERMS = 10
+ORIGINAL_WEIGHT = 0.5
+
+
+def relevance_model(index, feedback, fb_terms=FB_TERMS):
+    """
+    RM1 relevance model from the forward vectors of the feedback documents,
+    P(w|R) proportional to sum over d of P(w|d) * P(d|q), with P(d|q) the normalised first-pass score
+
+    Args:
+        index (InvertedIndex): index whose forward vectors are read (nothing is re-parsed)
+        feedback (list): (doc number, score) pairs of the top first-pass documents
+
+    Returns:
+        dict {term: weight} of the fb_terms most likely terms, weights summing to 1
+
+    """
+    total = sum(max(score, 0.0) for _, score in feedback)
+    model = {}
+    for d, score in feedback:
+        doc_len = index.doc_lens[d]
+        if doc_len == 0:
+            continue
+        weight = (max(score, 0.0) / total if total > 0 else 1.0 / len(feedback)) / doc_len
+        get = model.get
+        for term, tf in index.forward[d].items():
+            model[term] = get(term, 0.0) + weight * tf
+
+    best = top_k(model, fb_terms)
+    norm = sum(w for _, w in best)
+    return {term: w / norm for term, w in best} if norm > 0 else {}
+
+
+def expand_query(q, model, original_weight=ORIGINAL_WEIGHT):
+    """RM3: interpolate the normalised original query with the relevance model, {term: weight}"""
+    q_total = float(sum(q.values()))
+    expanded = {term: original_weight * qf / q_total for term, qf in q.items()}
+    for term, w in model.items():
+        expanded[term] = expanded.get(term, 0.0) + (1 - original_weight) * w
+    return expanded
+
+
+def rm3(index, q, k=1000, fb_docs=FB_DOCS, fb_terms=FB_TERMS, original_weight=ORIGINAL_WEIGHT, df=None):
+    """
+    BM25 retrieval, RM3 expansion from the top fb_docs forward vectors, then BM25 again with the
+    expanded query. both passes use bm25_top_k, which only walks the postings of the query terms, so
+    the index can also be a statically pruned one (index_pruning.prune_index, passing its full_df)
+
+    Returns:
+        (list of the top k (docid, score) pairs best first, the expanded query)
+
+    """
+    first = index.bm25_top_k(q, fb_docs, df=df, doc_numbers=True)
+    model = relevance_model(index, first, fb_terms)
+    expanded = expand_query(q, model, original_weight)
+    return index.bm25_top_k(expanded, k, df=df), expanded
+
+
+def compare_rm3(topics, qrels, fb_docs=FB_DOCS, fb_terms=FB_TERMS, original_weight=ORIGINAL_WEIGHT,
+                prune=0.0):
+    """
+    evaluate BM25 against BM25 + RM3 on every topic
+
+    Args:
+        topics (dict): bm25_sweep.load_topics() output {XXX: (Rcv1Coll, df, query)}
+        qrels (Qrels): bm25_sweep.load_judgments() output
+        prune (float): fraction of postings removed with index_pruning.prune_index before retrieval
+
+    Returns:
+        (list of per-topic rows, {topic: RM3 ranking})
+
+    """
+    from index_pruning import posting_impacts, prune_index
+
+    rows, rankings = [], {}
+    for code, (coll, df, pq) in topics.items():
+        index = build_index_from_coll(coll)
+        full_df = None
+        if prune > 0:
+            index, full_df = prune_index(index, posting_impacts(index), prune)
+        k = index.num_docs
+
+        start = time.perf_counter()
+        bm25_ranked = index.bm25_top_k(pq, k, df=full_df)
+        bm25_secs = time.perf_counter() - start
+        start = time.perf_counter()
+        rm3_ranked, expanded = rm3(index, pq, k, fb_docs, fb_terms, original_weight, full_df)
+        rm3_secs = time.perf_counter() - start
+        rankings[code] = rm3_ranked
+
+        row = {'query_id': f"R{code}", 'expansion_terms': len(expanded) - len(pq),
+               'bm25_ms': bm25_secs * 1000, 'rm3_ms': rm3_secs * 1000}
+        for run_name, ranked in (("bm25", bm25_ranked), ("rm3", rm3_ranked)):
+            ap, pk, dcg = evaluate_scores(qrels, code, dict(ranked))
+            row[f"{run_name}_AP"] = ap
+            row[f"{run_name}_P@12"] = pk
+            row[f"{run_name}_DCG@12"] = dcg
+        rows.append(row)
+    return rows, rankings
+
+
+if __name__ == '__main__':
+    import argparse
+    import data_processing_bm25 as data_processing
+    from bm25_sweep import get_paths, load_topics, load_judgments
+
+    parser = argparse.ArgumentParser(description="BM25 with RM3 pseudo-relevance feedback")
+    parser.add_argument("--fb-docs", type=int, default=FB_DOCS)
+    parser.add_argument("--fb-terms", type=int, default=FB_TERMS)
+    parser.add_argument("--original-weight", type=float, default=ORIGINAL_WEIGHT)
+    parser.add_argument("--prune", type=float, default=0.0, help="fraction of postings to prune first")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    rankings_dir = os.path.join(parent_dir, "outputs", "RM3", "rankings")
+    results_path = os.path.join(parent_dir, "outputs", "RM3", "RM3_Evaluation_Results.csv")
+
+    query_dict = data_processing.load_queries(paths['queries_file_path'])
+    topics = load_topics(paths['dataset_base_dir'], query_dict, paths['stopwords_file_path'])
+    qrels = load_judgments(paths['eval_benchmark_base_dir'])
+
+    rows, rankings = compare_rm3(topics, qrels, args.fb_docs, args.fb_terms, args.original_weight, args.prune)
+
+    os.makedirs(rankings_dir, exist_ok=True)
+    for code, ranked in rankings.items():
+        with open(os.path.join(rankings_dir, f"RM3_R{code}Ranking.dat"), 'w') as f:
+            for doc_id, score in ranked:
+                f.write(f"{doc_id} {score}\n")
+    write_rows(rows, results_path)
+
+    n = len(rows)
+    print(f"\n--- BM25 vs BM25 + RM3 over {n} topics (fb_docs={args.fb_docs}, fb_terms={args.fb_terms}, "
+          f"original weight={args.original_weight}, pruned={args.prune:.0%}) ---")
+    print(f"{'Metric':<8} | {'BM25':>8} | {'RM3':>8} | {'Delta':>8}")
+    print("-" * 42)
+    for metric in ("AP", "P@12", "DCG@12"):
+        bm25_avg = sum(r[f"bm25_{metric}"] for r in rows) / n
+        rm3_avg = sum(r[f"rm3_{metric}"] for r in rows) / n
+        label = "MAP" if metric == "AP" else metric
+        print(f"{label:<8} | {bm25_avg:>8.4f} | {rm3_avg:>8.4f} | {rm3_avg - bm25_avg:>+8.4f}")
+    print(f"Latency per query: BM25 {sum(r['bm25_ms'] for r in rows) / n:.3f} ms, "
+          f"RM3 {sum(r['rm3_ms'] for r in rows) / n:.3f} ms")
+    print(f"Rankings saved to: {rankings_dir}\nResults saved to: {results_path}")
@@ -1,79 +1,106 @@
 import evaluation_bm25 as evaluation
+from evaluation import EvaluationSink, Qrels
 import data_processing_bm25 as data_processing
 import os
 
 
-if __name__ == '__main__':
-    import sys
-   
-    # Fixed paths for the new structure
+def get_paths():
+    """Get correct paths for the new folder structure."""
     root_dir = os.path.dirname(os.path.abspath(__file__))  # src directory
     parent_dir = os.path.dirname(root_dir)  # project root
-    
     data_folder = os.path.join(parent_dir, "data")  # data folder from project root
-    rank_output_folder = os.path.join(parent_dir, "data", "RankingOutputs_BM25")  # BM25 ranking outputs
-    benchmark_folder = os.path.join(parent_dir, "data", "EvaluationBenchmark")  # benchmarks
-    document_folder = os.path.join(parent_dir, "data", "DataSets")  # datasets
-    eval_output_folder = os.path.join(parent_dir, "data", "EvaluationOutputs")  # BM25 eval outputs
-    
+
+    return {
+        'rank_output_folder': os.path.join(data_folder, "RankingOutputs_BM25"),  # BM25 ranking outputs
+        'benchmark_folder': os.path.join(data_folder, "EvaluationBenchmark"),  # benchmarks
+        'document_folder': os.path.join(data_folder, "DataSets"),  # datasets
+        'eval_output_folder': os.path.join(data_folder, "EvaluationOutputs"),  # BM25 eval outputs
+        'queries_path': os.path.join(data_folder, "Queries-1.txt"),  # the full filepath for queries
+        'stop_word_path': os.path.join(data_folder, "common-english-words.txt")  # the full filepath for stop words
+    }
+
+
+def main(qrels=None):
+    """
+    rank every dataset with BM25, evaluate each ranking as it is produced and write the ranking and eval files
+
+    Args:
+        qrels (Qrels): judgments already loaded by the caller (default: read from the benchmark folder)
+
+    Returns:
+        ({RXXX: {docid: bm25_score}}, evaluation table {XXX: {metric: value}}), empty if an input is missing
+
+    """
+    paths = get_paths()
+    rank_output_folder = paths['rank_output_folder']
+    eval_output_folder = paths['eval_output_folder']
+    queries_path = paths['queries_path']
+    stop_word_path = paths['stop_word_path']
+    document_folder = paths['document_folder']
+
     # Create directories if they don't exist
     os.makedirs(rank_output_folder, exist_ok=True)
     os.makedirs(eval_output_folder, exist_ok=True)
-    
-    # Full paths to be passed into functions as required
-    queries_path = os.path.join(data_folder, "Queries-1.txt")  # the full filepath for queries
-    stop_word_path = os.path.join(data_folder, "common-english-words.txt")  # the full filepath for stop words
-    
+
     print(f"Looking for queries at: {queries_path}")
     print(f"Looking for stopwords at: {stop_word_path}")
     print(f"Looking for documents at: {document_folder}")
-    
+
     # Check if required files exist
     if not os.path.exists(queries_path):
         print(f"Error: Queries file not found at {queries_path}")
-        sys.exit(1)
+        return {}, {}
     if not os.path.exists(stop_word_path):
         print(f"Error: Stop words file not found at {stop_word_path}")
-        sys.exit(1)
+        return {}, {}
     if not os.path.exists(document_folder):
         print(f"Error: Documents folder not found at {document_folder}")
-        sys.exit(1)
-    
+        return {}, {}
+
     # Get the queries
-    query_dict = data_processing.load_queries(queries_path)        
+    query_dict = data_processing.load_queries(queries_path)
     print(f"Loaded {len(query_dict)} queries")
 
+    # Each dataset is evaluated as soon as it is ranked, against judgments loaded a single time
+    # (only documents with a non-negative score count as ranked, as in evaluation_bm25.eval_input)
+    sink = EvaluationSink(qrels if qrels is not None else Qrels.load(paths['benchmark_folder']), model_name="BM25")
+    def evaluate_ranking(ref, scores):
+        sink.add(ref, {d: s for d, s in scores.items() if s >= 0})
+
     # Process and rank
-    data_processing.process_and_rank_datasets(document_folder, rank_output_folder, query_dict, stop_word_path)
+    runs = data_processing.process_and_rank_datasets(document_folder, rank_output_folder, query_dict,
+                                                     stop_word_path, on_ranked=evaluate_ranking)
 
-    # Check if there are already BM25 files in the eval location because the next step appends scores per query.
-    # If there are files at this step, then we don't want to repeat already output scores.
-    # To output new scores, delete the BM25 files in the eval_path
+    # Check if there are already BM25 files in the eval location. They are rewritten in one pass,
+    # so existing scores are kept unless the BM25 files in the eval_path are deleted
     bm25_eval_files_exist = False
     if os.path.exists(eval_output_folder):
         bm25_eval_files_exist = any(
             os.path.isfile(os.path.join(eval_output_folder, f)) and "BM25" in f
             for f in os.listdir(eval_output_folder)
         )
-    
-    ap_list = []
-    pk_list = []
-    dcg12_list = []
-    
-    # Evaluate
-    for key, value in query_dict.items():
-        # We only need the code
-        dataset_code = key[1:]        
-        ap, pk, dcg12 = evaluation.eval(benchmark_folder, rank_output_folder, dataset_code, eval_output_folder, bm25_eval_files_exist)
-        ap_list.append(ap)
-        pk_list.append(pk)
-        dcg12_list.append(dcg12)
-        
-    
-    map_score = sum(ap_list) / len(ap_list)
-    pk_avg = sum(pk_list) / len(pk_list)
-    dcg_avg = sum(dcg12_list) / len(dcg12_list)
-    print(f"\nBM25 Results:")
-    print(f"MAP: {map_score:.4f}")
-    print(f"P@12 avg: {pk_avg:.4f}")
-    print(f"DCG@12 avg: {dcg_avg:.4f}")    
\ No newline at end of file
+
+    table = sink.sorted_table()
+    if not bm25_eval_files_exist:
+        evaluation.write_eval_files(table, eval_output_folder)
+    ap_list = [row["MAP"] for row in table.values()]
+    pk_list = [row["P@12"] for row in table.values()]
+    dcg12_list = [row["DCG@12"] for row in table.values()]
+
+    if table:
+        map_score = sum(ap_list) / len(ap_list)
+        pk_avg = sum(pk_list) / len(pk_list)
+        dcg_avg = sum(dcg12_list) / len(dcg12_list)
+        print(f"\nBM25 Results:")
+        print(f"MAP: {map_score:.4f}")
+        print(f"P@12 avg: {pk_avg:.4f}")
+        print(f"DCG@12 avg: {dcg_avg:.4f}")
+    return runs, table
+
+
+if __name__ == '__main__':
+    import sys
+
+    runs, table = main()
+    if not runs:
+        sys.exit(1)
@@ -0,0 +1,175 @@
+import os
+import json
+import mmap
+
+import numpy as np
+
+# File layout: MAGIC, uint32 header length, JSON header {topics, offsets, tag} padded to 8 bytes,
+# then every topic's int64 docids in ranked order followed by every topic's float32 scores
+MAGIC = b"RUNF1\n"
+RUN_SUFFIX = ".run"
+
+
+def docid_array(doc_ids):
+    """
+    int64 array of docids (strings or ints). an id that would not come back unchanged from str()
+    (leading zeros, signs, non-numeric ids) raises ValueError instead of being silently rewritten
+    """
+    ids = [str(doc_id) for doc_id in doc_ids]
+    try:
+        array = np.fromiter(ids, dtype=np.int64, count=len(ids))
+        bad = [doc_id for doc_id, back in zip(ids, map(str, array.tolist())) if doc_id != back]
+    except (ValueError, OverflowError):
+        bad = [doc_id for doc_id in ids
+               if not doc_id.isdigit() or str(int(doc_id)) != doc_id or int(doc_id) >= 2 ** 63]
+    if bad:
+        raise ValueError(f"{len(bad)} docid(s) cannot be stored as integers without changing them, "
+                         f"e.g. {bad[:3]}; docids must be decimal numbers without leading zeros")
+    return array
+
+
+class BinaryRun:
+    """
+    a run in columnar form: topic t's documents are doc_ids[offsets[t]:offsets[t + 1]], best first,
+    with their scores at the same positions. arrays read from a file are views of a memory map.
+    """
+
+    def __init__(self, topics, offsets, doc_ids, scores, tag=""):
+        self.topics = list(topics)  # query ids without the R, e.g. "101"
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.doc_ids = doc_ids  # int64
+        self.scores = scores  # float32
+        self.tag = tag
+        self.index = {topic: i for i, topic in enumerate(self.topics)}
+
+    @classmethod
+    def from_runs(cls, run, tag=""):
+        """
+        Args:
+            run (dict): {topic: {docid: score}}, topic ids with or without the R
+
+        Returns:
+            BinaryRun with each topic ranked by descending score (ties keep the run's order); docids
+            that are not plain decimal integers raise ValueError (see docid_array)
+        """
+        topics, ids, values = [], [], []
+        for topic, scores in run.items():
+            topics.append(topic[1:] if topic.startswith("R") else topic)
+            d = docid_array(scores.keys())
+            s = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+            order = np.argsort(-s, kind="stable")
+            ids.append(d[order])
+            values.append(s[order].astype(np.float32))
+        offsets = np.concatenate([[0], np.cumsum([len(d) for d in ids])]).astype(np.int64)
+        doc_ids = np.concatenate(ids) if ids else np.empty(0, np.int64)
+        scores = np.concatenate(values) if values else np.empty(0, np.float32)
+        return cls(topics, offsets, doc_ids, scores, tag)
+
+    def topic(self, topic):
+        """(docids, scores) arrays of one topic, best first"""
+        i = self.index[topic]
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        return self.doc_ids[lo:hi], self.scores[lo:hi]
+
+    def scores_dict(self, topic):
+        """one topic as {docid: score}, the format the text rankings load into"""
+        doc_ids, scores = self.topic(topic)
+        return dict(zip(doc_ids.astype(str).tolist(), scores.astype(np.float64).tolist()))
+
+    def to_runs(self):
+        """{topic: {docid: score}} for every topic"""
+        return {topic: self.scores_dict(topic) for topic in self.topics}
+
+    def save(self, path):
+        """write the whole run in one pass"""
+        header = json.dumps({"topics": self.topics, "offsets": self.offsets.tolist(), "tag": self.tag}).encode()
+        header += b" " * (-(len(MAGIC) + 4 + len(header)) % 8)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC + np.uint32(len(header)).tobytes() + header)
+            f.write(np.ascontiguousarray(self.doc_ids, dtype=np.int64).tobytes())
+            f.write(np.ascontiguousarray(self.scores, dtype=np.float32).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """memory-map a .run file; the docid and score arrays are read-only views of the file"""
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a binary run file: {path}")
+            header_len = int(np.frombuffer(f.read(4), dtype=np.uint32)[0])
+            header = json.loads(f.read(header_len))
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+        start = len(MAGIC) + 4 + header_len
+        n = header["offsets"][-1]
+        doc_ids = np.frombuffer(buf, dtype=np.int64, count=n, offset=start)
+        scores = np.frombuffer(buf, dtype=np.float32, count=n, offset=start + 8 * n)
+        return cls(header["topics"], header["offsets"], doc_ids, scores, header.get("tag", ""))
+
+
+def binary_run_path(directory, prefix):
+    """
+    path of <prefix>.run in directory, or None when it is missing or older than one of the
+    <prefix>_RXXXRanking.dat text files next to it (which are then the current run)
+    """
+    path = os.path.join(directory, prefix + RUN_SUFFIX)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    for name in os.listdir(directory):
+        if name.startswith(prefix + "_R") and name.endswith("Ranking.dat"):
+            if os.path.getmtime(os.path.join(directory, name)) > mtime:
+                return None
+    return path
+
+
+def write_run(path, run, tag=""):
+    """write {topic: {docid: score}} as a binary run file"""
+    BinaryRun.from_runs(run, tag).save(path)
+
+
+def read_run(path):
+    return BinaryRun.load(path)
+
+
+def export_trec(binary_run, output_path, tag=None):
+    """write a run in the standard TREC format, "RXXX Q0 docid rank score tag" per line"""
+    tag = tag or binary_run.tag or "run"
+    lines = []
+    for topic in binary_run.topics:
+        doc_ids, scores = binary_run.topic(topic)
+        lines.extend(f"R{topic} Q0 {d} {rank} {s:.6f} {tag}"
+                     for rank, (d, s) in enumerate(zip(doc_ids.tolist(), scores.tolist()), 1))
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+if __name__ == '__main__':
+    import time
+    import argparse
+    from evaluation import load_run_dir
+
+    parser = argparse.ArgumentParser(description="Convert <PREFIX>_RXXXRanking.dat files to a binary run "
+                                                 "and optionally export it in TREC format")
+    parser.add_argument("directory", help="folder of the ranking files")
+    parser.add_argument("prefix", help="ranking file prefix, e.g. BM25IR")
+    parser.add_argument("--trec", default=None, help="also write a TREC run file here")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    run = load_run_dir(args.directory, args.prefix)
+    text_secs = time.perf_counter() - start
+    path = os.path.join(args.directory, args.prefix + RUN_SUFFIX)
+    write_run(path, run, args.prefix)
+
+    start = time.perf_counter()
+    binary_run = read_run(path)
+    binary_secs = time.perf_counter() - start
+    print(f"{len(binary_run.topics)} topics, {len(binary_run.doc_ids)} documents -> {path} "
+          f"({os.path.getsize(path) / 1024:.0f} KiB)")
+    print(f"Load time: text files {text_secs * 1000:.1f} ms | binary {binary_secs * 1000:.2f} ms")
+    if args.trec:
+        export_trec(binary_run, args.trec)
+        print(f"TREC run saved to: {args.trec}")
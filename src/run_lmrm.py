@@ -1,13 +1,12 @@
 import os
 import zipfile
 import shutil
-import csv
 
-from data_processing_lm import (load_stopwords, parse_dataset_xml, 
+from data_processing_lm import (read_stopwords, parse_dataset_xml, 
                                 parse_queries, calculate_collection_stats)
 from LMRM import rank_documents_lmrm
-from evaluation_lm import (load_relevance_judgments, precision_at_k, 
-                           average_precision, dcg_at_k, print_evaluation_summary)
+from evaluation import EvaluationSink, Qrels, print_results, write_results
+from run_format import write_run, RUN_SUFFIX
 
 # Constants
 LAMBDA_VAL = 0.4
@@ -28,57 +27,29 @@ def get_paths():
         'ranking_output_dir': os.path.join(current_dir, "RankingOutputs_LMRM")  # in src folder
     }
 
-def save_evaluation_to_csv(all_query_eval_results):
-    """Save LMRM evaluation results to CSV file in outputs/LMRM/ folder."""
+def save_evaluation_to_csv(table):
+    """Save the LMRM evaluation table to CSV file in outputs/LMRM/ folder."""
     # Get the project root directory
     current_dir = os.path.dirname(os.path.abspath(__file__))  # src directory
     parent_dir = os.path.dirname(current_dir)  # project root
     
-    # Create the LMRM output directory in outputs folder
-    lmrm_output_dir = os.path.join(parent_dir, "outputs", "LMRM")
-    os.makedirs(lmrm_output_dir, exist_ok=True)
-    
-    csv_file_path = os.path.join(lmrm_output_dir, "LMRM_Evaluation_Results.csv")
+    csv_file_path = os.path.join(parent_dir, "outputs", "LMRM", "LMRM_Evaluation_Results.csv")
     
     try:
-        with open(csv_file_path, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['Query', 'MAP', 'P@12', 'DCG@12']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            # Write header
-            writer.writeheader()
-            
-            # Write individual query results
-            for result in all_query_eval_results:
-                writer.writerow({
-                    'Query': result['query_id'],
-                    'MAP': f"{result['AP']:.4f}",
-                    'P@12': f"{result['P@12']:.4f}",
-                    'DCG@12': f"{result['DCG@12']:.4f}"
-                })
-            
-            # Calculate and write average scores
-            if all_query_eval_results:
-                num_queries = len(all_query_eval_results)
-                avg_map = sum(result['AP'] for result in all_query_eval_results) / num_queries
-                avg_p12 = sum(result['P@12'] for result in all_query_eval_results) / num_queries
-                avg_dcg12 = sum(result['DCG@12'] for result in all_query_eval_results) / num_queries
-                
-                writer.writerow({
-                    'Query': 'Average',
-                    'MAP': f"{avg_map:.4f}",
-                    'P@12': f"{avg_p12:.4f}",
-                    'DCG@12': f"{avg_dcg12:.4f}"
-                })
-        
+        write_results(table, csv_file_path, digits=4)
         print(f"\n LMRM evaluation results saved to: {csv_file_path}")
-        
     except Exception as e:
         print(f"Error saving LMRM evaluation results to CSV: {e}")
 
-def main():
-    """Main function with corrected paths and CSV output."""
+def main(write_rankings=True, qrels=None):
+    """
+    Main function with corrected paths and CSV output.
+    Returns the LMRM scores {query_id: {doc_id: score}} so they can be handed to PRRM in-process;
+    write_rankings=False skips writing the ranking .dat files. qrels (evaluation.Qrels) are the
+    judgments already loaded by the caller (default: read from the benchmark folder).
+    """
     paths = get_paths()
+    lmrm_runs = {}
     
     # Check if required files exist
     required_paths = [
@@ -91,31 +62,34 @@ def main():
     for path in required_paths:
         if not os.path.exists(path):
             print(f"Error: Required path not found: {path}")
-            return
+            return lmrm_runs
     
     print("All required paths found")
     
     # Load stopwords
-    load_stopwords(paths['stopwords_file_path'])
+    stop_words = read_stopwords(paths['stopwords_file_path'])
 
     # Parse queries
-    queries_map = parse_queries(paths['queries_file_path'])
+    queries_map = parse_queries(paths['queries_file_path'], stop_words)
     if not queries_map:
         print("No queries parsed. Exiting.")
-        return
+        return lmrm_runs
 
     print(f"Loaded {len(queries_map)} queries")
 
     # Create output directory for rankings
-    if not os.path.exists(paths['ranking_output_dir']):
-        os.makedirs(paths['ranking_output_dir'])
-    else:
-        # Clean out old ranking files if directory exists
-        for f_name in os.listdir(paths['ranking_output_dir']):
-            if f_name.startswith("LMRM_R") and f_name.endswith("Ranking.dat"):
-                os.remove(os.path.join(paths['ranking_output_dir'], f_name))
-
-    all_query_eval_results = []
+    if write_rankings:
+        if not os.path.exists(paths['ranking_output_dir']):
+            os.makedirs(paths['ranking_output_dir'])
+        else:
+            # Clean out old ranking files if directory exists
+            for f_name in os.listdir(paths['ranking_output_dir']):
+                if (f_name.startswith("LMRM_R") and f_name.endswith("Ranking.dat")) or f_name == "LMRM" + RUN_SUFFIX:
+                    os.remove(os.path.join(paths['ranking_output_dir'], f_name))
+
+    # Each ranking is evaluated as soon as it is produced, against judgments loaded a single time
+    sink = EvaluationSink(qrels if qrels is not None else Qrels.load(paths['eval_benchmark_base_dir']),
+                          k=K_FOR_EVAL, model_name="LMRM")
     query_numbers_to_process = list(range(101, 151))
     
     # Main Processing Loop
@@ -139,11 +113,11 @@ def main():
 
         # 1. Data Processing for the current dataset
         print(f"  Parsing and preprocessing documents in {current_dataset_path}...")
-        dataset_coll = parse_dataset_xml(current_dataset_path)
+        dataset_coll = parse_dataset_xml(current_dataset_path, stop_words)
         
         if not dataset_coll or not dataset_coll.docs:
             print(f"  No documents found or parsed for {dataset_folder_name}. Skipping.")
-            all_query_eval_results.append({'query_id': query_id_full, 'P@12': 0.0, 'AP': 0.0, 'DCG@12': 0.0})
+            sink.add(query_id_full, {})
             continue
             
         collection_term_freqs, total_collection_words = calculate_collection_stats(dataset_coll)
@@ -155,44 +129,36 @@ def main():
         ranked_docs_with_scores = rank_documents_lmrm(dataset_coll, current_query_processed_terms,
                                                       collection_term_freqs, total_collection_words,
                                                       LAMBDA_VAL)
+        lmrm_runs[query_id_full] = dict(ranked_docs_with_scores)
 
-        ranking_file_name = f"LMRM_{query_id_full}Ranking.dat"
-        ranking_file_full_path = os.path.join(paths['ranking_output_dir'], ranking_file_name)
-        with open(ranking_file_full_path, 'w', encoding='utf-8') as f_rank_out:
-            for doc_id, score in ranked_docs_with_scores:
-                f_rank_out.write(f"{doc_id} {score}\n")
-        print(f"  Generated ranking file: {ranking_file_full_path}")
+        if write_rankings:
+            ranking_file_name = f"LMRM_{query_id_full}Ranking.dat"
+            ranking_file_full_path = os.path.join(paths['ranking_output_dir'], ranking_file_name)
+            with open(ranking_file_full_path, 'w', encoding='utf-8') as f_rank_out:
+                for doc_id, score in ranked_docs_with_scores:
+                    f_rank_out.write(f"{doc_id} {score}\n")
+            print(f"  Generated ranking file: {ranking_file_full_path}")
 
         # 3. Individual Evaluation for LMRM
         print(f"  Evaluating LMRM for {query_id_full}...")
-        relevance_judgments = load_relevance_judgments(paths['eval_benchmark_base_dir'], query_id_str_numeric)
-        
-        if not relevance_judgments:
-            print(f"  Warning: No relevance judgments found for {query_id_full}. Evaluation metrics will be 0.")
-            p_at_12, ap, dcg_at_12 = 0.0, 0.0, 0.0
-        else:
-            ranked_doc_ids_only_list = [doc_id for doc_id, score in ranked_docs_with_scores]
-            p_at_12 = precision_at_k(ranked_doc_ids_only_list, relevance_judgments, K_FOR_EVAL)
-            ap = average_precision(ranked_doc_ids_only_list, relevance_judgments)
-            dcg_at_12 = dcg_at_k(ranked_doc_ids_only_list, relevance_judgments, K_FOR_EVAL)
-        
-        print(f"  {query_id_full} - P@12: {p_at_12:.4f}, AP: {ap:.4f}, DCG@12: {dcg_at_12:.4f}")
-        
-        all_query_eval_results.append({
-            'query_id': query_id_full,
-            'P@12': p_at_12,
-            'AP': ap,
-            'DCG@12': dcg_at_12
-        })
+        if sink.add(query_id_full, ranked_docs_with_scores) is None:
+            print(f"  Warning: No relevance judgments found for {query_id_full}. It is left out of the evaluation.")
+
+    # The whole run again as one binary columnar file, written in a single pass
+    if write_rankings and lmrm_runs:
+        write_run(os.path.join(paths['ranking_output_dir'], "LMRM" + RUN_SUFFIX), lmrm_runs, "LMRM")
 
     # Final Evaluation Summary
-    if all_query_eval_results:
-        print_evaluation_summary(all_query_eval_results, model_name="LMRM")
+    table = sink.sorted_table()
+    if table:
+        print_results(table, "LMRM")
         
         # Save evaluation results to CSV file
-        save_evaluation_to_csv(all_query_eval_results)
+        save_evaluation_to_csv(table)
     else:
         print("No queries were processed or evaluated.")
 
+    return lmrm_runs
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,138 @@
+import os
+import hashlib
+
+import numpy as np
+
+from artifact_cache import LRUCache
+from evaluation import METRICS, Qrels, evaluate, load_run_dir
+from run_format import RUN_SUFFIX
+
+# Number of run matrices and judgment sets kept in memory by default
+MAX_CACHED_MATRICES = 32
+MAX_CACHED_QRELS = 4
+
+# In-memory matrices and judgments keyed by fingerprint, so repeated requests in a process are free
+_matrices = LRUCache(MAX_CACHED_MATRICES)
+_qrels = LRUCache(MAX_CACHED_QRELS)
+
+
+class RunMatrix:
+    """
+    per-topic metric values of one run as a (topics, metrics) array keyed by query id. the ranking
+    files are parsed and evaluated once; every test over the run reads this table instead.
+    """
+
+    def __init__(self, topics, metrics, values):
+        self.topics = list(topics)  # query ids without the R, e.g. "101"
+        self.metrics = list(metrics)
+        self.values = values  # float64 (topics, metrics)
+        self.row_of = {topic: row for row, topic in enumerate(self.topics)}
+
+    @classmethod
+    def from_table(cls, table, metrics=METRICS):
+        """build from an evaluation.evaluate() table"""
+        topics = list(table)
+        values = np.array([[table[t][m] for m in metrics] for t in topics], dtype=np.float64)
+        return cls(topics, metrics, values.reshape(len(topics), len(metrics)))
+
+    def column(self, metric, topics=None):
+        """the metric for every topic (or the given topics, in that order)"""
+        col = self.values[:, self.metrics.index(metric)]
+        if topics is None:
+            return col
+        return col[[self.row_of[t] for t in topics]]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, topics=np.array(self.topics), metrics=np.array(self.metrics), values=self.values)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["topics"].tolist(), data["metrics"].tolist(), data["values"])
+
+
+def paired(matrix1, matrix2, metric):
+    """
+    line two runs up by query id
+
+    Returns:
+        (common query ids, metric values of matrix1, metric values of matrix2), aligned
+    """
+    common = [t for t in matrix1.topics if t in matrix2.row_of]
+    return common, matrix1.column(metric, common), matrix2.column(metric, common)
+
+
+def files_fingerprint(directory, names):
+    """hash of the given file names, sizes and modification times in a directory"""
+    h = hashlib.sha1()
+    for name in sorted(names):
+        st = os.stat(os.path.join(directory, name))
+        h.update(f"{name}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()[:16]
+
+
+def run_fingerprint(run_dir, prefix, benchmark_dir, metrics=METRICS):
+    """hash of the run's ranking files, the benchmark files and the metric names"""
+    ranking_files = [f for f in os.listdir(run_dir)
+                     if (f.startswith(prefix + "_") and f.endswith(".dat")) or f == prefix + RUN_SUFFIX]
+    benchmark_files = [f for f in os.listdir(benchmark_dir) if f.endswith(".txt")]
+    h = hashlib.sha1()
+    h.update(files_fingerprint(run_dir, ranking_files).encode())
+    h.update(files_fingerprint(benchmark_dir, benchmark_files).encode())
+    h.update(",".join(metrics).encode())
+    return h.hexdigest()[:16]
+
+
+def get_qrels(benchmark_dir, cache=None):
+    """
+    judgments of benchmark_dir, read once per process while the files are unchanged.
+    cache (an artifact_cache.LRUCache) replaces the module's own cache of MAX_CACHED_QRELS
+    """
+    if cache is None:
+        cache = _qrels
+    key = files_fingerprint(benchmark_dir, [f for f in os.listdir(benchmark_dir) if f.endswith(".txt")])
+    qrels = cache.get(key)
+    if qrels is None:
+        qrels = Qrels.load(benchmark_dir)
+        cache.put(key, qrels)
+    return qrels
+
+
+def get_run_matrix(run_dir, prefix, benchmark_dir, cache_dir=None, metrics=METRICS, cache=None):
+    """
+    return the run matrix for the <prefix>_RXXXRanking.dat files in run_dir, evaluating them only if
+    they are not already in memory or (when cache_dir is given) saved on disk from a previous run
+
+    Args:
+        run_dir (str): folder of the run's ranking files
+        prefix (str): ranking file prefix, e.g. "BM25IR"
+        benchmark_dir (str): EvaluationBenchmark folder
+        cache_dir (str): where .npz matrices are kept between runs (None = memory only)
+        cache (LRUCache): in-memory matrices to use instead of the module's MAX_CACHED_MATRICES
+
+    Returns:
+        RunMatrix
+
+    """
+    if cache is None:
+        cache = _matrices
+    key = run_fingerprint(run_dir, prefix, benchmark_dir, metrics)
+    matrix = cache.get(key)
+    if matrix is not None:
+        return matrix
+
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, f"{prefix}_{key}.npz")
+        if os.path.exists(path):
+            matrix = RunMatrix.load(path)
+
+    if matrix is None:
+        run = {topic: scores for topic, scores in load_run_dir(run_dir, prefix).items() if scores}
+        matrix = RunMatrix.from_table(evaluate(get_qrels(benchmark_dir), run, metrics=metrics), metrics)
+        if path:
+            matrix.save(path)
+
+    cache.put(key, matrix)
+    return matrix
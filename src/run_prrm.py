@@ -1,10 +1,27 @@
 import os
 import re
-import subprocess
-from PRRM import PRRMModel
+import csv
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from artifact_cache import LRUCache
+from PRRM import StreamingPRRMModel, get_trained_model, load_latest_model
 from data_processing_prrm import parse_docs, parse_query, load_stop_words
-from feature_extraction_prrm import extract_features
-from evaluation_prrm import average_precision, precision_at_k, dcg_at_k
+from feature_store import get_feature_store
+from evaluation import EvaluationSink, Qrels, load_ranking_file, load_run_dir, print_results
+from run_format import binary_run_path, read_run, write_run, RUN_SUFFIX
+from inverted_index import build_index_from_docs, top_k
+from positional_index import build_positional_index
+from qpp import PREDICTORS, QPPRouter, query_predictors
+
+# Default number of first-stage candidates reranked by PRRM in cascade mode
+N_CANDIDATES = 100
+
+# Cascade stages that build per-dataset structures rather than answer the query
+BUILD_STAGES = ('parse', 'feature_store')
 
 def get_paths():
     """Get correct paths for the new folder structure."""
@@ -15,11 +32,16 @@ def get_paths():
     return {
         'data_dir': data_dir,
         'dataset_base_dir': os.path.join(data_dir, "DataSets"),
+        'eval_benchmark_dir': os.path.join(data_dir, "EvaluationBenchmark"),
         'queries_file_path': os.path.join(data_dir, "Queries-1.txt"),
         'stopwords_file_path': os.path.join(data_dir, "common-english-words.txt"),
         'lmrm_rankings_dir': os.path.join(current_dir, "RankingOutputs_LMRM"),
         'bm25_rankings_dir': os.path.join(data_dir, "RankingOutputs_BM25"),
-        'prrm_output_dir': os.path.join(current_dir, "RankingOutputs_PRRM")
+        'prrm_output_dir': os.path.join(current_dir, "RankingOutputs_PRRM"),
+        'feature_cache_dir': os.path.join(current_dir, "FeatureCache_PRRM"),
+        'model_cache_dir': os.path.join(current_dir, "ModelCache_PRRM"),
+        'prrm_eval_results_path': os.path.join(current_dir, "PRRM_Evaluation_Results.csv"),
+        'cascade_latency_path': os.path.join(parent_dir, "outputs", "PRRM", "PRRM_Cascade_Latency.csv")
     }
 
 # Extracts queries from the Queries-1.txt file 
@@ -48,78 +70,80 @@ def extract_queries(filepath):
 
 # Loads ranking scores from a .dat file into a dictionary
 def load_ranking_scores(filepath):
-    scores = {}
     if not os.path.exists(filepath):
         print(f"Warning: Ranking file not found: {filepath}")
-        return scores
-    
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Handle different formats
-            if line.startswith('[') and line.endswith(']'):
-                # BM25 format: ['docid', 'score']
-                line = line.strip("[]")
-                parts = [item.strip().strip("'\"") for item in line.split(",")]
-                if len(parts) == 2:
-                    try:
-                        scores[parts[0]] = float(parts[1])
-                    except ValueError:
-                        continue
-            else:
-                # LMRM format: docid score
-                parts = line.split()
-                if len(parts) == 2:
-                    try:
-                        scores[parts[0]] = float(parts[1])
-                    except ValueError:
-                        continue
-    return scores
-
-# Runs PRRM for a single query and dataset
-def run_prrm_for_query(query_id, query_text, dataset_path, stop_words, paths):
-    print(f"\nRunning PRRM for R{query_id}")
-    # Parse documents
-    documents = parse_docs(dataset_path, stop_words)
-    if not documents:
-        print(f" No documents found for R{query_id}")
-        return
+        return {}
+    return load_ranking_file(filepath)
 
-    query_terms = parse_query(query_text, stop_words)
-    print(f" Parsed {len(documents)} documents and query terms")
+# Binary runs already opened in this process, keyed by path and modification time; the least recently
+# used is dropped once more than MAX_CACHED_RUNS are open (e.g. after the files were rewritten)
+MAX_CACHED_RUNS = 4
+_binary_runs = LRUCache(MAX_CACHED_RUNS)
 
-    # Load scores from both models
-    lmrm_file = os.path.join(paths['lmrm_rankings_dir'], f"LMRM_R{query_id}Ranking.dat")
-    bm25_file = os.path.join(paths['bm25_rankings_dir'], f"BM25IR_R{query_id}Ranking.dat")
+# Gets one query's {docid: score} from the <prefix>.run binary run in directory when it is there and
+# up to date (see run_format.binary_run_path), otherwise from its <prefix>_RXXXRanking.dat text file
+def load_query_scores(directory, prefix, query_id):
+    binary_path = binary_run_path(directory, prefix) if os.path.isdir(directory) else None
+    if binary_path:
+        key = (binary_path, os.path.getmtime(binary_path))
+        binary_run = _binary_runs.get(key)
+        if binary_run is None:
+            binary_run = read_run(binary_path)
+            _binary_runs.put(key, binary_run)
+        return binary_run.scores_dict(query_id) if query_id in binary_run.index else {}
+    return load_ranking_scores(os.path.join(directory, f"{prefix}_R{query_id}Ranking.dat"))
 
-    lmrm_scores = load_ranking_scores(lmrm_file)
-    bm25_scores = load_ranking_scores(bm25_file)
+# Gets the BM25 and LMRM scores for a query: from in-memory runs {RXXX: {docid: score}} when given
+# (e.g. the return values of data_processing_bm25.process_and_rank_datasets and run_lmrm.main),
+# otherwise from the ranking files
+def get_run_scores(query_id, paths, bm25_runs=None, lmrm_runs=None):
+    if lmrm_runs is not None:
+        lmrm_scores = lmrm_runs.get(f"R{query_id}", {})
+    else:
+        lmrm_scores = load_query_scores(paths['lmrm_rankings_dir'], "LMRM", query_id)
+    if bm25_runs is not None:
+        bm25_scores = bm25_runs.get(f"R{query_id}", {})
+    else:
+        bm25_scores = load_query_scores(paths['bm25_rankings_dir'], "BM25IR", query_id)
+    return bm25_scores, lmrm_scores
 
-    print(f" Loaded {len(lmrm_scores)} LMRM scores and {len(bm25_scores)} BM25 scores")
+# Runs BM25 and LMRM in this process and returns their scores as ({RXXX: {docid: score}}, {RXXX: {docid: score}})
+# for PRRM to consume directly. The ranking files are only written when write_files is set
+def run_first_stage_in_process(paths, write_files=False):
+    import data_processing_bm25
+    import run_lmrm
 
-    if not lmrm_scores or not bm25_scores:
-        print(f" Skipping R{query_id}: Missing ranking files")
-        return
+    if write_files:
+        os.makedirs(paths['bm25_rankings_dir'], exist_ok=True)
+    bm25_queries = data_processing_bm25.load_queries(paths['queries_file_path'])
+    bm25_runs = data_processing_bm25.process_and_rank_datasets(
+        paths['dataset_base_dir'], paths['bm25_rankings_dir'], bm25_queries,
+        paths['stopwords_file_path'], write_files=write_files)
+    lmrm_runs = run_lmrm.main(write_rankings=write_files)
+    return bm25_runs, lmrm_runs
 
-    # Rank by score
+# Docids ranked in the top (bottom) 1/split by both BM25 and LMRM, as (top_docs, bottom_docs) sets,
+# or (None, None) if the runs are too short for the split
+def pseudo_label_ids(bm25_scores, lmrm_scores, split=3):
     lmrm_ranked = sorted(lmrm_scores.items(), key=lambda x: -x[1])
     bm25_ranked = sorted(bm25_scores.items(), key=lambda x: -x[1])
 
-    n = min(len(lmrm_ranked), len(bm25_ranked)) // 3
+    n = min(len(lmrm_ranked), len(bm25_ranked)) // split
     if n < 1:
-        print(f" Skipping R{query_id}: Not enough documents for pseudo-labeling")
-        return
+        return None, None
 
     top_lmrm = set([doc_id for doc_id, _ in lmrm_ranked[:n]])
     bottom_lmrm = set([doc_id for doc_id, _ in lmrm_ranked[-n:]])
     top_bm25 = set([doc_id for doc_id, _ in bm25_ranked[:n]])
     bottom_bm25 = set([doc_id for doc_id, _ in bm25_ranked[-n:]])
 
-    top_docs = top_lmrm & top_bm25
-    bottom_docs = bottom_lmrm & bottom_bm25
+    return top_lmrm & top_bm25, bottom_lmrm & bottom_bm25
+
+# Pseudo-labels documents ranked in the top (bottom) third by both BM25 and LMRM as relevant (non-relevant)
+def select_training_docs(documents, bm25_scores, lmrm_scores, split=3):
+    top_docs, bottom_docs = pseudo_label_ids(bm25_scores, lmrm_scores, split)
+    if top_docs is None:
+        return None, None
 
     training_docs = []
     labels = []
@@ -134,6 +158,106 @@ def run_prrm_for_query(query_id, query_text, dataset_path, stop_words, paths):
             training_docs.append(documents[doc_id])
             labels.append(0)
 
+    return training_docs, labels
+
+# Trains a StreamingPRRMModel on feature batches of batch_size rows taken from the feature store.
+# The docs are reshuffled every epoch since select_training_docs lists all positives before the negatives
+def train_prrm_streaming(query_terms, training_docs, labels, bm25_scores, lmrm_scores, store, batch_size,
+                         positional_index=None):
+    doc_ids = np.array([doc.doc_id for doc in training_docs])
+    y = np.asarray(labels)
+
+    def batches(epoch):
+        order = np.random.RandomState(42 + epoch).permutation(len(doc_ids))
+        X_batches = store.iter_features(query_terms, doc_ids[order].tolist(), bm25_scores, lmrm_scores, batch_size,
+                                        positional_index)
+        for start, X in zip(range(0, len(order), batch_size), X_batches):
+            yield X, y[order[start:start + batch_size]]
+
+    model = StreamingPRRMModel()
+    model.train_batches(batches)
+    return model
+
+# Returns a PRRM model for the pseudo-labelled docs. With a model_dir the model is saved under model_name
+# and reused while its training inputs are unchanged; frozen uses the last saved model even if they changed.
+# batch_size switches to out-of-core training (train_prrm_streaming), which is not cached.
+# A positional_index adds its phrase and proximity features to the cosine, BM25 and LMRM ones, and its
+# models are saved as <model_name>_prox so each feature layout keeps (and freezes) its own model
+def train_prrm(query_terms, training_docs, labels, bm25_scores, lmrm_scores, store,
+               model_dir=None, model_name="PRRM", frozen=False, batch_size=None, positional_index=None):
+    if positional_index is not None:
+        model_name += "_prox"
+    if frozen:
+        model = load_latest_model(model_dir, model_name)
+        if model is not None:
+            print(f" Scoring with saved model {model_name} (frozen)")
+            return model
+    if batch_size:
+        return train_prrm_streaming(query_terms, training_docs, labels, bm25_scores, lmrm_scores, store, batch_size,
+                                    positional_index)
+    X_train = store.features(query_terms, [doc.doc_id for doc in training_docs],
+                             bm25_scores=bm25_scores, lmrm_scores=lmrm_scores, positional_index=positional_index)
+    model, reused = get_trained_model(X_train, labels, model_dir, model_name)
+    if reused:
+        print(f" Reused saved model {model_name}, inputs unchanged")
+    return model
+
+# Trains PRRM on the pseudo-labelled docs and returns all documents as (docid, score), best first.
+# Features are sliced from the dataset's feature store (see feature_store.get_feature_store).
+# With batch_size the dense feature rows are built, trained on and scored batch_size documents at a time;
+# the parsed documents, the store's sparse TF-IDF matrix and one score per document are still held whole
+def prrm_rank(query_terms, documents, training_docs, labels, bm25_scores, lmrm_scores, store,
+              model_dir=None, model_name="PRRM", frozen=False, batch_size=None, positional_index=None):
+    model = train_prrm(query_terms, training_docs, labels, bm25_scores, lmrm_scores, store,
+                       model_dir, model_name, frozen, batch_size, positional_index)
+
+    all_doc_ids = list(documents.keys())
+    if batch_size:
+        scores = np.empty(len(all_doc_ids))
+        X_batches = store.iter_features(query_terms, all_doc_ids, bm25_scores, lmrm_scores, batch_size,
+                                        positional_index)
+        for start, X in zip(range(0, len(all_doc_ids), batch_size), X_batches):
+            scores[start:start + len(X)] = model.predict(X)
+    else:
+        X_all = store.features(query_terms, all_doc_ids,
+                               bm25_scores=bm25_scores, lmrm_scores=lmrm_scores, positional_index=positional_index)
+        scores = model.predict(X_all)
+    return sorted(zip(all_doc_ids, scores), key=lambda x: -x[1])
+
+# Runs PRRM for a single query and dataset. Returns the ranking as (docid, score), best first
+# frozen scores with the last saved model of the query instead of retraining, batch_size trains
+# and scores out-of-core in feature batches of that many docs (see train_prrm), and proximity
+# adds phrase and term proximity features from a positional index of the dataset.
+# A sink (evaluation.EvaluationSink) evaluates the ranking as soon as it is written, and documents
+# ({docid: Doc} already parsed from dataset_path, e.g. by route_jobs) saves parsing the dataset again.
+# Returns None when the query is skipped; training and scoring errors are raised (see run_query_job)
+def run_prrm_for_query(query_id, query_text, dataset_path, stop_words, paths, bm25_runs=None, lmrm_runs=None,
+                       frozen=False, batch_size=None, proximity=False, sink=None, documents=None):
+    print(f"\nRunning PRRM for R{query_id}")
+    # Parse documents
+    if documents is None:
+        documents = parse_docs(dataset_path, stop_words, positions=proximity)
+    if not documents:
+        print(f" No documents found for R{query_id}")
+        return
+
+    query_terms = parse_query(query_text, stop_words)
+    print(f" Parsed {len(documents)} documents and query terms")
+
+    # Load scores from both models
+    bm25_scores, lmrm_scores = get_run_scores(query_id, paths, bm25_runs, lmrm_runs)
+
+    print(f" Loaded {len(lmrm_scores)} LMRM scores and {len(bm25_scores)} BM25 scores")
+
+    if not lmrm_scores or not bm25_scores:
+        print(f" Skipping R{query_id}: Missing ranking files")
+        return
+
+    training_docs, labels = select_training_docs(documents, bm25_scores, lmrm_scores)
+    if training_docs is None:
+        print(f" Skipping R{query_id}: Not enough documents for pseudo-labeling")
+        return
+
     # if len(training_docs) < 5:
     #     print(f" Skipping R{query_id}: Not enough training data after intersection")
     #     return
@@ -141,41 +265,386 @@ def run_prrm_for_query(query_id, query_text, dataset_path, stop_words, paths):
     print(f" Training docs: {len(training_docs)} | Pos: {labels.count(1)} | Neg: {labels.count(0)}")
 
     # Train and rank
+    store = get_feature_store(documents, dataset_path, stop_words, paths.get('feature_cache_dir'))
+    positional_index = build_positional_index(documents) if proximity else None
+    scored_docs = prrm_rank(query_terms, documents, training_docs, labels, bm25_scores, lmrm_scores, store,
+                            paths.get('model_cache_dir'), f"PRRM_R{query_id}", frozen, batch_size,
+                            positional_index)
+
+    output_path = os.path.join(paths['prrm_output_dir'], f"PRRM_R{query_id}Ranking.dat")
+    write_ranking(output_path, scored_docs)
+    if sink is not None:
+        sink.add(query_id, scored_docs)
+
+    print(f" Finished R{query_id}, Output: {output_path}")
+    return scored_docs
+
+# Writes a ranking file in the docid score format
+def write_ranking(output_path, scored_docs):
+    with open(output_path, 'w') as f:
+        for doc_id, score in scored_docs:
+            f.write(f"{doc_id} {score}\n")
+
+# Runs PRRM as the second stage of a cascade: BM25 (or LMRM) retrieves the top n_candidates
+# documents from an inverted index and only those are featurized and rescored by PRRM, so the
+# ranking holds the n_candidates reranked documents. With proximity the index also keeps positions,
+# which are decoded for the candidates only.
+# Returns the per-stage latencies in seconds, or None if the query was skipped; errors are raised.
+# 'parse' and 'feature_store' build the dataset's index and TF-IDF store (once per dataset when the
+# store is cached), so they are reported on their own and left out of the query's 'total'
+def run_cascade_for_query(query_id, query_text, dataset_path, stop_words, paths,
+                          first_stage="bm25", n_candidates=N_CANDIDATES, bm25_runs=None, lmrm_runs=None,
+                          proximity=False, sink=None):
+    print(f"\nRunning PRRM cascade ({first_stage} top {n_candidates}) for R{query_id}")
+    timings = {}
+
+    start = time.perf_counter()
+    documents = parse_docs(dataset_path, stop_words, positions=proximity)
+    if not documents:
+        print(f" No documents found for R{query_id}")
+        return None
+    query_terms = parse_query(query_text, stop_words)
+    index = build_positional_index(documents) if proximity else build_index_from_docs(documents)
+    timings['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store = get_feature_store(documents, dataset_path, stop_words, paths.get('feature_cache_dir'))
+    timings['feature_store'] = time.perf_counter() - start
+
+    # Stage 1: cheap top-k retrieval from the index, without scoring or sorting every document
+    start = time.perf_counter()
+    if first_stage == "lmrm":
+        ranked = top_k(index.lmrm(query_terms), n_candidates)
+    else:
+        ranked = index.bm25_top_k(query_terms, n_candidates)
+    candidates = [doc_id for doc_id, _ in ranked]
+    timings['first_stage'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bm25_scores, lmrm_scores = get_run_scores(query_id, paths, bm25_runs, lmrm_runs)
+    if not lmrm_scores or not bm25_scores:
+        print(f" Skipping R{query_id}: Missing ranking files")
+        return None
+
+    training_docs, labels = select_training_docs(documents, bm25_scores, lmrm_scores)
+    if training_docs is None:
+        print(f" Skipping R{query_id}: Not enough documents for pseudo-labeling")
+        return None
+    timings['labels'] = time.perf_counter() - start
+
+    # Stage 2: train on the pseudo-labels, then featurize and rescore the candidates only
+    start = time.perf_counter()
+    positional_index = index if proximity else None
+    model = train_prrm(query_terms, training_docs, labels, bm25_scores, lmrm_scores, store,
+                       paths.get('model_cache_dir'), f"PRRM_R{query_id}", positional_index=positional_index)
+    timings['train'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    X_cand = store.features(query_terms, candidates,
+                            bm25_scores=bm25_scores, lmrm_scores=lmrm_scores, positional_index=positional_index)
+    scores = model.predict(X_cand)
+    reranked = sorted(zip(candidates, scores), key=lambda x: -x[1])
+    timings['rerank'] = time.perf_counter() - start
+
+    output_path = os.path.join(paths['prrm_output_dir'], f"PRRM_R{query_id}Ranking.dat")
+    write_ranking(output_path, reranked)
+    if sink is not None:
+        sink.add(query_id, reranked)
+
+    timings['total'] = sum(secs for stage, secs in timings.items() if stage not in BUILD_STAGES)
+    print(f" Candidates: {len(candidates)}/{len(documents)} | "
+          + " | ".join(f"{stage}: {secs * 1000:.1f} ms" for stage, secs in timings.items()))
+    return timings
+
+# Saves the per-query cascade latencies with an average row
+def save_cascade_latency(latencies, output_path):
+    if not latencies:
+        return
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    stages = list(next(iter(latencies.values())).keys())
+    with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Query'] + [f"{stage}_ms" for stage in stages])
+        for query_id, timings in latencies.items():
+            writer.writerow([f"R{query_id}"] + [f"{timings[stage] * 1000:.3f}" for stage in stages])
+        writer.writerow(['Average'] + [f"{sum(t[stage] for t in latencies.values()) / len(latencies) * 1000:.3f}"
+                                       for stage in stages])
+    print(f"Cascade latencies saved to: {output_path}")
+
+# Limits each pool worker to one BLAS/OpenMP thread and, where the platform allows, max_memory_mb of
+# address space, then keeps the shared state so it is pickled once per worker rather than once per query
+def _init_prrm_worker(stop_words, paths, bm25_runs, lmrm_runs, max_memory_mb, qrels=None):
+    global _worker_state
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    if max_memory_mb:
+        try:
+            import resource
+            limit = int(max_memory_mb) * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            print(f"Warning: could not limit worker memory: {e}")
+    _worker_state = (stop_words, paths, bm25_runs, lmrm_runs, qrels)
+
+# Runs one query with run_cascade_for_query (cascade_kwargs) or run_prrm_for_query (prrm_kwargs) and
+# returns (status, result). status is "ok", "skipped" when the query returned early (no documents,
+# missing runs or no training docs) or the error, so a failing query is reported instead of stopping
+# the batch. result is the cascade latencies or the number of ranked documents. documents are the
+# query's parsed documents when the caller already has them
+def run_query_job(query_id, query_text, dataset_path, stop_words, paths, bm25_runs=None, lmrm_runs=None,
+                  sink=None, cascade_kwargs=None, prrm_kwargs=None, documents=None):
     try:
-        X_train = extract_features(query_terms, {doc.doc_id: doc for doc in training_docs}, 
-                                 bm25_scores=bm25_scores, lmrm_scores=lmrm_scores)
-        model = PRRMModel()
-        model.train(X_train, labels)
+        if cascade_kwargs is not None:
+            result = run_cascade_for_query(query_id, query_text, dataset_path, stop_words, paths,
+                                           bm25_runs=bm25_runs, lmrm_runs=lmrm_runs, sink=sink, **cascade_kwargs)
+        else:
+            # The ranking is already written to disk, only its length is kept
+            scored_docs = run_prrm_for_query(query_id, query_text, dataset_path, stop_words, paths,
+                                             bm25_runs=bm25_runs, lmrm_runs=lmrm_runs, sink=sink,
+                                             documents=documents, **(prrm_kwargs or {}))
+            result = len(scored_docs) if scored_docs else None
+    except (Exception, MemoryError) as e:
+        status = "".join(traceback.format_exception_only(type(e), e)).strip()
+        print(f" Error processing R{query_id}: {status}")
+        return status, None
+    return "ok" if result else "skipped", result
 
-        X_all = extract_features(query_terms, documents, 
-                               bm25_scores=bm25_scores, lmrm_scores=lmrm_scores)
-        scores = model.predict(X_all)
-        all_doc_ids = list(documents.keys())
-        scored_docs = sorted(zip(all_doc_ids, scores), key=lambda x: -x[1])
+# Runs one query in a pool worker. Returns (query_id, status, result, metrics) as run_query_job does.
+# With judgments in the worker state the ranking is evaluated in the worker and only its metric row is sent back
+def _prrm_job(query_id, query_text, dataset_path, cascade_kwargs, prrm_kwargs, documents=None):
+    stop_words, paths, bm25_runs, lmrm_runs, qrels = _worker_state
+    sink = EvaluationSink(qrels, verbose=False) if qrels is not None else None
+    status, result = run_query_job(query_id, query_text, dataset_path, stop_words, paths, bm25_runs, lmrm_runs,
+                                   sink, cascade_kwargs, prrm_kwargs, documents)
+    metrics = sink.table.get(query_id) if sink is not None and status == "ok" else None
+    return query_id, status, result, metrics
+
+# Runs jobs on a fresh pool of workers processes, recording each finished query's (status, result) in outcomes
+# and its metrics in sink. Returns the (job, error) pairs left unfinished because a worker died and broke the pool
+def _run_pool(jobs, workers, initargs, cascade_kwargs, prrm_kwargs, documents, outcomes, sink=None):
+    unfinished = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_prrm_worker, initargs=initargs) as pool:
+        futures = {}
+        for job in jobs:
+            query_id, query_text, dataset_path = job
+            try:
+                futures[pool.submit(_prrm_job, query_id, query_text, dataset_path, cascade_kwargs, prrm_kwargs,
+                                    documents.get(query_id))] = job
+            except BrokenProcessPool as e:
+                unfinished.append((job, e))
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                _, status, result, metrics = future.result()
+            except BrokenProcessPool as e:
+                unfinished.append((job, e))
+                continue
+            if sink is not None and metrics is not None:
+                sink.record(job[0], metrics)
+            outcomes[job[0]] = (status, result)
+    return unfinished
+
+# Runs PRRM for every (query_id, query_text, dataset_path) job across a process pool.
+# Queries are independent, so each worker trains and scores whole topics with a single BLAS thread.
+# cascade_kwargs (first_stage, n_candidates) switches the jobs to run_cascade_for_query,
+# prrm_kwargs (frozen, batch_size, proximity) are passed on to run_prrm_for_query.
+# Each finished query's metrics are recorded in sink (an evaluation.EvaluationSink) as it completes, and
+# documents ({query_id: {docid: Doc}}) are sent with their query's job instead of being parsed again.
+# A worker that dies (e.g. killed at the memory limit) breaks the pool: the queries it left unfinished are
+# resubmitted to a fresh pool, and those it breaks again are run one per pool, so only the query that
+# kills its worker is reported failed. Returns {query_id: (status, result)}
+def run_prrm_parallel(jobs, stop_words, paths, workers=None, max_memory_mb=None,
+                      bm25_runs=None, lmrm_runs=None, cascade_kwargs=None, prrm_kwargs=None, sink=None,
+                      documents=None):
+    documents = documents or {}
+    workers = min(workers or os.cpu_count() or 1, len(jobs)) or 1
+    initargs = (stop_words, paths, bm25_runs, lmrm_runs, max_memory_mb, sink.qrels if sink is not None else None)
+    outcomes = {}
 
-        output_path = os.path.join(paths['prrm_output_dir'], f"PRRM_R{query_id}Ranking.dat")
-        with open(output_path, 'w') as f:
-            for doc_id, score in scored_docs:
-                f.write(f"{doc_id} {score}\n")
+    unfinished = _run_pool(jobs, workers, initargs, cascade_kwargs, prrm_kwargs, documents, outcomes, sink)
+    if unfinished:
+        print(f"A PRRM worker died, resubmitting {len(unfinished)} unfinished queries to a new pool")
+        retry = [job for job, _ in unfinished]
+        unfinished = _run_pool(retry, min(workers, len(retry)), initargs, cascade_kwargs, prrm_kwargs, documents,
+                               outcomes, sink)
+    if unfinished:
+        print(f"A PRRM worker died again, running the {len(unfinished)} unfinished queries one at a time")
+    for job, _ in unfinished:
+        for _, error in _run_pool([job], 1, initargs, cascade_kwargs, prrm_kwargs, documents, outcomes, sink):
+            outcomes[job[0]] = (f"worker died: {error}", None)
+    return {query_id: outcomes[query_id] for query_id, _, _ in jobs}
 
-        print(f" Finished R{query_id}, Output: {output_path}")
-    except Exception as e:
-        print(f" Error processing R{query_id}: {e}")
+# The (query_id, query_text, dataset_path) jobs of the queries whose dataset folder exists
+def dataset_jobs(queries, paths):
+    jobs = []
+    for query_id, query_text in queries.items():
+        dataset_path = os.path.join(paths['dataset_base_dir'], f"Dataset{query_id}")
+        if not os.path.exists(dataset_path):
+            print(f"Warning: Dataset path not found: {dataset_path}")
+        else:
+            jobs.append((query_id, query_text, dataset_path))
+    return jobs
+
+# The parsed documents of every (query_id, query_text, dataset_path) job, parsed once for the router,
+# the feature store and PRRM (with word positions when positions is set), across workers processes.
+# Returns {query_id: {docid: Doc}}
+def parse_datasets(jobs, stop_words, positions=False, workers=1):
+    paths = [job[2] for job in jobs]
+    if workers != 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(jobs))) as pool:
+            parsed = list(pool.map(parse_docs, paths, [stop_words] * len(jobs), [positions] * len(jobs)))
+    else:
+        parsed = [parse_docs(path, stop_words, positions) for path in paths]
+    return {job[0]: documents for job, documents in zip(jobs, parsed)}
+
+# The pre-retrieval predictors (see qpp) of one (query_id, query_text, dataset_path) job, from an index of
+# its dataset, and the parsed documents they were computed from, as (predictors, documents).
+# documents are parsed here unless the caller already has them
+def job_predictors(job, stop_words, positions=False, documents=None):
+    query_id, query_text, dataset_path = job
+    if documents is None:
+        documents = parse_docs(dataset_path, stop_words, positions)
+    return query_predictors(build_index_from_docs(documents), parse_query(query_text, stop_words)), documents
+
+# Routes each job with its predictors, computed across workers processes (0 = cpu count): about
+# cheap_fraction of the queries stop at cheap_model ("BM25" or "LMRM") and the others go to PRRM.
+# The parsed documents of the queries routed to PRRM are kept (with word positions when positions is set)
+# so that rank_queries does not parse those datasets again; documents (see parse_datasets) are used
+# instead of parsing when the caller already has them.
+# Returns ({query_id: route}, {query_id: predictors}, the qpp.QPPRouter, {query_id: {docid: Doc}})
+def route_jobs(jobs, stop_words, predictor="scq_avg", cheap_fraction=0.5, cheap_model="BM25", workers=1,
+               positions=False, documents=None):
+    if documents is not None:
+        parsed = [job_predictors(job, stop_words, positions, documents[job[0]]) for job in jobs]
+    elif workers != 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(jobs))) as pool:
+            parsed = list(pool.map(job_predictors, jobs, [stop_words] * len(jobs), [positions] * len(jobs)))
+    else:
+        parsed = [job_predictors(job, stop_words, positions) for job in jobs]
+    predictors = {job[0]: p for job, (p, _) in zip(jobs, parsed)}
+    router = QPPRouter.from_quantile(list(predictors.values()), predictor, cheap_fraction, cheap_model)
+    print(f"Routing on {router.predictor} >= {router.threshold:.4f} -> {router.cheap_model}")
+    routes = {query_id: router.route(p) for query_id, p in predictors.items()}
+    documents = {job[0]: docs for job, (_, docs) in zip(jobs, parsed) if routes[job[0]] == "PRRM"}
+    return routes, predictors, router, documents
+
+# Writes the BM25 or LMRM ranking of a query routed away from PRRM as its PRRM ranking file.
+# Returns (status, number of ranked documents) as run_query_job does
+def rank_cheap(query_id, model, paths, bm25_runs=None, lmrm_runs=None, sink=None):
+    bm25_scores, lmrm_scores = get_run_scores(query_id, paths, bm25_runs, lmrm_runs)
+    scores = lmrm_scores if model == "LMRM" else bm25_scores
+    if not scores:
+        print(f" Skipping R{query_id}: Missing {model} ranking")
+        return "skipped", None
+    scored_docs = sorted(scores.items(), key=lambda x: -x[1])
+    write_ranking(os.path.join(paths['prrm_output_dir'], f"PRRM_R{query_id}Ranking.dat"), scored_docs)
+    if sink is not None:
+        sink.add(query_id, scored_docs)
+    return "ok", len(scored_docs)
+
+# Runs PRRM for every query, serially or across workers processes, evaluating each ranking into sink as it
+# finishes, then bundles the ranking files into PRRM.run. prrm_kwargs (frozen, batch_size, proximity) are
+# passed on to run_prrm_for_query. With routes ({query_id: route}, see route_jobs) PRRM only runs for the
+# queries routed to "PRRM" and the others keep their BM25 or LMRM ranking; documents are the parsed datasets
+# route_jobs kept for them.
+# Returns (run, outcomes): the run {RXXX: {docid: score}} as read back from the ranking files and
+# {query_id: (status, result)} as run_query_job reports them
+def rank_queries(queries, stop_words, paths, sink=None, bm25_runs=None, lmrm_runs=None, workers=1, routes=None,
+                 documents=None, max_memory_mb=None, **prrm_kwargs):
+    os.makedirs(paths['prrm_output_dir'], exist_ok=True)
+    jobs = dataset_jobs(queries, paths)
+
+    outcomes = {}
+    if routes is not None:
+        for query_id, _, _ in jobs:
+            if routes.get(query_id, "PRRM") != "PRRM":
+                outcomes[query_id] = rank_cheap(query_id, routes[query_id], paths, bm25_runs, lmrm_runs, sink)
+        jobs = [job for job in jobs if job[0] not in outcomes]
+        print(f"Routed {len(outcomes)} queries to BM25/LMRM, running PRRM for {len(jobs)}")
+
+    if workers != 1 and jobs:
+        outcomes.update(run_prrm_parallel(jobs, stop_words, paths, workers or None, max_memory_mb,
+                                          bm25_runs, lmrm_runs, None, prrm_kwargs, sink, documents))
+    else:
+        for query_id, query_text, dataset_path in jobs:
+            outcomes[query_id] = run_query_job(query_id, query_text, dataset_path, stop_words, paths,
+                                               bm25_runs, lmrm_runs, sink, None, prrm_kwargs,
+                                               (documents or {}).get(query_id))
+    print_parallel_summary(outcomes)
+
+    prrm_run = load_run_dir(paths['prrm_output_dir'], "PRRM")
+    if prrm_run:
+        write_run(os.path.join(paths['prrm_output_dir'], "PRRM" + RUN_SUFFIX), prrm_run, "PRRM")
+    return {f"R{query_id}": scores for query_id, scores in prrm_run.items()}, outcomes
+
+# The queries of outcomes ({query_id: (status, result)}) that failed, as {query_id: error}
+def failed_queries(outcomes):
+    return {q: s for q, (s, _) in outcomes.items() if s not in ("ok", "skipped")}
+
+# Prints the queries that were skipped or failed in a serial or parallel run
+def print_parallel_summary(outcomes):
+    failed = failed_queries(outcomes)
+    skipped = [q for q, (s, _) in outcomes.items() if s == "skipped"]
+    n_ok = len(outcomes) - len(failed) - len(skipped)
+    print(f"\nPRRM: {n_ok} ok, {len(skipped)} skipped, {len(failed)} failed")
+    if skipped:
+        print("Skipped: " + ", ".join(f"R{q}" for q in skipped))
+    for query_id, status in failed.items():
+        print(f"  R{query_id} failed: {status}")
 
 # Entry point
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run PRRM over all queries")
+    parser.add_argument("--cascade", type=int, metavar="N", default=None,
+                        help="rerank only the top N first-stage candidates")
+    parser.add_argument("--first-stage", choices=["bm25", "lmrm"], default="bm25",
+                        help="first-stage model used in cascade mode")
+    parser.add_argument("--no-feature-cache", action="store_true",
+                        help="keep the TF-IDF feature store in memory only, without saving .npz files")
+    parser.add_argument("--no-model-cache", action="store_true",
+                        help="always retrain PRRM instead of reusing models saved for unchanged inputs")
+    parser.add_argument("--frozen-models", action="store_true",
+                        help="score with each query's last saved model, without retraining on changed datasets")
+    parser.add_argument("--streaming", type=int, metavar="BATCH", default=None,
+                        help="train and score with SGD on feature batches of BATCH documents (not with --cascade)")
+    parser.add_argument("--proximity", action="store_true",
+                        help="add phrase and term proximity features from a positional index")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run BM25 and LMRM first and hand their scores to PRRM in memory")
+    parser.add_argument("--export-rankings", action="store_true",
+                        help="with --in-process, also write the BM25 and LMRM ranking files")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="run queries across this many worker processes (0 = cpu count, 1 = serial)")
+    parser.add_argument("--max-memory-mb", type=int, default=None,
+                        help="address space limit per worker process in parallel mode (not on Windows)")
+    parser.add_argument("--route", choices=PREDICTORS, default=None, metavar="PREDICTOR",
+                        help="run PRRM only for the queries this pre-retrieval predictor routes to it")
+    parser.add_argument("--cheap-fraction", type=float, default=0.5,
+                        help="with --route, fraction of queries that keep their cheap model ranking")
+    parser.add_argument("--cheap-model", choices=["BM25", "LMRM"], default="BM25",
+                        help="with --route, the model ranking the queries that skip PRRM")
+    args = parser.parse_args()
+    if args.route and args.cascade is not None:
+        parser.error("--route cannot be combined with --cascade")
+    if args.streaming and args.cascade is not None:
+        parser.error("--streaming cannot be combined with --cascade, which only featurizes its candidates")
+
     print("Starting PRRM processing...")
     
     paths = get_paths()
+    if args.no_feature_cache:
+        paths['feature_cache_dir'] = None
+    if args.no_model_cache:
+        paths['model_cache_dir'] = None
     
     # Check required paths exist
     required_paths = [
         paths['queries_file_path'],
         paths['stopwords_file_path'],
-        paths['dataset_base_dir'],
-        paths['lmrm_rankings_dir'],
-        paths['bm25_rankings_dir']
+        paths['dataset_base_dir']
     ]
+    if not args.in_process:
+        required_paths += [paths['lmrm_rankings_dir'], paths['bm25_rankings_dir']]
     
     missing_paths = [path for path in required_paths if not os.path.exists(path)]
     if missing_paths:
@@ -193,21 +662,46 @@ if __name__ == "__main__":
     stop_words = load_stop_words(paths['stopwords_file_path'])
     
     print(f"Loaded {len(queries)} queries and {len(stop_words)} stop words")
+
+    bm25_runs = lmrm_runs = None
+    if args.in_process:
+        bm25_runs, lmrm_runs = run_first_stage_in_process(paths, write_files=args.export_rankings)
+        print(f"Received BM25 scores for {len(bm25_runs)} and LMRM scores for {len(lmrm_runs)} queries in memory")
     
+    # Every ranking is evaluated as soon as its query finishes; rows and running averages are
+    # emitted as the run goes, and the full table is written once at the end
+    sink = EvaluationSink(Qrels.load(paths['eval_benchmark_dir']), output_path=paths['prrm_eval_results_path'],
+                          model_name="PRRM")
+
     # Process each query
-    for query_id, query_text in queries.items():
-        dataset_path = os.path.join(paths['dataset_base_dir'], f"Dataset{query_id}")
-        if os.path.exists(dataset_path):
-            run_prrm_for_query(query_id, query_text, dataset_path, stop_words, paths)
+    jobs = dataset_jobs(queries, paths)
+    if args.cascade is not None:
+        cascade_kwargs = {'first_stage': args.first_stage, 'n_candidates': args.cascade, 'proximity': args.proximity}
+        if args.workers != 1:
+            outcomes = run_prrm_parallel(jobs, stop_words, paths, args.workers or None, args.max_memory_mb,
+                                         bm25_runs, lmrm_runs, cascade_kwargs, None, sink)
         else:
-            print(f"Warning: Dataset path not found: {dataset_path}")
-    
-    # Run evaluation after all ranking files are generated
-    print("\nAll PRRM ranking files created. Starting evaluation...")
-    try:
-        subprocess.run(["python", "evaluation_prrm.py"], check=True)
-        print("PRRM evaluation completed")
-    except subprocess.CalledProcessError as e:
-        print(f"PRRM evaluation failed: {e}")
-    except FileNotFoundError:
-        print("Could not run evaluation_prrm.py")
\ No newline at end of file
+            outcomes = {query_id: run_query_job(query_id, query_text, dataset_path, stop_words, paths,
+                                                bm25_runs, lmrm_runs, sink, cascade_kwargs)
+                        for query_id, query_text, dataset_path in jobs}
+        print_parallel_summary(outcomes)
+        save_cascade_latency({q: timings for q, (status, timings) in outcomes.items() if status == "ok"},
+                             paths['cascade_latency_path'])
+
+        # Bundle the ranking files into one binary run for the readers
+        prrm_run = load_run_dir(paths['prrm_output_dir'], "PRRM")
+        if prrm_run:
+            write_run(os.path.join(paths['prrm_output_dir'], "PRRM" + RUN_SUFFIX), prrm_run, "PRRM")
+    else:
+        routes = documents = None
+        if args.route:
+            routes, _, _, documents = route_jobs(jobs, stop_words, args.route, args.cheap_fraction,
+                                                 args.cheap_model, args.workers, args.proximity)
+        rank_queries(queries, stop_words, paths, sink, bm25_runs, lmrm_runs, args.workers, routes, documents,
+                     args.max_memory_mb, frozen=args.frozen_models, batch_size=args.streaming,
+                     proximity=args.proximity)
+
+    # The rankings were evaluated as they were produced, no second pass over the files
+    sink.close()
+    print_results(sink.sorted_table(), "PRRM")
+    print(f"PRRM evaluation results saved to: {paths['prrm_eval_results_path']}")
\ No newline at end of file
@@ -0,0 +1,127 @@
+import os
+import time
+import argparse
+
+from data_processing_prrm import load_stop_words
+from evaluation import METRICS, EvaluationSink, Qrels, write_rows
+from feature_store import clear_feature_stores
+from qpp import PREDICTORS
+from run_prrm import get_paths, extract_queries, dataset_jobs, route_jobs, rank_queries
+
+
+def route_queries(queries, stop_words, paths, predictor="scq_avg", cheap_fraction=0.5, cheap_model="BM25",
+                  bm25_runs=None, lmrm_runs=None, qrels=None, baseline=False, workers=1):
+    """
+    Routes every query with its pre-retrieval predictors and runs PRRM (run_prrm.rank_queries) only
+    for the queries sent to it, on the documents parsed for the predictors; the others keep their
+    cheap model ranking. With baseline, PRRM is then
+    run again for every query as the always-PRRM run the routed one is compared with.
+    Both passes retrain their models and refit their feature stores, so their times are comparable.
+    qrels (evaluation.Qrels) defaults to the judgments in paths['eval_benchmark_dir'].
+
+    Returns:
+        (list of per-query result dicts, dict {pass: wall-clock seconds})
+    """
+    if qrels is None:
+        qrels = Qrels.load(paths['eval_benchmark_dir'])
+    paths = dict(paths, model_cache_dir=None, feature_cache_dir=None)
+    routed_paths = dict(paths, prrm_output_dir=os.path.join(os.path.dirname(paths['prrm_output_dir']),
+                                                            "RankingOutputs_PRRM_Routed"))
+    timings = {}
+
+    clear_feature_stores()
+    start = time.perf_counter()
+    routes, predictors, router, documents = route_jobs(dataset_jobs(queries, paths), stop_words, predictor,
+                                                       cheap_fraction, cheap_model, workers)
+    timings['routing'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    routed = EvaluationSink(qrels, model_name="Routed", verbose=False)
+    rank_queries(queries, stop_words, routed_paths, routed, bm25_runs, lmrm_runs, workers, routes, documents)
+    timings['routed'] = time.perf_counter() - start
+
+    always = None
+    if baseline:
+        clear_feature_stores()
+        start = time.perf_counter()
+        always = EvaluationSink(qrels, model_name="PRRM", verbose=False)
+        rank_queries(queries, stop_words, paths, always, bm25_runs, lmrm_runs, workers)
+        timings['always_prrm'] = time.perf_counter() - start
+
+    results = []
+    for query_id, route in routes.items():
+        if query_id not in routed.table:
+            continue
+        result = {'query_id': f"R{query_id}", 'route': route}
+        result.update(predictors[query_id])
+        for run_name, sink in (("routed", routed), ("prrm", always)):
+            if sink is not None and query_id in sink.table:
+                for metric in METRICS:
+                    result[f"{run_name}_{metric}"] = sink.table[query_id][metric]
+        results.append(result)
+        print(f" R{query_id}: {router.predictor}={predictors[query_id][router.predictor]:.4f} -> {route}")
+    return results, timings
+
+
+def print_router_summary(results, timings):
+    """Prints the measured time of the routed run (and the saving against always-PRRM) and the metric change."""
+    if not results:
+        print("No queries were routed.")
+        return
+    n = len(results)
+    n_prrm = sum(1 for r in results if r['route'] == "PRRM")
+    routed_total = timings['routing'] + timings['routed']
+
+    print(f"\n--- QPP Router Summary ({n} queries) ---")
+    print(f"Queries sent to PRRM: {n_prrm}/{n}")
+    line = f"Routed run: {routed_total:.2f}s (predictors {timings['routing']:.2f}s)"
+    if 'always_prrm' in timings:
+        saved = (1 - routed_total / timings['always_prrm']) * 100 if timings['always_prrm'] else 0.0
+        line += f" | always-PRRM: {timings['always_prrm']:.2f}s | saved: {saved:.1f}%"
+    print(line)
+
+    compared = [r for r in results if f"prrm_{METRICS[0]}" in r]
+    if not compared:
+        print(f"{'Metric':<8} | {'Routed':>8}")
+        print("-" * 19)
+        for metric in METRICS:
+            print(f"{metric:<8} | {sum(r[f'routed_{metric}'] for r in results) / n:>8.4f}")
+        return
+    print(f"{'Metric':<8} | {'Always-PRRM':>11} | {'Routed':>8} | {'Delta':>8}")
+    print("-" * 44)
+    for metric in METRICS:
+        prrm_avg = sum(r[f"prrm_{metric}"] for r in compared) / len(compared)
+        routed_avg = sum(r[f"routed_{metric}"] for r in compared) / len(compared)
+        print(f"{metric:<8} | {prrm_avg:>11.4f} | {routed_avg:>8.4f} | {routed_avg - prrm_avg:>+8.4f}")
+
+
+def save_router_results(results, output_path):
+    """Saves the per-query predictors, routes, timings and metrics to csv."""
+    if not results:
+        return
+    write_rows(results, output_path)
+    print(f"\nRouter results saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Route each query to BM25/LMRM or PRRM using pre-retrieval QPP")
+    parser.add_argument("--predictor", choices=PREDICTORS, default="scq_avg")
+    parser.add_argument("--cheap-fraction", type=float, default=0.5,
+                        help="fraction of queries that stop at the cheap model")
+    parser.add_argument("--cheap-model", choices=["BM25", "LMRM"], default="BM25")
+    parser.add_argument("--baseline", action="store_true",
+                        help="also run PRRM for every query and report the time saved and the metric change")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="PRRM worker processes (0 = cpu count, 1 = serial)")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    parent_dir = os.path.dirname(paths['data_dir'])
+
+    queries = extract_queries(paths['queries_file_path'])
+    stop_words = load_stop_words(paths['stopwords_file_path'])
+
+    results, timings = route_queries(queries, stop_words, paths, args.predictor, args.cheap_fraction,
+                                     args.cheap_model, baseline=args.baseline, workers=args.workers)
+    print_router_summary(results, timings)
+    save_router_results(results, os.path.join(parent_dir, "outputs", "PRRM", "QPP_Router_Results.csv"))
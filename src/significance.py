@@ -0,0 +1,225 @@
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from evaluation import METRICS, write_rows
+
+N_RESAMPLES = 100000
+CHUNK_SIZE = 10000
+CORRECTIONS = ("holm", "bonferroni", "fdr_bh", "none")
+
+# Per-worker state, populated once by _init_worker so the differences are only pickled per process
+_worker_diffs = None
+
+
+def paired_differences(matrices, metrics=METRICS, pairs=None):
+    """
+    per-topic differences of every system pair on every metric, over the topics all systems share
+
+    Args:
+        matrices (dict): {system name: run_matrix.RunMatrix}
+        pairs (list): (system1, system2) pairs to compare (default: all pairs in matrices order)
+
+    Returns:
+        (list of (system1, system2, metric) labels, (comparisons, topics) array of system1 - system2, topics)
+
+    """
+    names = list(matrices)
+    pairs = pairs if pairs is not None else list(itertools.combinations(names, 2))
+    topics = [t for t in matrices[names[0]].topics if all(t in m.row_of for m in matrices.values())]
+    labels, rows = [], []
+    for metric in metrics:
+        for a, b in pairs:
+            labels.append((a, b, metric))
+            rows.append(matrices[a].column(metric, topics) - matrices[b].column(metric, topics))
+    return labels, np.array(rows, dtype=np.float64).reshape(len(rows), len(topics)), topics
+
+
+def _chunks(n_resamples, chunk_size, seed):
+    """split n_resamples into chunk sizes, each with its own seed, so results do not depend on the worker count"""
+    sizes = [min(chunk_size, n_resamples - start) for start in range(0, n_resamples, chunk_size)]
+    return list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+
+
+def _permutation_chunk(diffs, size, seed):
+    """number of sign-flip resamples whose |mean difference| reaches the observed one, per comparison"""
+    rng = np.random.default_rng(seed)
+    n = diffs.shape[1]
+    observed = np.abs(diffs.mean(axis=1))
+    signs = rng.integers(0, 2, size=(size, n), dtype=np.int8) * 2 - 1
+    means = np.abs(signs.astype(np.float64) @ diffs.T) / n  # (size, comparisons)
+    return (means >= observed - 1e-12).sum(axis=0)
+
+
+def _bootstrap_chunk(diffs, size, seed):
+    """mean difference of each topic resample, as a (size, comparisons) float32 array"""
+    rng = np.random.default_rng(seed)
+    n = diffs.shape[1]
+    picks = rng.integers(0, n, size=(size, n)) + (np.arange(size) * n)[:, None]
+    counts = np.bincount(picks.ravel(), minlength=size * n).reshape(size, n)
+    return ((counts @ diffs.T) / n).astype(np.float32)
+
+
+def _init_worker(diffs):
+    global _worker_diffs
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    _worker_diffs = diffs
+
+
+def _worker_permutation(args):
+    return _permutation_chunk(_worker_diffs, *args)
+
+
+def _worker_bootstrap(args):
+    return _bootstrap_chunk(_worker_diffs, *args)
+
+
+def _map_chunks(serial_fn, worker_fn, diffs, chunks, workers):
+    if workers == 1 or len(chunks) == 1:
+        return [serial_fn(diffs, size, seed) for size, seed in chunks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(diffs,)) as pool:
+        return list(pool.map(worker_fn, chunks))
+
+
+def randomization_test(diffs, n_resamples=N_RESAMPLES, seed=0, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    two-sided paired randomization (sign-flip permutation) test for every row of diffs at once.
+    sign matrices are generated in chunks of chunk_size resamples, spread across worker processes
+
+    Args:
+        diffs (array): (comparisons, topics) per-topic differences
+        workers (int): worker processes (1 = in this process, None = cpu count)
+
+    Returns:
+        (comparisons,) array of p-values, (count + 1) / (n_resamples + 1)
+
+    """
+    diffs = np.atleast_2d(np.asarray(diffs, dtype=np.float64))
+    counts = _map_chunks(_permutation_chunk, _worker_permutation, diffs,
+                         _chunks(n_resamples, chunk_size, seed), workers)
+    return (np.sum(counts, axis=0) + 1) / (n_resamples + 1)
+
+
+def bootstrap_test(diffs, n_resamples=N_RESAMPLES, alpha=0.05, seed=0, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    paired bootstrap over topics for every row of diffs at once
+
+    Returns:
+        ((comparisons,) lower and upper percentile confidence bounds of the mean difference at level 1 - alpha,
+         (comparisons,) two-sided p-values of the resampled means shifted to the null hypothesis)
+
+    """
+    diffs = np.atleast_2d(np.asarray(diffs, dtype=np.float64))
+    means = np.vstack(_map_chunks(_bootstrap_chunk, _worker_bootstrap, diffs,
+                                  _chunks(n_resamples, chunk_size, seed), workers))
+    observed = diffs.mean(axis=1)
+    low, high = np.percentile(means, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    extreme = (np.abs(means - observed) >= np.abs(observed) - 1e-7).sum(axis=0)
+    return low, high, (extreme + 1) / (n_resamples + 1)
+
+
+def correct_pvalues(p_values, method="holm"):
+    """
+    adjust p-values for multiple comparisons
+
+    Args:
+        method (str): "holm" (step-down), "bonferroni", "fdr_bh" (Benjamini-Hochberg) or "none"
+
+    Returns:
+        array of adjusted p-values, in the input order
+    """
+    p = np.asarray(p_values, dtype=np.float64)
+    m = len(p)
+    if method == "none" or m == 0:
+        return p.copy()
+    if method == "bonferroni":
+        return np.minimum(p * m, 1.0)
+    order = np.argsort(p)
+    adjusted = np.empty(m)
+    if method == "holm":
+        adjusted[order] = np.minimum(np.maximum.accumulate(p[order] * (m - np.arange(m))), 1.0)
+    elif method == "fdr_bh":
+        scaled = p[order] * m / np.arange(1, m + 1)
+        adjusted[order] = np.minimum(np.minimum.accumulate(scaled[::-1])[::-1], 1.0)
+    else:
+        raise ValueError(f"Unknown correction: {method}")
+    return adjusted
+
+
+def compare_all(matrices, metrics=METRICS, n_resamples=N_RESAMPLES, alpha=0.05, correction="holm", seed=0,
+                workers=1):
+    """
+    randomization test and bootstrap interval for every system pair and metric, with the p-values of
+    both corrected over the whole family of comparisons
+
+    Returns:
+        list of result rows (system1, system2, metric, topics, mean_diff, ci_low, ci_high, p values)
+
+    """
+    labels, diffs, topics = paired_differences(matrices, metrics)
+    p_rand = randomization_test(diffs, n_resamples, seed, workers)
+    low, high, p_boot = bootstrap_test(diffs, n_resamples, alpha, seed, workers)
+    p_rand_adj = correct_pvalues(p_rand, correction)
+    p_boot_adj = correct_pvalues(p_boot, correction)
+
+    rows = []
+    for i, (a, b, metric) in enumerate(labels):
+        rows.append({'system1': a, 'system2': b, 'metric': metric, 'topics': len(topics),
+                     'mean_diff': float(diffs[i].mean()), 'ci_low': float(low[i]), 'ci_high': float(high[i]),
+                     'p_randomization': float(p_rand[i]), 'p_randomization_adj': float(p_rand_adj[i]),
+                     'p_bootstrap': float(p_boot[i]), 'p_bootstrap_adj': float(p_boot_adj[i]),
+                     'significant': bool(p_rand_adj[i] < alpha)})
+    return rows
+
+
+def write_results(rows, output_path):
+    """write the comparison rows as csv"""
+    write_rows(rows, output_path)
+
+
+if __name__ == '__main__':
+    import time
+    import argparse
+    from run_matrix import get_run_matrix
+    from statistical_analysis import get_paths
+
+    parser = argparse.ArgumentParser(description="Randomization and bootstrap tests between ranking runs")
+    parser.add_argument("--resamples", type=int, default=N_RESAMPLES)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--correction", choices=CORRECTIONS, default="holm")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (0 = cpu count)")
+    parser.add_argument("--run", action="append", default=[], metavar="NAME=DIR:PREFIX",
+                        help="extra run to compare, e.g. RRF=../outputs/FUSION/rankings:RRF")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output_path = os.path.join(parent_dir, "outputs", "SIGNIFICANCE", "Significance_Results.csv")
+
+    systems = {"PRRM": (paths['prrm_dir'], "PRRM"),
+               "BM25": (paths['bm25_dir'], "BM25IR"),
+               "LMRM": (paths['lmrm_dir'], "LMRM")}
+    for spec in args.run:
+        name, location = spec.split("=", 1)
+        systems[name] = tuple(location.rsplit(":", 1))
+    matrices = {name: get_run_matrix(directory, prefix, paths['benchmark_dir'], paths['run_matrix_cache_dir'])
+                for name, (directory, prefix) in systems.items() if os.path.isdir(directory)}
+
+    start = time.perf_counter()
+    rows = compare_all(matrices, METRICS, args.resamples, args.alpha, args.correction, args.seed,
+                       args.workers or None)
+    elapsed = time.perf_counter() - start
+    write_results(rows, output_path)
+
+    print(f"\n--- {len(rows)} comparisons, {args.resamples} resamples each, {args.correction} correction ---")
+    print(f"{'Comparison':<14} | {'Metric':<6} | {'Diff':>7} | {'CI':>18} | {'p rand':>7} | {'p adj':>7}")
+    print("-" * 75)
+    for r in rows:
+        ci = f"[{r['ci_low']:+.4f}, {r['ci_high']:+.4f}]"
+        print(f"{r['system1'] + ' - ' + r['system2']:<14} | {r['metric']:<6} | {r['mean_diff']:>+7.4f} | {ci:>18} | "
+              f"{r['p_randomization']:>7.4f} | {r['p_randomization_adj']:>7.4f}{' *' if r['significant'] else ''}")
+    print(f"\nTests took {elapsed:.2f} s, results saved to: {output_path}")
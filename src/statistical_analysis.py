@@ -1,7 +1,9 @@
 import os
 import numpy as np
 from scipy.stats import ttest_rel
-import pandas as pd
+
+from evaluation import METRICS
+from run_matrix import get_run_matrix, paired
 
 def get_paths():
     """Get correct paths for the new folder structure."""
@@ -13,131 +15,29 @@ def get_paths():
         'benchmark_dir': os.path.join(data_dir, "EvaluationBenchmark"),
         'prrm_dir': os.path.join(current_dir, "RankingOutputs_PRRM"),
         'bm25_dir': os.path.join(data_dir, "RankingOutputs_BM25"),
-        'lmrm_dir': os.path.join(current_dir, "RankingOutputs_LMRM")
+        'lmrm_dir': os.path.join(current_dir, "RankingOutputs_LMRM"),
+        'run_matrix_cache_dir': os.path.join(current_dir, "RunMatrixCache")
     }
 
-def load_scores(metric_index, method_dir, method_prefix, benchmark_dir):
-    """Load scores for a specific metric and method."""
-    scores = []
-    processed_queries = []
-    
-    for i in range(101, 151):
-        query_id = f"R{i}"
-        ranking_file = os.path.join(method_dir, f"{method_prefix}_{query_id}Ranking.dat")
-        benchmark_file = os.path.join(benchmark_dir, f"Dataset{i}.txt")
-
-        if not os.path.exists(ranking_file) or not os.path.exists(benchmark_file):
-            continue
-
-        # Load relevance judgments
-        relevance_dict = {}
-        try:
-            with open(benchmark_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) == 3:
-                        _, doc_id, label = parts
-                        relevance_dict[doc_id] = int(label)
-        except Exception as e:
-            print(f"Error loading benchmark file {benchmark_file}: {e}")
-            continue
-
-        # Load ranked documents
-        ranked_docs = []
-        try:
-            with open(ranking_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    # Handle different formats
-                    if line.startswith('[') and line.endswith(']'):
-                        # BM25 format: ['docid', 'score']
-                        line = line.strip("[]")
-                        parts = [item.strip().strip("'\"") for item in line.split(",")]
-                        if len(parts) == 2:
-                            try:
-                                ranked_docs.append((parts[0], float(parts[1])))
-                            except ValueError:
-                                continue
-                    else:
-                        # LMRM/PRRM format: docid score
-                        parts = line.split()
-                        if len(parts) == 2:
-                            try:
-                                ranked_docs.append((parts[0], float(parts[1])))
-                            except ValueError:
-                                continue
-        except Exception as e:
-            print(f"Error loading ranking file {ranking_file}: {e}")
-            continue
-
-        if not ranked_docs:
-            continue
-
-        # Sort by score (descending)
-        ranked_docs.sort(key=lambda x: -x[1])
-        y_true = [relevance_dict.get(doc_id, 0) for doc_id, _ in ranked_docs]
-        y_score = [score for _, score in ranked_docs]
-
-        # Calculate metrics
-        ap = average_precision(y_true, y_score)
-        p12 = precision_at_k(y_true, y_score)
-        dcg12 = dcg_at_k(y_true, y_score)
-
-        metric_values = [ap, p12, dcg12]
-        scores.append(metric_values[metric_index])
-        processed_queries.append(query_id)
-    
+def load_scores(metric_index, method_dir, method_prefix, benchmark_dir, cache_dir=None):
+    """Load scores for a specific metric and method from the method's run matrix."""
+    matrix = get_run_matrix(method_dir, method_prefix, benchmark_dir, cache_dir)
+    scores = matrix.column(METRICS[metric_index]).tolist()
+    processed_queries = [f"R{t}" for t in matrix.topics]
     print(f"Loaded {len(scores)} scores for {method_prefix} from queries: {processed_queries[:5]}...{processed_queries[-5:] if len(processed_queries) > 5 else ''}")
     return scores
 
-# Metric calculation functions (copied from evaluation_prrm.py)
-def average_precision(y_true, y_score):
-    if not y_true or not y_score:
-        return 0.0
-    
-    sorted_indices = np.argsort(-np.array(y_score))
-    y_true = np.array(y_true)[sorted_indices]
-    
-    precisions = []
-    for k in range(len(y_true)):
-        if y_true[k] == 1:
-            precision_at_k = np.mean(y_true[:k+1])
-            precisions.append(precision_at_k)
-    
-    return np.mean(precisions) if precisions else 0.0
-
-def precision_at_k(y_true, y_score, k=12):
-    if not y_true or not y_score:
-        return 0.0
-    
-    sorted_indices = np.argsort(-np.array(y_score))
-    y_true = np.array(y_true)[sorted_indices]
-    return np.mean(y_true[:k])
-
-def dcg_at_k(y_true, y_score, k=12):
-    if not y_true or not y_score:
-        return 0.0
-    
-    sorted_indices = np.argsort(-np.array(y_score))
-    y_true = np.array(y_true)[sorted_indices]
-    dcg = 0.0
-    for idx, rel in enumerate(y_true[:k]):
-        if idx == 0:
-            dcg += (2 ** rel - 1)
-        else:
-            dcg += (2 ** rel - 1) / np.log2(idx + 2)
-    return dcg
-
-def perform_statistical_tests():
-    """Perform t-tests comparing all models: PRRM vs BM25, PRRM vs LMRM, and BM25 vs LMRM."""
+def perform_statistical_tests(use_cache=True, matrices=None):
+    """
+    Perform t-tests comparing all models: PRRM vs BM25, PRRM vs LMRM, and BM25 vs LMRM.
+    matrices ({"PRRM"|"BM25"|"LMRM": RunMatrix}) are used as given instead of reading the ranking files.
+    """
     paths = get_paths()
+    cache_dir = paths['run_matrix_cache_dir'] if use_cache else None
     
     # Check if all required directories exist
     required_dirs = [paths['benchmark_dir'], paths['prrm_dir'], paths['bm25_dir'], paths['lmrm_dir']]
-    missing_dirs = [d for d in required_dirs if not os.path.exists(d)]
+    missing_dirs = [d for d in required_dirs if not os.path.exists(d)] if matrices is None else []
     
     if missing_dirs:
         print("Error: Missing required directories:")
@@ -151,7 +51,17 @@ def perform_statistical_tests():
         "LMRM": (paths['lmrm_dir'], "LMRM")
     }
 
-    metric_names = ["MAP", "P@12", "DCG@12"]
+    metric_names = list(METRICS)
+
+    # Each run is parsed and evaluated once; every metric and comparison reads its run matrix
+    given = matrices or {}
+    matrices = {}
+    for method_name, (method_dir, method_prefix) in methods.items():
+        if method_name in given:
+            matrices[method_name] = given[method_name]
+        else:
+            matrices[method_name] = get_run_matrix(method_dir, method_prefix, paths['benchmark_dir'], cache_dir)
+        print(f"  {method_name}: {len(matrices[method_name].topics)} queries loaded")
     
     # Define all pairwise comparisons
     comparisons = [
@@ -164,39 +74,26 @@ def perform_statistical_tests():
     print("COMPREHENSIVE STATISTICAL ANALYSIS - T-TEST RESULTS")
     print("="*70)
 
-    for metric_idx, metric_name in enumerate(metric_names):
+    for metric_name in metric_names:
         print(f"\n{'-'*50}")
         print(f"T-Tests for {metric_name}")
         print(f"{'-'*50}")
         
-        # Load all scores for this metric
-        all_scores = {}
-        for method_name, method_info in methods.items():
-            scores = load_scores(metric_idx, *method_info, paths['benchmark_dir'])
-            all_scores[method_name] = scores
-            if scores:
-                print(f"  {method_name}: {len(scores)} queries loaded")
-        
         # Perform all pairwise comparisons
         for model1, model2 in comparisons:
             print(f"\n{model1} vs {model2}:")
             print("-" * 25)
             
-            scores1 = all_scores.get(model1, [])
-            scores2 = all_scores.get(model2, [])
-            
-            if not scores1 or not scores2:
-                print(f"  No scores found for {model1 if not scores1 else model2}")
+            if not matrices[model1].topics or not matrices[model2].topics:
+                print(f"  No scores found for {model1 if not matrices[model1].topics else model2}")
                 continue
 
-            # Align lengths (use minimum available)
-            min_len = min(len(scores1), len(scores2))
+            # Align by query id
+            common, scores1_aligned, scores2_aligned = paired(matrices[model1], matrices[model2], metric_name)
+            min_len = len(common)
             if min_len < 5:
                 print(f"  Not enough data points ({min_len}) for meaningful comparison")
                 continue
-                
-            scores1_aligned = scores1[:min_len]
-            scores2_aligned = scores2[:min_len]
             
             # Calculate basic statistics
             mean1 = np.mean(scores1_aligned)
@@ -252,4 +149,10 @@ def perform_statistical_tests():
     print(f"{'='*70}")
 
 if __name__ == "__main__":
-    perform_statistical_tests()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Paired t-tests between the BM25, LMRM and PRRM runs")
+    parser.add_argument("--no-run-cache", action="store_true",
+                        help="evaluate the runs in memory only, without saving run matrices")
+    args = parser.parse_args()
+    perform_statistical_tests(use_cache=not args.no_run_cache)
\ No newline at end of file
@@ -0,0 +1,86 @@
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+from artifact_cache import ArtifactStore, LRUCache, stage_key  # noqa: E402
+from pipeline import Pipeline, Stage  # noqa: E402
+
+
+def test_stage_key_changes_with_every_input(tmp_path):
+    source = tmp_path / "queries.txt"
+    source.write_text("R101 query\n")
+    key = stage_key("bm25", [str(source)], {"k1": 1.2}, ["BM25IR"], ["dep"])
+
+    assert stage_key("bm25", [str(source)], {"k1": 1.2}, ["BM25IR"], ["dep"]) == key
+    assert stage_key("bm25", [str(source)], {"k1": 2.0}, ["BM25IR"], ["dep"]) != key
+    assert stage_key("bm25", [str(source)], {"k1": 1.2}, ["LMRM"], ["dep"]) != key
+    assert stage_key("bm25", [str(source)], {"k1": 1.2}, ["BM25IR"], ["other"]) != key
+    source.write_text("R101 another query\n")
+    assert stage_key("bm25", [str(source)], {"k1": 1.2}, ["BM25IR"], ["dep"]) != key
+
+
+def test_store_restores_outputs_and_drops_changed_objects(tmp_path):
+    store = ArtifactStore(str(tmp_path / "cache"), str(tmp_path))
+    output = tmp_path / "rankings" / "R101.dat"
+    output.parent.mkdir()
+    output.write_text("1 2.0\n")
+    store.save("bm25", "k1", {"R101": {"1": 2.0}}, [str(output.parent)])
+
+    output.unlink()
+    entry = store.load("bm25", "k1")
+    store.restore(entry)
+    assert entry['result'] == {"R101": {"1": 2.0}}
+    assert output.read_text() == "1 2.0\n"
+    assert store.load("bm25", "other") is None
+
+    # the restored output is a link to the stored object, so rewriting it in place invalidates the entry
+    with open(output, 'w') as f:
+        f.write("changed\n")
+    assert store.load("bm25", "k1") is None
+    assert not store.has("bm25", "k1")
+
+
+def test_pipeline_reuses_cached_stages_and_skips_what_only_they_need(tmp_path):
+    calls = []
+
+    def stage(name, value):
+        def fn(context, inputs):
+            calls.append(name)
+            return value + sum(inputs.values())
+        return fn
+
+    def build():
+        return Pipeline([
+            Stage("inputs", stage("inputs", 1)),
+            Stage("corpus", stage("corpus", 10), deps=["inputs"]),
+            Stage("model", stage("model", 100), deps=["inputs", "corpus"], cached=True, params=["C"]),
+            Stage("report", stage("report", 0), deps=["inputs", "model"]),
+        ])
+
+    store = ArtifactStore(str(tmp_path / "cache"), str(tmp_path))
+    results, report = build().run({'C': 1}, store=store)
+    assert results["report"] == 1 + (100 + 1 + 11)
+    assert sorted(calls) == ["corpus", "inputs", "model", "report"]
+
+    calls.clear()
+    results, report = build().run({'C': 1}, store=store)
+    assert results["report"] == 1 + (100 + 1 + 11)
+    assert sorted(calls) == ["inputs", "report"]
+    assert report["model"][0] == "cached" and report["corpus"][0] == "unused"
+
+    calls.clear()
+    build().run({'C': 2}, store=store)
+    assert sorted(calls) == ["corpus", "inputs", "model", "report"]
+
+
+def test_lru_cache_evicts_the_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache and "a" in cache and len(cache) == 2
+    cache.resize(1)
+    assert list(k for k in ("a", "b", "c") if k in cache) == ["c"]
@@ -0,0 +1,79 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+import evaluation  # noqa: E402
+from evaluation import Qrels, evaluate, evaluate_scores  # noqa: E402
+from significance import correct_pvalues  # noqa: E402
+
+# Two ranked topics: the first has 3 relevant documents (one not retrieved), the second none
+REL = np.array([[1.0, 0.0, 2.0, 0.0],
+                [0.0, 0.0, 0.0, 0.0]])
+N_RELEVANT = np.array([3.0, 0.0])
+
+
+def test_average_precision():
+    expected = (1 / 1 + 2 / 3) / 3
+    assert evaluation.average_precision(REL, N_RELEVANT) == pytest.approx([expected, 0.0])
+
+
+def test_precision_and_recall_at_k():
+    assert evaluation.precision_at_k(REL, 2) == pytest.approx([0.5, 0.0])
+    assert evaluation.precision_at_k(REL, 4) == pytest.approx([0.5, 0.0])
+    assert evaluation.recall_at_k(REL, N_RELEVANT, 4) == pytest.approx([2 / 3, 0.0])
+
+
+def test_r_precision_and_reciprocal_rank():
+    rel = np.array([[0.0, 1.0, 1.0], [0.0, 0.0, 1.0]])
+    assert evaluation.r_precision(rel, np.array([2.0, 1.0])) == pytest.approx([0.5, 0.0])
+    assert evaluation.reciprocal_rank(rel) == pytest.approx([0.5, 1 / 3])
+    assert evaluation.reciprocal_rank(REL) == pytest.approx([1.0, 0.0])
+
+
+def test_dcg_and_ndcg():
+    # rel_1 + sum of rel_i / log2(i) from rank 2
+    assert evaluation.dcg_at_k(REL, 3) == pytest.approx([1 + 2 / np.log2(3), 0.0])
+    ideal = np.array([[2.0, 1.0, 1.0], [0.0, 0.0, 0.0]])
+    expected = (1 + 2 / np.log2(3)) / (2 + 1 + 1 / np.log2(3))
+    assert evaluation.ndcg_at_k(REL[:, :3], ideal, 3) == pytest.approx([expected, 0.0])
+
+
+def test_evaluate_matches_kernels():
+    qrels = Qrels({"101": {"10": 1, "11": 0, "12": 2, "13": 1}})
+    run = {"101": {"12": 0.9, "10": 0.8, "11": 0.5, "99": 0.1}}
+    table = evaluate(qrels, run, k=2)
+
+    # ranked 12 (rel 2), 10 (rel 1), 11, 99 (unjudged): 3 relevant documents, two found at ranks 1 and 2
+    assert table["101"]["MAP"] == pytest.approx((1 + 1) / 3)
+    assert table["101"]["P@12"] == pytest.approx(1.0)
+    assert table["101"]["DCG@12"] == pytest.approx(2 + 1 / np.log2(2))
+    assert evaluate_scores(qrels, "R101", run["101"], k=2) == pytest.approx(
+        (table["101"]["MAP"], table["101"]["P@12"], table["101"]["DCG@12"]))
+
+
+def test_evaluate_keeps_the_run_order_for_ties():
+    qrels = Qrels({"101": {"1": 1, "2": 0}})
+    assert evaluate(qrels, {"101": {"1": 0.5, "2": 0.5}})["101"]["MAP"] == 1.0
+    assert evaluate(qrels, {"101": {"2": 0.5, "1": 0.5}})["101"]["MAP"] == 0.5
+
+
+@pytest.mark.parametrize("method, expected", [
+    ("none", [0.01, 0.04, 0.03]),
+    ("bonferroni", [0.03, 0.12, 0.09]),
+    ("holm", [0.03, 0.06, 0.06]),
+    ("fdr_bh", [0.03, 0.04, 0.04]),
+])
+def test_correct_pvalues(method, expected):
+    assert correct_pvalues([0.01, 0.04, 0.03], method) == pytest.approx(expected)
+
+
+def test_correct_pvalues_caps_at_one_and_rejects_unknown_methods():
+    assert correct_pvalues([0.5, 0.9], "holm") == pytest.approx([1.0, 1.0])
+    assert len(correct_pvalues([], "holm")) == 0
+    with pytest.raises(ValueError):
+        correct_pvalues([0.1], "sidak")
@@ -0,0 +1,41 @@
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+from inverted_index import InvertedIndex, top_k  # noqa: E402
+
+
+def make_index(docs):
+    index = InvertedIndex()
+    for doc_id, terms in docs:
+        index.add_doc(doc_id, terms, sum(terms.values()))
+    return index
+
+
+def test_bm25_top_k_matches_full_ranking_with_negative_idf():
+    # "common" is in 4 of 5 documents, so with n_scale=1 its idf is negative and the one document
+    # without it (score 0.0) ranks first even though more than k documents matched
+    index = make_index([
+        ("d1", {"common": 1, "rare": 1}),
+        ("d2", {"common": 2}),
+        ("d3", {"common": 1, "other": 3}),
+        ("d4", {"other": 2}),
+        ("d5", {"common": 3}),
+    ])
+    q = {"common": 1}
+    for k in (1, 2, 5):
+        expected = top_k(index.bm25(q, n_scale=1), k)
+        assert index.bm25_top_k(q, k, n_scale=1) == expected
+    assert index.bm25_top_k(q, 1, n_scale=1) == [("d4", 0.0)]
+
+
+def test_bm25_top_k_pads_with_unmatched_documents():
+    index = make_index([
+        ("d1", {"a": 1}),
+        ("d2", {"b": 1}),
+        ("d3", {"c": 2}),
+    ])
+    q = {"c": 1}
+    assert index.bm25_top_k(q, 3) == top_k(index.bm25(q), 3)
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+from PRRM import get_trained_model, saved_models  # noqa: E402
+from run_prrm import run_query_job  # noqa: E402
+
+
+def training_data(seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(40, 3))
+    y = (X[:, 0] > 0).astype(int)
+    return X, y
+
+
+def test_trained_model_is_reused_for_the_same_inputs(tmp_path):
+    model_dir = str(tmp_path)
+    X, y = training_data()
+    model, reused = get_trained_model(X, y, model_dir, name="PRRM_R101")
+    assert not reused
+
+    # row order does not matter: the pseudo-labelled docs come out of sets
+    order = np.arange(len(y))[::-1]
+    again, reused = get_trained_model(X[order], y[order], model_dir, name="PRRM_R101")
+    assert reused
+    assert np.allclose(again.predict(X), model.predict(X))
+
+    _, reused = get_trained_model(X, y, model_dir, name="PRRM_R101", C=0.1)
+    assert not reused
+    assert len(saved_models(model_dir, "PRRM_R101")) == 1  # the new model replaced the old one
+    _, reused = get_trained_model(X, y, model_dir, name="PRRM_R1")
+    assert not reused and len(saved_models(model_dir, "PRRM_R101")) == 1
+
+
+def test_query_failures_are_reported_not_raised(tmp_path):
+    missing = str(tmp_path / "Dataset999")
+    status, result = run_query_job("999", "some query", missing, set(), {})
+    assert status.startswith("FileNotFoundError") and result is None
+
+    empty = tmp_path / "Dataset998"
+    empty.mkdir()
+    assert run_query_job("998", "some query", str(empty), set(), {}) == ("skipped", None)
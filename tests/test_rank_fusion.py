@@ -0,0 +1,49 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+from rank_fusion import AlignedRuns, fuse, normalize, rank_array  # noqa: E402
+
+RUNS = {
+    "a": {"101": {"1": 3.0, "2": 2.0, "3": 1.0}, "102": {"4": 1.0}},
+    "b": {"101": {"3": 5.0, "1": 4.0}},
+}
+
+
+def test_aligned_runs_keep_only_common_topics():
+    aligned = AlignedRuns.from_runs(RUNS)
+    assert aligned.topics == ["101"]
+    assert aligned.doc_ids.tolist() == [[1, 2, 3]]
+    assert np.isnan(aligned.scores[1, 0, 1])  # "b" did not retrieve doc 2
+
+
+def test_rank_array_puts_missing_documents_last():
+    scores = np.array([[[1.0, np.nan, 3.0, 2.0]]])
+    assert rank_array(scores).tolist() == [[[2, 3, 0, 1]]]
+
+
+def test_rrf():
+    aligned = AlignedRuns.from_runs(RUNS)
+    fused = fuse(aligned, "rrf", k=60)
+    assert fused[0] == pytest.approx([1 / 61 + 1 / 62, 1 / 62, 1 / 63 + 1 / 61])
+    assert list(aligned.to_run(fused)["101"]) == ["1", "3", "2"]
+
+
+def test_combsum_and_combmnz():
+    aligned = AlignedRuns.from_runs(RUNS)
+    # min-max per run: a -> 1: 1, 2: 0.5, 3: 0 and b -> 3: 1, 1: 0
+    assert normalize(aligned.scores)[0, 0] == pytest.approx([1.0, 0.5, 0.0])
+    assert fuse(aligned, "combsum")[0] == pytest.approx([1.0, 0.5, 1.0])
+    assert fuse(aligned, "combmnz")[0] == pytest.approx([2.0, 0.5, 2.0])
+    assert fuse(aligned, "combsum", weights=[1.0, 0.0])[0] == pytest.approx([1.0, 0.5, 0.0])
+
+
+def test_depth_limits_what_counts_as_retrieved():
+    aligned = AlignedRuns.from_runs(RUNS)
+    fused = fuse(aligned, "rrf", depth=1, k=60)
+    assert fused[0] == pytest.approx([1 / 61, 0.0, 1 / 61])
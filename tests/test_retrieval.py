@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+import data_processing_lm  # noqa: E402
+import retrieval  # noqa: E402
+
+# A handful of datasets keeps the test quick; every variant of each is ranked on several threads at once
+TOPIC_CODES = {"101", "102", "103", "104"}
+
+
+@pytest.fixture(scope="module")
+def resources():
+    paths = retrieval.get_paths()
+    if not os.path.isdir(paths['dataset_base_dir']):
+        pytest.skip("data/DataSets is not available")
+    return retrieval.Resources(paths)
+
+
+def test_concurrent_rankings_match_serial(resources):
+    cwd = os.getcwd()
+    module_state = dict(vars(data_processing_lm))
+
+    mismatches, runs = retrieval.check_concurrency(resources, TOPIC_CODES, workers=8)
+
+    assert mismatches == {variant: [] for variant in retrieval.CHECK_VARIANTS}
+    assert all(len(run) == len(TOPIC_CODES) for run in runs.values())
+    assert os.getcwd() == cwd
+    assert dict(vars(data_processing_lm)) == module_state
+    assert not hasattr(data_processing_lm, "stop_words_list")
+
+
+def test_stop_words_are_per_call(resources):
+    path = resources.datasets({"101"})["R101"]
+    with_stop_words = retrieval.rank_lmrm(path, resources.lm_queries["R101"], resources.lm_stop_words)
+    without = retrieval.rank_lmrm(path, resources.lm_queries["R101"], [])
+
+    assert list(with_stop_words.items()) == list(retrieval.rank_topic(resources, "lmrm", "R101", path).items())
+    assert with_stop_words != without
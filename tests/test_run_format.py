@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+from evaluation import Qrels  # noqa: E402
+from rank_fusion import AlignedRuns  # noqa: E402
+from run_format import BinaryRun, binary_run_path, docid_array, export_trec, read_run, write_run  # noqa: E402
+
+
+@pytest.mark.parametrize("doc_id", ["007", "0x1f", "doc-12", "+5", "99999999999999999999"])
+def test_docids_that_would_change_are_rejected(doc_id):
+    run = {"101": {"6146": 1.0, doc_id: 0.5}}
+    with pytest.raises(ValueError, match="docid"):
+        BinaryRun.from_runs(run)
+    with pytest.raises(ValueError, match="docid"):
+        Qrels(run)
+    with pytest.raises(ValueError, match="docid"):
+        AlignedRuns.from_runs({"a": run})
+
+
+def test_canonical_docids_round_trip():
+    ids = ["0", "6146", "18586", str(2 ** 63 - 1)]
+    assert docid_array(ids).astype(str).tolist() == ids
+    run = BinaryRun.from_runs({"R101": {doc_id: float(i) for i, doc_id in enumerate(ids)}})
+    assert run.scores_dict("101") == {doc_id: float(i) for i, doc_id in reversed(list(enumerate(ids)))}
+
+
+def test_binary_run_save_and_load(tmp_path):
+    run = {"R101": {"20": 0.25, "10": 1.5, "30": -2.0}, "R102": {}, "R103": {"7": 3.0}}
+    path = str(tmp_path / "BM25IR.run")
+    write_run(path, run, "BM25IR")
+    loaded = read_run(path)
+
+    assert loaded.topics == ["101", "102", "103"]
+    assert loaded.tag == "BM25IR"
+    doc_ids, scores = loaded.topic("101")
+    assert doc_ids.tolist() == [10, 20, 30]
+    assert scores.tolist() == [1.5, 0.25, -2.0]
+    assert loaded.to_runs() == {"101": {"10": 1.5, "20": 0.25, "30": -2.0}, "102": {}, "103": {"7": 3.0}}
+
+
+def test_binary_run_is_stale_when_a_text_ranking_is_newer(tmp_path):
+    path = str(tmp_path / "PRRM.run")
+    write_run(path, {"101": {"1": 1.0}})
+    assert binary_run_path(str(tmp_path), "PRRM") == path
+
+    ranking = tmp_path / "PRRM_R101Ranking.dat"
+    ranking.write_text("1 1.0\n")
+    os.utime(ranking, (os.path.getmtime(path) + 10,) * 2)
+    assert binary_run_path(str(tmp_path), "PRRM") is None
+
+
+def test_export_trec(tmp_path):
+    output_path = str(tmp_path / "run.trec")
+    export_trec(BinaryRun.from_runs({"101": {"5": 0.5, "6": 2.0}}, "BM25IR"), output_path)
+    with open(output_path) as f:
+        assert f.read().splitlines() == ["R101 Q0 6 1 2.000000 BM25IR", "R101 Q0 5 2 0.500000 BM25IR"]